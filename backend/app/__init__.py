@@ -1,20 +1,22 @@
-from flask import Flask  # type: ignore
-from app.config import Config  # type: ignore
-from app.extensions import db, bcrypt, jwt, migrate, socketio, blacklist  # type: ignore
-from app.routes import register_routes  # type: ignore
-from flask_cors import CORS  # type: ignore
-
-
-@jwt.token_in_blocklist_loader
-def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    return jti in blacklist
-
-
 def create_app():
+    # Imported here so that light submodules, such as the password hashing
+    # worker that runs in spawned processes, can be imported without the
+    # whole app (routes, agent, model and Composio clients)
+    from flask import Flask  # type: ignore
+    from flask_cors import CORS  # type: ignore
+    from app.config import CORS_ORIGINS, Config  # type: ignore
+    from app.extensions import db, bcrypt, jwt, migrate, socketio  # type: ignore
+    from app.database import engine_options, instrument_engine  # type: ignore
+    from app.routes import register_routes  # type: ignore
+    from app.serialization import SerializerJSONProvider  # type: ignore
+
     app = Flask(__name__)
+    app.json = SerializerJSONProvider(app)
     print(f"DBURL: {Config.SQLALCHEMY_DATABASE_URI}")
     app.config.from_object(Config)
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    )
     db.init_app(app)
     migrate.init_app(app, db)
     socketio.init_app(app)
@@ -22,12 +24,20 @@ def create_app():
     jwt.init_app(app)
     CORS(
         app,
-        resources={r"/*": {"origins": "http://localhost:5173"}},
+        resources={r"/*": {"origins": CORS_ORIGINS}},
         supports_credentials=True,
     )
 
     with app.app_context():
+        instrument_engine(db.engine)
         from app.user import models as user_models  # type: ignore
+        from app.chat.accounts import models as account_models  # type: ignore
+        from app.chat import models as chat_models  # type: ignore
 
     register_routes(app)
+
+    # Chat tools run on worker threads and need the app to reach the database
+    from app.chat.controllers import chat_service  # type: ignore
+
+    chat_service.init_app(app)
     return app
@@ -0,0 +1,459 @@
+"""
+The agent's tool loop, written once.
+
+AgentEngine runs a conversation against the Messages API until the model
+stops asking for tools, emitting typed events as it goes:
+
+- block_start / delta: streamed thinking, text and tool input (streaming only)
+- block: an assembled assistant content block
+- tool_start: a tool call was submitted
+- tool_result: a tool finished; its frontend block is under "block"
+- usage: token usage of one model call
+- complete: why the run ended, with totals and a trace summary
+
+Streaming callers forward the events; non-streaming callers feed them to a
+ResponseCollector. Sync (run) and async (run_async) drivers share every
+step except the I/O. Cross-cutting behaviour such as compaction, caching
+and metrics plugs in as AgentMiddleware.
+
+Model calls and tools are timed as spans into the run's Trace (see
+app.observability), whose summary is part of the complete event.
+"""
+import anthropic  # type: ignore
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from app.chat.limits import (  # type: ignore
+    END_COMPLETED,
+    STOPPED_EARLY_NOTES,
+    RunBudget,
+    RunStopped,
+)
+from app.observability import Trace, record_run, record_span, record_usage, span  # type: ignore
+
+# Assistant blocks kept in the conversation for tool-use iterations
+TOOL_TURN_BLOCK_TYPES = ("thinking", "redacted_thinking", "tool_use")
+
+
+class AgentMiddleware:
+    """Hooks into an agent run. Override any subset; the defaults do nothing."""
+
+    def before_model_call(self, run: "AgentRun") -> None:
+        """Called before each model call; may rewrite run.messages in place."""
+
+    def after_model_call(self, run: "AgentRun", message) -> None:
+        """Called with each complete Message."""
+
+    def around_tool(self, run: "AgentRun", tool_use_block, call_next: Callable[[], dict]) -> dict:
+        """Wrap one tool execution (on a worker thread). Return its result dict."""
+        return call_next()
+
+    def on_event(self, run: "AgentRun", event: dict) -> Optional[dict]:
+        """Inspect or replace an event before it is emitted; return None to drop it."""
+        return event
+
+
+class AgentRun:
+    """State of one agent run: its conversation, budget, usage and progress."""
+
+    def __init__(
+        self,
+        messages: List[dict],
+        budget: RunBudget,
+        context: Optional[dict] = None,
+        trace: Optional[Trace] = None,
+    ):
+        self.messages = messages
+        self.budget = budget
+        # Caller data for tools and middleware, e.g. the signed-in user
+        self.context = context or {}
+        self.trace = trace or Trace()
+        self.iteration = 0
+        self.message = None
+        self.end_reason = END_COMPLETED
+        self.blocks_sent = 0
+        self.usage = {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "iterations": [],
+        }
+
+
+def stream_event_to_data(event, iteration: int) -> Optional[dict]:
+    """Convert a raw streaming event into a block_start or delta event, or None."""
+    if event.type == "content_block_start":
+        content_block = event.content_block
+        block_start = {
+            "type": content_block.type,
+            "index": event.index,
+            "iteration": iteration,
+        }
+        if content_block.type == "tool_use":
+            block_start["tool_name"] = content_block.name
+            block_start["tool_id"] = content_block.id
+        return {"type": "block_start", "block": block_start}
+
+    if event.type == "content_block_delta":
+        delta = event.delta
+        if delta.type == "thinking_delta":
+            delta_type, content = "thinking", delta.thinking
+        elif delta.type == "text_delta":
+            delta_type, content = "text", delta.text
+        elif delta.type == "input_json_delta":
+            delta_type, content = "tool_input", delta.partial_json
+        else:
+            # signature and citation deltas are only needed in the final message
+            return None
+        return {
+            "type": "delta",
+            "delta": {
+                "type": delta_type,
+                "index": event.index,
+                "iteration": iteration,
+                "content": content,
+            },
+        }
+
+    return None
+
+
+def block_to_data(block, iteration: int) -> Optional[dict]:
+    """Convert an assistant content block into the frontend block format, or None."""
+    if block.type == "thinking":
+        return {"type": "thinking", "content": block.thinking, "iteration": iteration}
+    if block.type == "redacted_thinking":
+        return {
+            "type": "redacted_thinking",
+            "content": "[Thinking content redacted]",
+            "iteration": iteration,
+        }
+    if block.type == "text":
+        return {"type": "text", "content": block.text, "iteration": iteration}
+    if block.type == "tool_use":
+        return {
+            "type": "tool_use",
+            "tool_name": block.name,
+            "tool_input": block.input,
+            "tool_id": block.id,
+            "iteration": iteration,
+        }
+    return None
+
+
+class AgentEngine:
+    """
+    Runs the tool loop for any caller: the chat services and the agent script.
+
+    build_params turns the conversation into Messages API keyword arguments
+    (model, tools, system prompt, cache breakpoints). Tool runners are passed
+    per run and yield (tool_use_block, ToolResult) pairs in completion order.
+    """
+
+    def __init__(self, build_params: Callable[[List[dict]], dict], middleware: Iterable[AgentMiddleware] = ()):
+        self.build_params = build_params
+        self.middleware = list(middleware)
+
+    def run(self, messages, client, run_tools, budget=None, stream=True, context=None, trace=None):
+        """
+        Run the loop with a sync client, yielding events. With stream=False
+        the Messages API is called without streaming and no deltas are sent.
+        messages is extended in place with the turn's assistant and tool
+        result messages. Pass a trace to add the caller's own spans (e.g.
+        SSE emission) to the run's trace summary.
+        """
+        run = AgentRun(messages, budget or RunBudget(), context, trace)
+        try:
+            while True:
+                params = self._begin_iteration(run)
+                if stream:
+                    message = yield from self._stream_message(run, client, params)
+                else:
+                    message = self._create_message(run, client, params)
+                yield from self._emit_all(run, self._finish_iteration(run, message))
+
+                tool_use_blocks = self._pending_tools(run)
+                if not tool_use_blocks:
+                    break
+                yield from self._emit_all(run, self._start_tools(run, tool_use_blocks))
+                results = {}
+                for tool_use_block, tool_result in run_tools(tool_use_blocks, run):
+                    results[tool_use_block.id] = tool_result
+                    yield from self._emit_all(run, [self._tool_result_event(run, tool_use_block, tool_result)])
+                self._end_tools(run, tool_use_blocks, results)
+
+        except RunStopped as e:
+            yield from self._emit_all(run, self._stop_early(run, e.reason))
+
+        yield from self._emit_all(run, [self._complete_event(run)])
+
+    async def run_async(self, messages, client, run_tools, budget=None, context=None, trace=None):
+        """Async counterpart of run for an AsyncAnthropic client; always streams."""
+        run = AgentRun(messages, budget or RunBudget(), context, trace)
+        try:
+            while True:
+                params = self._begin_iteration(run)
+                message = None
+                async for event in self._stream_message_async(run, client, params):
+                    if event["type"] == "message":
+                        message = event["message"]
+                    else:
+                        for emitted in self._emit_all(run, [event]):
+                            yield emitted
+                for emitted in self._emit_all(run, self._finish_iteration(run, message)):
+                    yield emitted
+
+                tool_use_blocks = self._pending_tools(run)
+                if not tool_use_blocks:
+                    break
+                for emitted in self._emit_all(run, self._start_tools(run, tool_use_blocks)):
+                    yield emitted
+                results = {}
+                async for tool_use_block, tool_result in run_tools(tool_use_blocks, run):
+                    results[tool_use_block.id] = tool_result
+                    for emitted in self._emit_all(run, [self._tool_result_event(run, tool_use_block, tool_result)]):
+                        yield emitted
+                self._end_tools(run, tool_use_blocks, results)
+
+        except RunStopped as e:
+            for emitted in self._emit_all(run, self._stop_early(run, e.reason)):
+                yield emitted
+
+        for emitted in self._emit_all(run, [self._complete_event(run)]):
+            yield emitted
+
+    def call_tool(self, run: AgentRun, tool_use_block, execute: Callable[[], dict]) -> dict:
+        """Execute one tool through the middleware's around_tool hooks, as a tool span."""
+        call = execute
+        for middleware in reversed(self.middleware):
+            call = (lambda middleware, call_next: lambda: middleware.around_tool(run, tool_use_block, call_next))(
+                middleware, call
+            )
+        with span("tool", tool_use_block.name, run.trace, run.iteration):
+            return call()
+
+    def _emit_all(self, run: AgentRun, events):
+        for event in events:
+            for middleware in self.middleware:
+                event = middleware.on_event(run, event)
+                if event is None:
+                    break
+            else:
+                if event["type"] in ("block", "tool_result"):
+                    run.blocks_sent += 1
+                yield event
+
+    def _begin_iteration(self, run: AgentRun) -> dict:
+        """Check the budget and build the params for the next model call."""
+        run.budget.check(run.iteration + 1)
+        run.iteration += 1
+        print(f"\n*** ITERATION {run.iteration} ***")
+        for middleware in self.middleware:
+            middleware.before_model_call(run)
+        # The time left is the request timeout
+        return {**self.build_params(run.messages), "timeout": run.budget.remaining()}
+
+    def _raise_if_out_of_time(self, run: AgentRun, error: Exception) -> None:
+        """Report an API timeout caused by the run's deadline as a stopped run."""
+        reason = run.budget.stop_reason()
+        if reason is not None:
+            raise RunStopped(reason) from error
+
+    def _create_message(self, run: AgentRun, client, params: dict):
+        try:
+            with span("model_call", params["model"], run.trace, run.iteration):
+                return client.messages.create(**params)
+        except anthropic.APITimeoutError as e:
+            self._raise_if_out_of_time(run, e)
+            raise
+
+    def _stream_message(self, run: AgentRun, client, params: dict):
+        """
+        Call the model through the streaming API, yielding block_start and delta
+        events as tokens arrive, and return the complete Message (with thinking
+        signatures and parsed tool inputs). The stream is abandoned as soon as
+        the run is cancelled or out of time.
+        """
+        started_at = time.perf_counter()
+        first_token = True
+        try:
+            with span("model_call", params["model"], run.trace, run.iteration):
+                with client.messages.stream(**params) as stream:
+                    for event in stream:
+                        run.budget.check()
+                        if first_token and event.type == "content_block_delta":
+                            first_token = False
+                            record_span("model_first_token", params["model"], started_at, run.trace, run.iteration)
+                        stream_event = stream_event_to_data(event, run.iteration)
+                        if stream_event:
+                            yield from self._emit_all(run, [stream_event])
+                    return stream.get_final_message()
+        except anthropic.APITimeoutError as e:
+            self._raise_if_out_of_time(run, e)
+            raise
+
+    async def _stream_message_async(self, run: AgentRun, client, params: dict):
+        """
+        Async counterpart of _stream_message. Yields delta events followed by a
+        final {"type": "message"} event carrying the complete Message, since
+        async generators cannot return a value.
+        """
+        started_at = time.perf_counter()
+        first_token = True
+        try:
+            with span("model_call", params["model"], run.trace, run.iteration):
+                async with client.messages.stream(**params) as stream:
+                    async for event in stream:
+                        run.budget.check()
+                        if first_token and event.type == "content_block_delta":
+                            first_token = False
+                            record_span("model_first_token", params["model"], started_at, run.trace, run.iteration)
+                        stream_event = stream_event_to_data(event, run.iteration)
+                        if stream_event:
+                            yield stream_event
+                    final_message = await stream.get_final_message()
+        except anthropic.APITimeoutError as e:
+            self._raise_if_out_of_time(run, e)
+            raise
+        yield {"type": "message", "message": final_message}
+
+    def _finish_iteration(self, run: AgentRun, message) -> List[dict]:
+        """Record a complete Message: usage, its blocks and the conversation."""
+        run.message = message
+        for middleware in self.middleware:
+            middleware.after_model_call(run, message)
+        print(f"Stop reason: {message.stop_reason}")
+        print(f"Block types: {[block.type for block in message.content]}")
+
+        usage = message.usage
+        iteration_usage = {
+            "input_tokens": usage.input_tokens or 0,
+            "output_tokens": usage.output_tokens or 0,
+            "cache_creation_input_tokens": usage.cache_creation_input_tokens or 0,
+            "cache_read_input_tokens": usage.cache_read_input_tokens or 0,
+        }
+        for key, value in iteration_usage.items():
+            run.usage[key] += value
+        run.usage["iterations"].append(iteration_usage)
+        record_usage(iteration_usage)
+        events = [{"type": "usage", "iteration": run.iteration, "usage": iteration_usage}]
+
+        # The index matches the content block index used by the delta events
+        for index, block in enumerate(message.content):
+            block_data = block_to_data(block, run.iteration)
+            if block_data:
+                block_data["index"] = index
+                events.append({"type": "block", "block": block_data})
+
+        if self._pending_tools(run):
+            run.messages.append(
+                {
+                    "role": "assistant",
+                    "content": [block for block in message.content if block.type in TOOL_TURN_BLOCK_TYPES],
+                }
+            )
+        elif message.content:
+            # Keep the final answer so the next turn in the session can see it
+            run.messages.append({"role": "assistant", "content": message.content})
+        return events
+
+    def _pending_tools(self, run: AgentRun) -> list:
+        """tool_use blocks the latest Message is waiting on, if any."""
+        if run.message is None or run.message.stop_reason != "tool_use":
+            return []
+        return [block for block in run.message.content if block.type == "tool_use"]
+
+    def _start_tools(self, run: AgentRun, tool_use_blocks) -> List[dict]:
+        print(f"*** TOOL EXECUTION ({len(tool_use_blocks)} tools) ***")
+        return [
+            {
+                "type": "tool_start",
+                "tool_name": tool_use_block.name,
+                "tool_input": tool_use_block.input,
+                "tool_id": tool_use_block.id,
+                "iteration": run.iteration,
+            }
+            for tool_use_block in tool_use_blocks
+        ]
+
+    def _tool_result_event(self, run: AgentRun, tool_use_block, tool_result) -> dict:
+        return {
+            "type": "tool_result",
+            "block": {
+                "type": "tool_result",
+                "tool_name": tool_use_block.name,
+                "tool_input": tool_use_block.input,
+                "tool_result": tool_result,
+                "tool_id": tool_use_block.id,
+                "iteration": run.iteration,
+            },
+        }
+
+    def _end_tools(self, run: AgentRun, tool_use_blocks, results: Dict[str, object]) -> None:
+        """Add every tool result to the conversation in one message, in tool_use order."""
+        run.messages.append(
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": tool_use_block.id,
+                        "content": results[tool_use_block.id].model_content,
+                    }
+                    for tool_use_block in tool_use_blocks
+                ],
+            }
+        )
+        print(f"Added tool results to conversation history. Total messages: {len(run.messages)}")
+
+    def _stop_early(self, run: AgentRun, end_reason: str) -> List[dict]:
+        """
+        Close a turn that ended on the budget: end the conversation on an
+        assistant message so roles keep alternating, and show a note.
+        """
+        run.end_reason = end_reason
+        note = STOPPED_EARLY_NOTES.get(end_reason, f"Stopped early: {end_reason}.")
+        print(f"!!! AGENT RUN STOPPED EARLY: {end_reason} !!!")
+        if run.messages[-1]["role"] == "user":
+            run.messages.append({"role": "assistant", "content": [{"type": "text", "text": note}]})
+        return [{"type": "block", "block": {"type": "text", "content": note, "iteration": run.iteration}}]
+
+    def _complete_event(self, run: AgentRun) -> dict:
+        print(f"Agent run complete: {run.end_reason}, {len(run.usage['iterations'])} model calls")
+        record_run(run.end_reason, run.budget.elapsed())
+        return {
+            "type": "complete",
+            "stop_reason": run.message.stop_reason if run.message is not None else None,
+            "end_reason": run.end_reason,
+            "total_iterations": len(run.usage["iterations"]),
+            # Block and tool_result events sent before this one
+            "total_blocks": run.blocks_sent,
+            "usage": run.usage,
+            "limits": run.budget.summary(run.end_reason),
+            "trace": run.trace.summary(),
+        }
+
+
+class ResponseCollector:
+    """Folds engine events into the non-streaming response format."""
+
+    def __init__(self):
+        self.blocks: List[dict] = []
+        self.complete: Optional[dict] = None
+
+    def add(self, event: dict) -> None:
+        if event["type"] in ("block", "tool_result"):
+            self.blocks.append(event["block"])
+        elif event["type"] == "complete":
+            self.complete = event
+
+    def response(self) -> dict:
+        return {
+            "blocks": self.blocks,
+            "stop_reason": self.complete["stop_reason"],
+            "end_reason": self.complete["end_reason"],
+            "total_iterations": self.complete["total_iterations"],
+            "usage": self.complete["usage"],
+            "limits": self.complete["limits"],
+            "trace": self.complete["trace"],
+        }
@@ -0,0 +1,47 @@
+from app.agent.engine import AgentMiddleware, AgentRun  # type: ignore
+from app.agent.tools.cache import (  # type: ignore
+    search_result_cache,
+    search_cache_key,
+    search_cache_ttl,
+)
+from app.chat.compaction import ContextCompactor  # type: ignore
+
+SEARCH_TOOL_PREFIX = "COMPOSIO_SEARCH"
+
+
+class CompactionMiddleware(AgentMiddleware):
+    """Compacts the conversation in place before every model call."""
+
+    def __init__(self, compactor: ContextCompactor):
+        self.compactor = compactor
+
+    def before_model_call(self, run: AgentRun) -> None:
+        compaction = self.compactor.compact(run.messages)
+        print(f"Context compaction: {compaction}")
+
+
+class SearchCacheMiddleware(AgentMiddleware):
+    """
+    Serves Composio search calls from search_result_cache. Equivalent queries
+    share an entry for the tool's TTL, and concurrent identical calls share
+    one request. Errors are passed through but never cached.
+    """
+
+    def __init__(self, cache=search_result_cache):
+        self.cache = cache
+
+    def around_tool(self, run: AgentRun, tool_use_block, call_next):
+        if not tool_use_block.name.startswith(SEARCH_TOOL_PREFIX):
+            return call_next()
+        result = self.cache.get_or_compute(
+            search_cache_key(tool_use_block.name, tool_use_block.input),
+            call_next,
+            ttl=search_cache_ttl(tool_use_block.name),
+            should_cache=self._should_cache,
+        )
+        print(f"Search cache stats: {self.cache.stats()}")
+        return result
+
+    @staticmethod
+    def _should_cache(result: dict) -> bool:
+        return "error" not in result and "error" not in result.get("search_results", {})
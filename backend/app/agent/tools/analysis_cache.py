@@ -0,0 +1,118 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+from app.agent.tools.cache import TTLCache  # type: ignore
+from app.config import (  # type: ignore
+    ANALYSIS_CACHE_SIZE,
+    ANALYSIS_CACHE_PATH,
+    ANALYZE_RESULTS_CACHE_SIZE,
+    ANALYZE_RESULTS_CACHE_TTL_SECONDS,
+)
+from app.serialization import dumps  # type: ignore
+
+
+def results_hash(results: dict, model: str) -> str:
+    """Content hash of the tool results handed to analyze_results, per model."""
+    return hashlib.sha256(model.encode("utf-8") + b"\0" + dumps(results)).hexdigest()
+
+
+class SQLiteAnalysisStore:
+    """On-disk tier for cached analyses so they survive restarts.
+
+    Only the latest analysis per user is kept; storing one for a new data
+    version replaces the entry for their previous data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS account_narratives (
+                    user_id TEXT PRIMARY KEY,
+                    data_version TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, user_id: str, version: str) -> Optional[str]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT analysis FROM account_narratives WHERE user_id = ? AND data_version = ?",
+                (user_id, version),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, user_id: str, version: str, analysis: str) -> None:
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO account_narratives VALUES (?, ?, ?, ?)",
+                (user_id, version, analysis, time.time()),
+            )
+
+
+class AnalysisCache:
+    """Memoizes LLM account analyses keyed by user id and data_version.
+
+    Lookups hit a bounded in-process LRU first, then the optional SQLite
+    tier. Every write to a user's accounts or transactions bumps their
+    data_version, so the old analysis is never served again, and a lookup
+    needs no summary to be built or hashed.
+    """
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_SIZE, path: Optional[str] = ANALYSIS_CACHE_PATH):
+        self.memory = TTLCache(max_entries=max_entries, default_ttl=None)
+        self.store = SQLiteAnalysisStore(path) if path else None
+        self.store_hits = 0
+
+    def get_or_compute(self, user_id: int, version: str, compute: Callable[[], str]) -> str:
+        user_id = str(user_id)
+
+        def load() -> str:
+            if self.store is not None:
+                analysis = self.store.get(user_id, version)
+                if analysis is not None:
+                    self.store_hits += 1
+                    return analysis
+            analysis = compute()
+            if self.store is not None and analysis:
+                self.store.set(user_id, version, analysis)
+            return analysis
+
+        return self.memory.get_or_compute(
+            (user_id, version), load, should_cache=lambda analysis: bool(analysis)
+        )
+
+    def get(self, user_id: int, version: str) -> Optional[str]:
+        """The cached analysis for this data version, or None. Never computes one."""
+        user_id = str(user_id)
+        analysis = self.memory.get((user_id, version))
+        if analysis is None and self.store is not None:
+            analysis = self.store.get(user_id, version)
+            if analysis is not None:
+                self.store_hits += 1
+                self.memory.set((user_id, version), analysis)
+        return analysis
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["store_hits"] = self.store_hits
+        stats["store_enabled"] = self.store is not None
+        return stats
+
+
+analysis_cache = AnalysisCache()
+
+# analyze_results summaries keyed by results_hash; identical inputs within
+# the TTL reuse the previous summary instead of calling the model again
+results_analysis_cache = TTLCache(
+    max_entries=ANALYZE_RESULTS_CACHE_SIZE, default_ttl=ANALYZE_RESULTS_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,230 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTLs and single-flight misses.
+
+    Concurrent callers asking for the same missing key share one computation:
+    the first caller runs it while the others wait for its result.
+    """
+
+    def __init__(self, max_entries: int = 512, default_ttl: Optional[float] = 300.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value, or default."""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value; a ttl of None falls back to default_ttl (None never expires)."""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        ttl: Optional[float] = None,
+        should_cache: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """Return the cached value for key, computing it once on a miss.
+
+        Values rejected by should_cache (e.g. error payloads) are returned to
+        every waiting caller but not stored.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                leader = True
+                self.misses += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.fail(e)
+            raise
+
+        with self._lock:
+            if should_cache(value):
+                self._store(key, value, ttl)
+            self._in_flight.pop(key, None)
+        flight.resolve(value)
+        return value
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    # Callers must hold self._lock
+    def _lookup(self, key: Hashable) -> tuple:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class _Flight:
+    """A computation in progress that other callers can wait on."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error: Optional[BaseException] = None
+
+    def resolve(self, value: Any) -> None:
+        self._value = value
+        self._done.set()
+
+    def fail(self, error: BaseException) -> None:
+        self._error = error
+        self._done.set()
+
+    def wait(self) -> Any:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+# === COMPOSIO SEARCH RESULT CACHE ===
+
+# Seconds a parsed result stays fresh, per tool. Quotes move quickly; news and
+# event listings change on the order of minutes to hours.
+SEARCH_CACHE_TTLS = {
+    "COMPOSIO_SEARCH_FINANCE_SEARCH": 60.0,
+    "COMPOSIO_SEARCH_NEWS_SEARCH": 900.0,
+    "COMPOSIO_SEARCH_EVENT_SEARCH": 3600.0,
+    "COMPOSIO_SEARCH_SEARCH": 600.0,
+}
+DEFAULT_SEARCH_CACHE_TTL = 300.0
+
+# Common spellings of tickers and indices mapped to one canonical form
+TICKER_ALIASES = {
+    "s&p 500": "s&p 500",
+    "s&p500": "s&p 500",
+    "s and p 500": "s&p 500",
+    "sp500": "s&p 500",
+    "sp 500": "s&p 500",
+    "spx": "s&p 500",
+    "^gspc": "s&p 500",
+    "dow jones industrial average": "dow jones",
+    "dow jones": "dow jones",
+    "djia": "dow jones",
+    "^dji": "dow jones",
+    "the dow": "dow jones",
+    "nasdaq composite": "nasdaq",
+    "nasdaq": "nasdaq",
+    "^ixic": "nasdaq",
+    "apple": "aapl",
+    "microsoft": "msft",
+    "alphabet": "googl",
+    "google": "googl",
+    "amazon": "amzn",
+    "nvidia": "nvda",
+    "tesla": "tsla",
+    "meta": "meta",
+    "facebook": "meta",
+    "bitcoin": "btc-usd",
+    "btc": "btc-usd",
+    "ethereum": "eth-usd",
+    "eth": "eth-usd",
+}
+
+# Words that do not change what a finance search returns
+FINANCE_FILLER_WORDS = {"today", "now", "current", "latest", "price", "prices", "quote", "stock", "index"}
+
+_ALIAS_PATTERN = re.compile(
+    r"(?<![\w^&])("
+    + "|".join(re.escape(alias) for alias in sorted(TICKER_ALIASES, key=len, reverse=True))
+    + r")(?![\w&])"
+)
+
+
+def normalize_search_query(tool_name: str, query: str) -> str:
+    """Normalize a search query so equivalent requests share a cache entry."""
+    normalized = " ".join(str(query).lower().split()).strip(" ?!.,")
+    normalized = _ALIAS_PATTERN.sub(lambda m: TICKER_ALIASES[m.group(1)], normalized)
+    if tool_name == "COMPOSIO_SEARCH_FINANCE_SEARCH":
+        words = [w for w in normalized.split() if w not in FINANCE_FILLER_WORDS]
+        normalized = " ".join(words) or normalized
+    return normalized
+
+
+def search_cache_key(tool_name: str, tool_input: dict) -> tuple:
+    """Build the cache key for a Composio search call."""
+    return (tool_name, normalize_search_query(tool_name, tool_input.get("query", "")))
+
+
+def search_cache_ttl(tool_name: str) -> float:
+    return SEARCH_CACHE_TTLS.get(tool_name, DEFAULT_SEARCH_CACHE_TTL)
+
+
+search_result_cache = TTLCache(max_entries=512, default_ttl=DEFAULT_SEARCH_CACHE_TTL)
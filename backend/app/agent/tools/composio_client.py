@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx  # type: ignore
+from composio import Composio  # type: ignore
+from composio_client import (  # type: ignore
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+)
+from app.config import (  # type: ignore
+    COMPOSIO_POOL_SIZE,
+    COMPOSIO_TIMEOUT_SECONDS,
+    COMPOSIO_CONNECT_TIMEOUT_SECONDS,
+    COMPOSIO_POOL_TIMEOUT_SECONDS,
+    COMPOSIO_KEEPALIVE_SECONDS,
+    COMPOSIO_MAX_RETRIES,
+    COMPOSIO_RETRY_BASE_SECONDS,
+    COMPOSIO_RETRY_MAX_SECONDS,
+)
+
+# Errors worth retrying: dropped connections, timeouts, 429s and 5xx responses
+TRANSIENT_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+
+class ComposioPoolExhaustedError(Exception):
+    """Raised when no pool slot frees up within the pool timeout."""
+
+
+class ComposioPool:
+    """One shared, thread-safe Composio client with a keep-alive connection pool.
+
+    The client is built lazily on first use and reused by every tool call, so
+    auth setup, tool schema lookups and TCP/TLS connections are paid once per
+    process instead of once per call. Concurrency is bounded to pool_size, and
+    transient failures are retried with full-jitter exponential backoff.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = COMPOSIO_POOL_SIZE,
+        timeout: float = COMPOSIO_TIMEOUT_SECONDS,
+        connect_timeout: float = COMPOSIO_CONNECT_TIMEOUT_SECONDS,
+        pool_timeout: float = COMPOSIO_POOL_TIMEOUT_SECONDS,
+        keepalive_expiry: float = COMPOSIO_KEEPALIVE_SECONDS,
+        max_retries: int = COMPOSIO_MAX_RETRIES,
+        retry_base: float = COMPOSIO_RETRY_BASE_SECONDS,
+        retry_max: float = COMPOSIO_RETRY_MAX_SECONDS,
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_timeout = pool_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self._client: Optional[Composio] = None
+        self._client_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "pool_timeouts": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "total_wait_seconds": 0.0,
+            "total_request_seconds": 0.0,
+        }
+
+    @property
+    def client(self) -> Composio:
+        """The shared Composio client, created on first access."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    def _build_client(self) -> Composio:
+        print(f"Creating shared Composio client (pool size {self.pool_size})")
+        # Retries are handled here so they can be jittered and counted
+        composio = Composio(timeout=self.timeout, max_retries=0)
+        # The SDK does not accept an http_client, so swap in a pooled one that
+        # keeps connections alive between calls. This reaches into a private
+        # attribute (composio-client is pinned for it); if a release moves it,
+        # keep the stock client rather than break every tool call
+        http_client = getattr(getattr(composio, "client", None), "_client", None)
+        if not isinstance(http_client, httpx.Client):
+            print(
+                "WARNING: Composio SDK client has no httpx.Client at client._client "
+                f"(found {type(http_client).__name__}); using its default connection handling"
+            )
+            return composio
+        composio.client._client = httpx.Client(
+            base_url=http_client.base_url,
+            timeout=httpx.Timeout(
+                self.timeout, connect=self.connect_timeout, pool=self.pool_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            follow_redirects=True,
+        )
+        http_client.close()
+        return composio
+
+    def execute(self, slug: str, user_id: str, arguments: dict) -> dict:
+        """Execute a Composio tool through the shared client with retries."""
+        wait_started = time.monotonic()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            self._record(pool_timeouts=1, failures=1)
+            raise ComposioPoolExhaustedError(
+                f"No Composio connection available after {self.pool_timeout}s"
+            )
+        waited = time.monotonic() - wait_started
+        self._enter(waited)
+
+        request_started = time.monotonic()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return self.client.tools.execute(
+                        slug=slug, user_id=user_id, arguments=arguments
+                    )
+                except TRANSIENT_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        self._record(failures=1)
+                        raise
+                    delay = random.uniform(
+                        0, min(self.retry_max, self.retry_base * (2 ** attempt))
+                    )
+                    attempt += 1
+                    self._record(retries=1)
+                    print(
+                        f"Transient Composio error ({type(e).__name__}), "
+                        f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                    )
+                    time.sleep(delay)
+                except Exception:
+                    self._record(failures=1)
+                    raise
+        finally:
+            self._exit(time.monotonic() - request_started)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Return request, retry and pool occupancy counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pool_size"] = self.pool_size
+        stats["client_created"] = self._client is not None
+        return stats
+
+    def _enter(self, waited: float) -> None:
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(
+                self._stats["peak_in_flight"], self._stats["in_flight"]
+            )
+            self._stats["total_wait_seconds"] += waited
+
+    def _exit(self, elapsed: float) -> None:
+        with self._stats_lock:
+            self._stats["in_flight"] -= 1
+            self._stats["total_request_seconds"] += elapsed
+
+    def _record(self, **counters) -> None:
+        with self._stats_lock:
+            for name, value in counters.items():
+                self._stats[name] += value
+
+
+composio_pool = ComposioPool()
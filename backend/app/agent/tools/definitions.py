@@ -57,7 +57,10 @@ tool_definitions = [
     },
     {
         "name": "analyze_results",
-        "description": "Analyze tool results.",
+        "description": (
+            "Analyze tool results. Returns a short summary, key findings, "
+            "supported decisions and a confidence level."
+        ),
         "input_schema": {
             "type": "object",
             "properties": {
@@ -85,8 +88,24 @@ tool_definitions = [
     },
     {
         "name": "analyze_user_account",
-        "description": "Analyze the user's finances by going through their accounts.",
-        "input_schema": {"type": "object", "properties": {}, "required": []},
+        "description": (
+            "Analyze the user's finances by going through their accounts. Returns "
+            "spend by category, month-over-month change, savings rate, "
+            "emergency-fund months, subscriptions and recommendations."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "include_narrative": {
+                    "type": "boolean",
+                    "description": (
+                        "Also generate written advice with a separate model call. "
+                        "Slower; only set this when the user asks for a written review."
+                    ),
+                }
+            },
+            "required": [],
+        },
     },
 ]
 
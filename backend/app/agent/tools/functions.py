@@ -1,9 +1,12 @@
+import functools
 import anthropic  # type: ignore
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from app.chat.accounts.schemas import (  # type: ignore
     User,
     ToolResults,
     ToolResultsAnalysis,
+    ResultsSummary,
     UserAnalysis,
     AccountAnalysis,
 )
@@ -17,10 +20,28 @@ from app.agent.tools.artifacts import (  # type: ignore
     MarketResult,
     PriceMovement,
 )
-from app.chat.accounts.data import mock_user_data # type: ignore
+from app.chat.accounts.queries import data_version, load_user # type: ignore
+from app.chat.accounts.aggregates import aggregate_index # type: ignore
+from app.chat.accounts.columnar import transaction_store_index # type: ignore
+from app.chat.accounts.analytics import compute_metrics, summarize # type: ignore
+from app.agent.tools.analysis_cache import ( # type: ignore
+    analysis_cache,
+    results_analysis_cache,
+    results_hash,
+)
+from app.observability import span # type: ignore
+from app.config import ( # type: ignore
+    ACCOUNT_NARRATIVE_MODE,
+    ANALYZE_RESULTS_MODEL,
+    ANALYZE_RESULTS_MAX_TOKENS,
+    ANALYZE_RESULTS_THINKING_BUDGET,
+)
 
 CLIENT = anthropic.Anthropic()
 
+# Generates narratives off the request path in "background" mode
+NARRATIVE_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="account-narrative")
+
 
 def format_user_account_to_markdown(user: User) -> str:
     output = []
@@ -77,71 +98,230 @@ def format_tool_results_to_markdown(tool_results: dict) -> str:
     return tool_results_entry
 
 
-def analyze_results(results: ToolResults):
-    """Analyze the results of a tool call."""
-    results_formated = format_tool_results_to_markdown(results)
-    response = CLIENT.messages.create(
-        model="claude-3-7-sonnet-20250219",
-        max_tokens=4000,
-        thinking={
-            "type": "enabled",
-            "budget_tokens": 2000,
-        },
-        messages=[
+RESULTS_SUMMARY_TOOL = {
+    "name": "report_analysis",
+    "description": "Report the analysis of the tool results.",
+    "input_schema": ResultsSummary.model_json_schema(),
+}
+
+
+def _request_results_summary(results_formated: str) -> ResultsSummary:
+    params = {
+        "model": ANALYZE_RESULTS_MODEL,
+        "max_tokens": ANALYZE_RESULTS_MAX_TOKENS,
+        "tools": [RESULTS_SUMMARY_TOOL],
+        "messages": [
             {
                 "role": "user",
-                "content": f"Analyzse these tool results to see what relavent decisions can be made: {results_formated}",
+                "content": (
+                    "Analyze these tool results to see what relevant decisions can be made. "
+                    f"Be brief and specific.\n\n{results_formated}"
+                ),
             }
         ],
+    }
+    if ANALYZE_RESULTS_THINKING_BUDGET:
+        # Thinking cannot be combined with a forced tool choice
+        params["max_tokens"] += ANALYZE_RESULTS_THINKING_BUDGET
+        params["thinking"] = {"type": "enabled", "budget_tokens": ANALYZE_RESULTS_THINKING_BUDGET}
+        params["tool_choice"] = {"type": "auto"}
+    else:
+        params["tool_choice"] = {"type": "tool", "name": RESULTS_SUMMARY_TOOL["name"]}
+
+    with span("model_call", ANALYZE_RESULTS_MODEL):
+        response = CLIENT.messages.create(**params)
+    for block in response.content:
+        if block.type == "tool_use" and block.name == RESULTS_SUMMARY_TOOL["name"]:
+            return ResultsSummary.model_validate(block.input)
+    raise ValueError(f"{ANALYZE_RESULTS_MODEL} did not return an analysis (stop reason: {response.stop_reason})")
+
+
+def analyze_results(results: ToolResults) -> ResultsSummary:
+    """
+    Analyze the results of a tool call on ANALYZE_RESULTS_MODEL. The answer
+    is forced into the ResultsSummary schema and cached on a hash of the
+    results, so repeated calls with the same input skip the model.
+    """
+    results_formated = format_tool_results_to_markdown(results)
+    return results_analysis_cache.get_or_compute(
+        results_hash(results, ANALYZE_RESULTS_MODEL),
+        lambda: _request_results_summary(results_formated),
     )
-    return response
 
 
-def analyze_user_account() -> UserAnalysis:
-    """Analyze a user account."""
-    user_data = mock_user_data[0]
-    user_formatted = format_user_account_to_markdown(user_data)
-    
+def format_user_aggregates_to_markdown(aggregates: dict) -> str:
+    """Format precomputed user aggregates to markdown for the model."""
+    savings_rate = aggregates["savings_rate"]
+    lines = [
+        f"## User: {aggregates['user_id']}",
+        f"- **Total balance:** ${aggregates['total_balance']:.2f}",
+        f"- **Income (excl. transfers):** ${aggregates['income']:.2f}",
+        f"- **Spending (excl. transfers):** ${aggregates['spend']:.2f}",
+        f"- **Savings rate:** {savings_rate:.1%}" if savings_rate is not None else "- **Savings rate:** n/a",
+        "",
+        "**Spending by category:**",
+    ]
+    for category, total in aggregates["expenses_by_category"].items():
+        lines.append(f"- {category}: ${total:.2f}")
+    lines += ["", "**Income vs spending by month:**"]
+    for month, spend in aggregates["spend_by_month"].items():
+        income = aggregates["income_by_month"].get(month, 0.0)
+        lines.append(f"- {month}: income ${income:.2f}, spending ${spend:.2f}")
+    lines += ["", "**Recurring transactions:**"]
+    for charge in aggregates["recurring_charges"]:
+        lines.append(
+            f"- {charge['description']} ({charge['category']}): ${charge['amount']:.2f} "
+            f"in {len(charge['months'])} months"
+        )
+    for account in aggregates["accounts"]:
+        lines += [
+            "",
+            f"## Account: {account['name']}",
+            f"- **Balance:** ${account['balance']:.2f}",
+            f"- **Expenses:** {account['expense_count']} totalling ${account['expense_total']:.2f}",
+            f"- **Deposits:** {account['deposit_count']} totalling ${account['deposit_total']:.2f}",
+        ]
+    return "\n".join(lines)
+
+
+def format_metrics_to_markdown(metrics: dict) -> str:
+    """Format the computed account metrics to markdown for the model."""
+    fund = metrics["emergency_fund"]
+    lines = [
+        "**Emergency fund:** "
+        + (
+            f"{fund['months']:.1f} months of spending (${fund['liquid_balance']:.2f} "
+            f"against ${fund['average_monthly_spend']:.2f}/month)"
+            if fund["months"] is not None
+            else "n/a"
+        ),
+    ]
+    mom = metrics["month_over_month"]
+    if mom:
+        lines += ["", f"**Change from {mom['previous_month']} to {mom['current_month']}:**"]
+        lines.append(f"- Total: ${mom['previous_spend']:.2f} -> ${mom['current_spend']:.2f}")
+        for row in mom["categories"]:
+            lines.append(f"- {row['category']}: ${row['previous']:.2f} -> ${row['current']:.2f}")
+    lines += ["", "**Subscriptions:**"]
+    for subscription in metrics["subscriptions"]:
+        lines.append(
+            f"- {subscription['description']} ({subscription['category']}): "
+            f"${subscription['amount']:.2f} {subscription['cadence']}"
+        )
+    return "\n".join(lines)
+
+
+def generate_account_narrative(user_formatted: str) -> str:
+    """Ask Claude for financial advice on the formatted account summary."""
     # Call Claude to analyze the financial data
-    response = CLIENT.messages.create(
-        model="claude-3-haiku-20240307",
-        max_tokens=4000,
-        messages=[
-            {
-                "role": "user",
-                "content": f"analyze my finances to provide useful advice on how to improve my finances: {user_formatted}",
-            }
-        ],
-    )
-    
+    with span("model_call", "claude-3-haiku-20240307"):
+        response = CLIENT.messages.create(
+            model="claude-3-haiku-20240307",
+            max_tokens=4000,
+            messages=[
+                {
+                    "role": "user",
+                    "content": f"analyze my finances to provide useful advice on how to improve my finances: {user_formatted}",
+                }
+            ],
+        )
+
     # Extract the analysis text from Claude's response
     overall_analysis = ""
     if hasattr(response, 'content') and response.content:
         for content_block in response.content:
             if hasattr(content_block, 'text'):
                 overall_analysis += content_block.text
-    
+    return overall_analysis
+
+
+def analyze_user_account(user_id: Optional[int], include_narrative: bool = False) -> UserAnalysis:
+    """
+    Analyze the accounts of the given user. Needs an app context for the database.
+
+    Metrics and recommendations are computed locally. The model's written
+    narrative is only generated when include_narrative is set (or in the
+    background, per ACCOUNT_NARRATIVE_MODE); otherwise a cached one is used
+    if there is one.
+    """
+    if user_id is None:
+        return UserAnalysis(
+            id="",
+            name="Anonymous",
+            account_analysis=[],
+            overall_analysis="Sign in to analyze your accounts.",
+            error=True,
+        )
+
+    # Totals and recurring charges come from the precomputed index and
+    # per-transaction metrics from the columnar stores; both only reload
+    # transactions when the data version changes, and share one load.
+    # The metrics are computed once per version and kept with the aggregates.
+    version = data_version(user_id)
+    load = functools.cache(lambda: load_user(user_id))
+    aggregates = aggregate_index.get(user_id, version, load) if version else None
+    if aggregates is None:
+        return UserAnalysis(
+            id=str(user_id),
+            name=f"User {user_id}",
+            account_analysis=[],
+            overall_analysis="No financial data found for this user.",
+            error=True,
+        )
+    metrics = dict(
+        aggregate_index.memoize(
+            user_id,
+            version,
+            "metrics",
+            lambda: compute_metrics(aggregates, transaction_store_index.get(user_id, version, load) or []),
+        )
+    )
+    recommendations = metrics.pop("recommendations")
+
+    # The narrative only changes with the data, so it is memoized on the
+    # data version; the summary sent to the model is only built on a miss
+    def narrate() -> str:
+        user_formatted = format_user_aggregates_to_markdown(aggregates) + "\n\n" + format_metrics_to_markdown(metrics)
+        return generate_account_narrative(user_formatted)
+
+    narrative = None
+    if ACCOUNT_NARRATIVE_MODE != "off":
+        if include_narrative:
+            narrative = analysis_cache.get_or_compute(user_id, version, narrate)
+        else:
+            narrative = analysis_cache.get(user_id, version)
+            if narrative is None and ACCOUNT_NARRATIVE_MODE == "background":
+                NARRATIVE_EXECUTOR.submit(analysis_cache.get_or_compute, user_id, version, narrate)
+
     # Create structured account analysis for each account
     account_analyses = []
-    for account in user_data.accounts:
-        expense_count = len(account.expenses)
-        deposit_count = len(account.deposits)
-        
+    for account in aggregates["accounts"]:
         account_analysis = AccountAnalysis(
-            id=str(account.id),
-            name=account.name,
-            analysis=f"Account with balance ${account.balance:.2f}, {expense_count} expenses, {deposit_count} deposits",
-            error=False
+            id=str(account["id"]),
+            name=account["name"],
+            analysis=f"Account with balance ${account['balance']:.2f}, {account['expense_count']} expenses, {account['deposit_count']} deposits",
+            error=False,
+            balance=account["balance"],
+            expense_count=account["expense_count"],
+            deposit_count=account["deposit_count"],
+            aggregates=account,
         )
         account_analyses.append(account_analysis)
     
     # Create structured UserAnalysis object
     user_analysis = UserAnalysis(
-        id=str(user_data.id),
-        name=f"User {user_data.id}",
+        id=str(user_id),
+        name=f"User {user_id}",
         account_analysis=account_analyses,
-        overall_analysis=overall_analysis,
-        error=False
+        overall_analysis=narrative or summarize(metrics),
+        error=False,
+        total_balance=aggregates["total_balance"],
+        total_accounts=aggregates["total_accounts"],
+        savings_rate=aggregates["savings_rate"],
+        aggregates={key: value for key, value in aggregates.items() if key != "accounts"},
+        metrics=metrics,
+        recommendations=recommendations,
+        narrative=narrative,
     )
     
     return user_analysis
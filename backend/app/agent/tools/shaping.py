@@ -0,0 +1,141 @@
+from typing import Dict, List, Optional
+from app.serialization import PreEncoded, dumps, dumps_str  # type: ignore
+from app.config import (  # type: ignore
+    TOOL_RESULT_MAX_ORGANIC,
+    TOOL_RESULT_MAX_FORUMS,
+    TOOL_RESULT_MAX_MARKETS,
+    TOOL_RESULT_SNIPPET_CHARS,
+)
+
+# When a ticker is listed in several regions, describe it from the first of these
+REGION_PRIORITY = ["us", "featured", "europe", "asia", "crypto", "currencies", "futures"]
+
+# Result-count caps per tool: how many organic results, forum threads and
+# market rows the model sees. The frontend still gets everything.
+TOOL_RESULT_CAPS = {
+    "COMPOSIO_SEARCH_SEARCH": {"organic": TOOL_RESULT_MAX_ORGANIC, "forums": TOOL_RESULT_MAX_FORUMS, "markets": 0},
+    "COMPOSIO_SEARCH_FINANCE_SEARCH": {"organic": 0, "forums": 0, "markets": TOOL_RESULT_MAX_MARKETS},
+    "COMPOSIO_SEARCH_NEWS_SEARCH": {"organic": TOOL_RESULT_MAX_ORGANIC, "forums": 0, "markets": 0},
+    "COMPOSIO_SEARCH_EVENT_SEARCH": {"organic": TOOL_RESULT_MAX_ORGANIC, "forums": 0, "markets": 0},
+}
+
+# Answers shown per forum thread
+MAX_FORUM_ANSWERS = 2
+
+
+def _clip(text: Optional[str], limit: int = TOOL_RESULT_SNIPPET_CHARS) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def dedupe_markets(markets: Dict[str, list]) -> List[dict]:
+    """
+    Flatten market rows from every region, one row per ticker. The row from
+    the highest-priority region is kept and lists all regions it appeared in.
+    """
+    ordered_regions = sorted(
+        markets,
+        key=lambda region: REGION_PRIORITY.index(region) if region in REGION_PRIORITY else len(REGION_PRIORITY),
+    )
+    by_ticker: Dict[str, dict] = {}
+    for region in ordered_regions:
+        for row in markets[region] or []:
+            key = (row.get("stock") or row.get("name") or "").upper()
+            if not key:
+                continue
+            if key in by_ticker:
+                if region not in by_ticker[key]["regions"]:
+                    by_ticker[key]["regions"].append(region)
+            else:
+                by_ticker[key] = {"row": row, "regions": [region]}
+    return [{**entry["row"], "regions": entry["regions"]} for entry in by_ticker.values()]
+
+
+def _market_line(row: dict) -> str:
+    label = row.get("stock") or row.get("name")
+    if row.get("name") and row.get("name") != label:
+        label = f"{label} ({row['name']})"
+    price = row.get("price")
+    parts = [label, f"{price:g}" if isinstance(price, (int, float)) else "n/a"]
+    movement = row.get("price_movement") or {}
+    if movement.get("percentage") is not None:
+        sign = "-" if movement.get("movement") == "Down" else "+"
+        parts.append(f"{sign}{abs(movement['percentage']):.2f}%")
+    parts.append(f"[{', '.join(row['regions'])}]")
+    return " ".join(parts)
+
+
+def _organic_lines(position: int, result: dict) -> List[str]:
+    source = ", ".join(part for part in (result.get("source"), result.get("date")) if part)
+    header = f"{position}. {_clip(result.get('title'), 160)}"
+    if source:
+        header += f" ({source})"
+    lines = [header]
+    if result.get("snippet"):
+        lines.append(f"   {_clip(result['snippet'])}")
+    if result.get("link"):
+        lines.append(f"   {result['link']}")
+    return lines
+
+
+def shape_search_results(tool_name: str, parsed: dict) -> str:
+    """
+    Compact text rendering of a parsed search result for the model: capped
+    result counts, only the fields it reasons about, no favicons or
+    tracking links, and tickers deduplicated across market regions.
+    Reads parsed without modifying it, so cached results stay intact.
+    """
+    if "error" in parsed:
+        return dumps_str(parsed)
+
+    caps = TOOL_RESULT_CAPS.get(
+        tool_name, {"organic": TOOL_RESULT_MAX_ORGANIC, "forums": TOOL_RESULT_MAX_FORUMS, "markets": TOOL_RESULT_MAX_MARKETS}
+    )
+    results = parsed.get("search_results") or {}
+    sections = []
+
+    markets = dedupe_markets(results.get("markets") or {})
+    if markets and caps["markets"]:
+        lines = [f"Markets ({min(len(markets), caps['markets'])} of {len(markets)} tickers; symbol price change [regions]):"]
+        lines += [_market_line(row) for row in markets[:caps["markets"]]]
+        sections.append("\n".join(lines))
+
+    organic = results.get("organic_results") or []
+    if organic and caps["organic"]:
+        lines = [f"Results ({min(len(organic), caps['organic'])} of {len(organic)}):"]
+        for position, result in enumerate(organic[:caps["organic"]], 1):
+            lines += _organic_lines(position, result)
+        sections.append("\n".join(lines))
+
+    forums = results.get("discussions_and_forums") or []
+    if forums and caps["forums"]:
+        lines = [f"Discussions ({min(len(forums), caps['forums'])} of {len(forums)}):"]
+        for forum in forums[:caps["forums"]]:
+            lines.append(f"- {_clip(forum.get('title'), 160)} ({forum.get('source') or 'forum'})")
+            for answer in (forum.get("answers") or [])[:MAX_FORUM_ANSWERS]:
+                lines.append(f"  > {_clip(answer.get('snippet'))}")
+        sections.append("\n".join(lines))
+
+    return "\n\n".join(sections) or "No results found."
+
+
+class ToolResult(PreEncoded):
+    """
+    A tool result serialized once for the client, plus the (usually much
+    smaller) content sent to the model as the tool_result.
+    """
+
+    __slots__ = ("model_content",)
+
+    def __init__(self, value: dict, encoded: bytes, model_content: str):
+        super().__init__(value, encoded)
+        self.model_content = model_content
+
+    @classmethod
+    def build(cls, tool_name: str, value: dict) -> "ToolResult":
+        encoded = dumps(value)
+        if "search_results" in value:
+            model_content = shape_search_results(tool_name, value["search_results"])
+        else:
+            model_content = encoded.decode("utf-8")
+        return cls(value, encoded, model_content)
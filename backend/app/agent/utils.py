@@ -1,4 +1,9 @@
+import anthropic  # type: ignore
 
+# Model used for token counting when the caller does not name one
+MODEL_NAME = "claude-sonnet-4-20250514"
+
+_client = None
 
 
 # Helper functions
@@ -24,17 +29,20 @@ def print_thinking_response(response):
     
     
 
-def count_tokens(messages, tools=None):
-    """Count tokens for a given message list with optional tools."""
+def count_tokens(messages, tools=None, system=None, thinking=None, client=None, model=None):
+    """Count input tokens for a message list with optional tools, system prompt and thinking."""
+    global _client
+    if client is None:
+        if _client is None:
+            _client = anthropic.Anthropic()
+        client = _client
+
+    params = {"model": model or MODEL_NAME, "messages": messages}
     if tools:
-        response = client.messages.count_tokens(
-            model=MODEL_NAME,
-            messages=messages,
-            tools=tools
-        )
-    else:
-        response = client.messages.count_tokens(
-            model=MODEL_NAME,
-            messages=messages
-        )
+        params["tools"] = tools
+    if system:
+        params["system"] = system
+    if thinking:
+        params["thinking"] = thinking
+    response = client.messages.count_tokens(**params)
     return response.input_tokens
@@ -0,0 +1,220 @@
+"""
+ASGI entry point.
+
+The chat endpoints are served natively by AsyncChatService so a single
+process can hold many long-running conversations without tying up a thread
+per request. Every other route falls through to the Flask app via WsgiToAsgi.
+
+Run with: uvicorn app.asgi:app --host 0.0.0.0 --port 8080 --workers N
+(each worker is a separate process with its own app, pools and caches).
+"""
+import asyncio
+from asgiref.sync import sync_to_async  # type: ignore
+from asgiref.wsgi import WsgiToAsgi  # type: ignore
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request  # type: ignore
+from app import create_app  # type: ignore
+from app.chat.async_services import AsyncChatService  # type: ignore
+from app.serialization import dumps, loads, sse_event  # type: ignore
+from app.observability import Trace, span  # type: ignore
+from app.config import CORS_ORIGINS  # type: ignore
+
+flask_app = create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+async_chat_service = AsyncChatService()
+async_chat_service.init_app(flask_app)
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+def _verify_account_user_id(scope):
+    headers = dict(scope.get("headers", []))
+    authorization = headers.get(b"authorization")
+    if not authorization:
+        return None
+    with flask_app.test_request_context(
+        headers={"Authorization": authorization.decode("latin-1")}
+    ):
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception as e:
+            raise InvalidTokenError(str(e))
+        identity = get_jwt_identity()
+    return int(identity) if identity is not None else None
+
+
+async def account_user_id(scope):
+    """
+    The signed-in user's id from the Authorization header, or None when no
+    token is sent. Verification runs through Flask-JWT-Extended so expiry
+    and revocation checks match the Flask routes. The revocation check can
+    query SQL or Redis, so it runs on a worker thread rather than stalling
+    every stream on the event loop.
+    """
+    return await sync_to_async(_verify_account_user_id, thread_sensitive=False)(scope)
+
+
+async def read_json(receive):
+    """Read the full request body and decode it as JSON, or return None."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    try:
+        return loads(body or b"{}")
+    except ValueError:
+        return None
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client has gone away. Call after the body has been read."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_until_disconnect(receive, coroutine):
+    """
+    Run coroutine as a task, cancelling it if the client disconnects first so
+    the agent run behind it stops calling the model and tools. Returns the
+    coroutine's result, or None if it was cancelled.
+    """
+    task = asyncio.ensure_future(coroutine)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        print("Client disconnected, cancelling chat request")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return None
+    return task.result()
+
+
+def response_headers(scope, content_type, extra=None):
+    headers = [(b"content-type", content_type.encode())]
+    # Same policy as flask-cors on the other routes: echo an allowed Origin
+    origin = dict(scope.get("headers", [])).get(b"origin", b"").decode("latin-1")
+    if origin in CORS_ORIGINS:
+        headers += [
+            (b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+    for name, value in (extra or {}).items():
+        headers.append((name.lower().encode(), value.encode()))
+    return headers
+
+
+async def send_json(scope, send, status, payload):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": response_headers(scope, "application/json"),
+        }
+    )
+    await send({"type": "http.response.body", "body": dumps(payload)})
+
+
+async def send_message(scope, receive, send):
+    """Send a message to the AI agent and get the full response."""
+    try:
+        user_id = await account_user_id(scope)
+    except InvalidTokenError as e:
+        await send_json(scope, send, 401, {"msg": str(e)})
+        return
+
+    data = await read_json(receive)
+    message = data.get("message") if isinstance(data, dict) else None
+    if not message:
+        await send_json(scope, send, 400, {"error": "Message is required"})
+        return
+
+    response_data = await run_until_disconnect(
+        receive,
+        async_chat_service.process_message_async(message, user_id, data.get("session_id")),
+    )
+    if response_data is not None:
+        await send_json(scope, send, 200, response_data)
+
+
+async def send_message_stream(scope, receive, send):
+    """Send a message to the AI agent and get a streaming SSE response."""
+    try:
+        user_id = await account_user_id(scope)
+    except InvalidTokenError as e:
+        await send_json(scope, send, 401, {"msg": str(e)})
+        return
+
+    data = await read_json(receive)
+    message = data.get("message") if isinstance(data, dict) else None
+    if not message:
+        await send_json(scope, send, 400, {"error": "Message is required"})
+        return
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": response_headers(
+                scope,
+                "text/event-stream",
+                {"Cache-Control": "no-cache", "Connection": "keep-alive"},
+            ),
+        }
+    )
+
+    async def stream_events():
+        trace = Trace()
+        async for event_data in async_chat_service.process_message_stream_async(
+            message, user_id, data.get("session_id"), trace
+        ):
+            with span("sse_emit", event_data["type"], trace):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": sse_event(event_data),
+                        "more_body": True,
+                    }
+                )
+        await send({"type": "http.response.body", "body": b""})
+
+    # A closed connection cancels pending model and tool work
+    await run_until_disconnect(receive, stream_events())
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async_routes = {
+    ("POST", "/api/chat/message"): send_message,
+    ("POST", "/api/chat/message/stream"): send_message_stream,
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+        return
+
+    if scope["type"] == "http":
+        handler = async_routes.get((scope["method"], scope["path"]))
+        if handler:
+            await handler(scope, receive, send)
+            return
+
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,329 @@
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from app.chat.accounts.schemas import User, Account, Expense, Deposit  # type: ignore
+from app.config import AGGREGATE_INDEX_MAX_USERS  # type: ignore
+
+# Money moved between a user's own accounts is neither income nor spending
+TRANSFER_CATEGORIES = {"transfer"}
+
+# A charge seen in at least this many distinct months is treated as recurring
+RECURRING_MIN_MONTHS = 2
+
+
+def transaction_month(date: Optional[str]) -> str:
+    """Bucket an ISO transaction date (YYYY-MM-DD) by month."""
+    return date[:7] if date else "unknown"
+
+
+class TransactionValues(NamedTuple):
+    """The fields of a written expense or deposit that the aggregates use."""
+
+    amount: float
+    category: str
+    date: Optional[str]
+    description: Optional[str]
+
+
+class AccountAggregates:
+    """Running totals for one account, updated one transaction at a time."""
+
+    def __init__(self, account_id: int, name: str, balance: float):
+        self.account_id = account_id
+        self.name = name
+        self.balance = balance
+        self.expense_count = 0
+        self.deposit_count = 0
+        self.expense_total = 0.0
+        self.deposit_total = 0.0
+        self.expenses_by_category: Dict[str, float] = defaultdict(float)
+        self.deposits_by_category: Dict[str, float] = defaultdict(float)
+        self.expenses_by_month: Dict[str, float] = defaultdict(float)
+        self.deposits_by_month: Dict[str, float] = defaultdict(float)
+        self.income_by_month: Dict[str, float] = defaultdict(float)
+        self.spend_by_month: Dict[str, float] = defaultdict(float)
+        # (kind, category, description, amount) -> {month: occurrences}
+        self._charges: Dict[tuple, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    @classmethod
+    def from_account(cls, account: Account) -> "AccountAggregates":
+        aggregates = cls(account.id, account.name, account.balance)
+        for expense in account.expenses:
+            aggregates.add_expense(expense)
+        for deposit in account.deposits:
+            aggregates.add_deposit(deposit)
+        return aggregates
+
+    def add_expense(self, expense: Expense) -> None:
+        self._apply("expense", expense, 1)
+
+    def add_deposit(self, deposit: Deposit) -> None:
+        self._apply("deposit", deposit, 1)
+
+    def _apply(self, kind: str, transaction, sign: int) -> None:
+        amount = transaction.amount
+        month = transaction_month(transaction.date)
+        is_transfer = transaction.category in TRANSFER_CATEGORIES
+
+        if kind == "expense":
+            self.expense_count += sign
+            self.expense_total += sign * amount
+            buckets = [(self.expenses_by_category, transaction.category), (self.expenses_by_month, month)]
+            if not is_transfer:
+                buckets.append((self.spend_by_month, month))
+        else:
+            self.deposit_count += sign
+            self.deposit_total += sign * amount
+            buckets = [(self.deposits_by_category, transaction.category), (self.deposits_by_month, month)]
+            if not is_transfer:
+                buckets.append((self.income_by_month, month))
+        for totals, key in buckets:
+            if sign > 0:
+                totals[key] += amount
+            else:
+                _subtract(totals, key, amount)
+
+        charge_key = (
+            kind,
+            transaction.category,
+            (transaction.description or "").strip().lower(),
+            round(transaction.amount, 2),
+        )
+        months = self._charges[charge_key]
+        months[month] += sign
+        if months[month] <= 0:
+            del months[month]
+        if not months:
+            del self._charges[charge_key]
+
+    @property
+    def income(self) -> float:
+        return sum(self.income_by_month.values())
+
+    @property
+    def spend(self) -> float:
+        return sum(self.spend_by_month.values())
+
+    def recurring_charges(self) -> list:
+        """Charges with the same category, description and amount in several months."""
+        recurring = []
+        for (kind, category, description, amount), months in self._charges.items():
+            if len(months) >= RECURRING_MIN_MONTHS:
+                recurring.append(
+                    {
+                        "kind": kind,
+                        "category": category,
+                        "description": description,
+                        "amount": amount,
+                        "months": sorted(months),
+                    }
+                )
+        return sorted(recurring, key=lambda charge: -charge["amount"])
+
+    def to_dict(self) -> dict:
+        income, spend = self.income, self.spend
+        return {
+            "id": self.account_id,
+            "name": self.name,
+            "balance": round(self.balance, 2),
+            "expense_count": self.expense_count,
+            "deposit_count": self.deposit_count,
+            "expense_total": round(self.expense_total, 2),
+            "deposit_total": round(self.deposit_total, 2),
+            "income": round(income, 2),
+            "spend": round(spend, 2),
+            "savings_rate": round((income - spend) / income, 4) if income else None,
+            "expenses_by_category": _rounded(self.expenses_by_category),
+            "deposits_by_category": _rounded(self.deposits_by_category),
+            "expenses_by_month": _rounded(self.expenses_by_month),
+            "deposits_by_month": _rounded(self.deposits_by_month),
+            "recurring_charges": self.recurring_charges(),
+        }
+
+
+class UserAggregates:
+    """Per-account aggregates for one user plus user-level rollups."""
+
+    def __init__(self, user_id: int, version: Optional[str] = None):
+        self.user_id = user_id
+        self.version = version
+        self.accounts: Dict[int, AccountAggregates] = {}
+        # Cached to_dict() result and values derived from this version of
+        # the data (see AggregateIndex.memoize), cleared whenever an account changes
+        self.snapshot: Optional[dict] = None
+        self.derived: Dict[str, Any] = {}
+
+    @classmethod
+    def from_user(cls, user: User, version: Optional[str] = None) -> "UserAggregates":
+        aggregates = cls(user.id, version)
+        for account in user.accounts:
+            aggregates.accounts[account.id] = AccountAggregates.from_account(account)
+        return aggregates
+
+    def apply(self, op: tuple) -> None:
+        """
+        Apply one change written to the database. Ops are
+        ("account", account_id, name, balance) for a new or edited account,
+        ("close_account", account_id), and ("add" or "remove", "expense" or
+        "deposit", account_id, TransactionValues). Raises KeyError for a
+        transaction on an account that is not indexed.
+        """
+        action = op[0]
+        if action == "account":
+            _, account_id, name, balance = op
+            account = self.accounts.get(account_id)
+            if account is None:
+                self.accounts[account_id] = AccountAggregates(account_id, name, balance)
+            else:
+                account.name, account.balance = name, balance
+        elif action == "close_account":
+            self.accounts.pop(op[1], None)
+        else:
+            _, kind, account_id, transaction = op
+            self.accounts[account_id]._apply(kind, transaction, 1 if action == "add" else -1)
+
+    def to_dict(self) -> dict:
+        accounts = [account.to_dict() for account in self.accounts.values()]
+        income = sum(account.income for account in self.accounts.values())
+        spend = sum(account.spend for account in self.accounts.values())
+
+        expenses_by_category: Dict[str, float] = defaultdict(float)
+        spend_by_month: Dict[str, float] = defaultdict(float)
+        income_by_month: Dict[str, float] = defaultdict(float)
+        for account in self.accounts.values():
+            for category, total in account.expenses_by_category.items():
+                if category not in TRANSFER_CATEGORIES:
+                    expenses_by_category[category] += total
+            for month, total in account.spend_by_month.items():
+                spend_by_month[month] += total
+            for month, total in account.income_by_month.items():
+                income_by_month[month] += total
+
+        return {
+            "user_id": self.user_id,
+            "total_balance": round(sum(a.balance for a in self.accounts.values()), 2),
+            "total_accounts": len(self.accounts),
+            "income": round(income, 2),
+            "spend": round(spend, 2),
+            "savings_rate": round((income - spend) / income, 4) if income else None,
+            "expenses_by_category": _rounded(expenses_by_category),
+            "spend_by_month": _rounded(spend_by_month),
+            "income_by_month": _rounded(income_by_month),
+            "recurring_charges": [
+                dict(charge, account_id=account.account_id)
+                for account in self.accounts.values()
+                for charge in account.recurring_charges()
+            ],
+            "accounts": accounts,
+        }
+
+
+class AggregateIndex:
+    """Thread-safe LRU of precomputed aggregates, one entry per user.
+
+    Entries are built from the user's transactions on first access and then
+    kept current by apply(), which receives the changes of every commit in
+    this process (see app.chat.accounts.models), so reads never rescan the
+    transaction history. Each entry remembers the data_version it is
+    current for. When a commit's changes do not follow on from that version
+    (e.g. another process wrote in between), the entry is dropped and the
+    next read rebuilds it. Least recently used users are dropped beyond
+    max_users.
+    """
+
+    def __init__(self, max_users: int = AGGREGATE_INDEX_MAX_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[int, UserAggregates]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: str, load: Callable[[], Optional[User]]) -> Optional[dict]:
+        """Return the aggregates for a user as structured data. Treat the result as read-only.
+
+        load is only called when the user is not indexed at this version; it
+        returns None when the user has no financial data.
+        """
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            if aggregates is not None and aggregates.version == version:
+                self._users.move_to_end(user_id)
+                if aggregates.snapshot is None:
+                    aggregates.snapshot = aggregates.to_dict()
+                return aggregates.snapshot
+
+        # Load outside the lock so one user's query does not block the rest
+        user = load()
+        if user is None:
+            with self._lock:
+                self._users.pop(user_id, None)
+            return None
+        aggregates = UserAggregates.from_user(user, version)
+        aggregates.snapshot = aggregates.to_dict()
+        with self._lock:
+            current = self._users.get(user_id)
+            # A commit or another read may have indexed a newer version meanwhile
+            if current is None or int(current.version) <= int(version):
+                self._users[user_id] = aggregates
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+        return aggregates.snapshot
+
+    def apply(self, user_id: int, version: int, bumps: int, ops: Optional[List[tuple]]) -> None:
+        """
+        Bring a user's entry up to version with the ops of a commit that
+        bumped their data_version bumps times. None for ops, or an entry at
+        any version other than version - bumps, drops the entry instead.
+        """
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            if aggregates is None or aggregates.version == str(version):
+                return
+            if ops is None or aggregates.version != str(version - bumps):
+                del self._users[user_id]
+                return
+            try:
+                for op in ops:
+                    aggregates.apply(op)
+            except KeyError:
+                del self._users[user_id]
+                return
+            aggregates.version = str(version)
+            aggregates.snapshot = None
+            aggregates.derived.clear()
+
+    def memoize(self, user_id: int, version: str, name: str, compute: Callable[[], Any]) -> Any:
+        """
+        A value derived from a user's data, computed once per data version
+        and kept with their aggregates until the next change. Treat the
+        result as read-only. Only cached while the user is indexed at version.
+        """
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            if aggregates is not None and aggregates.version == version and name in aggregates.derived:
+                return aggregates.derived[name]
+
+        value = compute()
+        with self._lock:
+            aggregates = self._users.get(user_id)
+            if aggregates is not None and aggregates.version == version:
+                aggregates.derived[name] = value
+        return value
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's aggregates so they are rebuilt on next access."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+def _subtract(totals: Dict[str, float], key: str, amount: float) -> None:
+    """Take amount out of a bucket, dropping the bucket once it is emptied."""
+    totals[key] -= amount
+    if abs(totals[key]) < 0.005:
+        del totals[key]
+
+
+def _rounded(totals: Dict[str, float]) -> Dict[str, float]:
+    return {key: round(value, 2) for key, value in sorted(totals.items())}
+
+
+aggregate_index = AggregateIndex()
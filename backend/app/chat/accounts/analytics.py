@@ -0,0 +1,321 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+import numpy as np  # type: ignore
+from app.chat.accounts.aggregates import TRANSFER_CATEGORIES  # type: ignore
+from app.chat.accounts.columnar import AccountStore, MISSING_DAY, epoch_day_to_date  # type: ignore
+
+# Months of spending averaged for the emergency-fund estimate
+EMERGENCY_FUND_LOOKBACK_MONTHS = 3
+EMERGENCY_FUND_TARGET_MONTHS = 3.0
+
+SAVINGS_RATE_TARGET = 0.2
+
+# A category is flagged when its spend moves by at least this share and amount
+MOM_ALERT_CHANGE = 0.25
+MOM_ALERT_AMOUNT = 50.0
+
+# Billing cadences: name -> (typical days between charges, tolerance in days, charges per month)
+SUBSCRIPTION_CADENCES = {
+    "weekly": (7, 1, 52 / 12),
+    "monthly": (30, 4, 1.0),
+    "quarterly": (91, 7, 1 / 3),
+    "yearly": (365, 10, 1 / 12),
+}
+SUBSCRIPTION_MIN_CHARGES = 2
+# Charges more than this far from the usual amount are a different bill
+SUBSCRIPTION_AMOUNT_TOLERANCE = 0.05
+
+
+def _dated_months(by_month: Dict[str, float]) -> List[str]:
+    return sorted(month for month in by_month if month != "unknown")
+
+
+def _change(current: float, previous: float) -> Optional[float]:
+    return round((current - previous) / previous, 4) if previous else None
+
+
+def category_spend_by_month(stores: List[AccountStore]) -> Dict[str, Dict[str, float]]:
+    """Spend per month and category across accounts, transfers excluded."""
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for store in stores:
+        expenses = store.expenses
+        dated = expenses.days != MISSING_DAY
+        if not dated.any():
+            continue
+        months = expenses.days[dated].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        # One integer key per (month, category) pair
+        width = len(expenses.categories)
+        keys, inverse = np.unique(
+            months * width + expenses.category_codes[dated], return_inverse=True
+        )
+        sums = np.bincount(inverse.ravel(), weights=expenses.amounts[dated])
+        for key, total in zip(keys, sums):
+            month, code = divmod(int(key), width)
+            category = expenses.categories[code]
+            if category not in TRANSFER_CATEGORIES:
+                totals[str(np.datetime64(month, "M"))][category] += float(total)
+    return {month: dict(categories) for month, categories in totals.items()}
+
+
+def month_over_month(aggregates: dict, stores: List[AccountStore]) -> Optional[dict]:
+    """Change in spending between the two most recent months with data."""
+    months = _dated_months(aggregates["spend_by_month"])
+    if len(months) < 2:
+        return None
+    previous, current = months[-2], months[-1]
+    by_month = category_spend_by_month(stores)
+    current_categories = by_month.get(current, {})
+    previous_categories = by_month.get(previous, {})
+
+    categories = []
+    for category in sorted(set(current_categories) | set(previous_categories)):
+        now, before = current_categories.get(category, 0.0), previous_categories.get(category, 0.0)
+        categories.append(
+            {
+                "category": category,
+                "current": round(now, 2),
+                "previous": round(before, 2),
+                "change": round(now - before, 2),
+                "change_pct": _change(now, before),
+            }
+        )
+    categories.sort(key=lambda row: -abs(row["change"]))
+
+    current_spend = aggregates["spend_by_month"][current]
+    previous_spend = aggregates["spend_by_month"][previous]
+    return {
+        "current_month": current,
+        "previous_month": previous,
+        "current_spend": current_spend,
+        "previous_spend": previous_spend,
+        "change": round(current_spend - previous_spend, 2),
+        "change_pct": _change(current_spend, previous_spend),
+        "categories": categories,
+    }
+
+
+def spend_by_category(aggregates: dict) -> List[dict]:
+    """Categories by total spend, with each one's share of all spending."""
+    total = sum(aggregates["expenses_by_category"].values())
+    rows = [
+        {
+            "category": category,
+            "total": amount,
+            "share": round(amount / total, 4) if total else None,
+        }
+        for category, amount in aggregates["expenses_by_category"].items()
+    ]
+    return sorted(rows, key=lambda row: -row["total"])
+
+
+def savings_by_month(aggregates: dict) -> Dict[str, Optional[float]]:
+    income_by_month, spend_by_month = aggregates["income_by_month"], aggregates["spend_by_month"]
+    rates = {}
+    for month in _dated_months({**income_by_month, **spend_by_month}):
+        income = income_by_month.get(month, 0.0)
+        rates[month] = round((income - spend_by_month.get(month, 0.0)) / income, 4) if income else None
+    return rates
+
+
+def emergency_fund(aggregates: dict) -> dict:
+    """Months of recent average spending that positive balances would cover."""
+    months = _dated_months(aggregates["spend_by_month"])[-EMERGENCY_FUND_LOOKBACK_MONTHS:]
+    monthly_spend = (
+        sum(aggregates["spend_by_month"][month] for month in months) / len(months) if months else 0.0
+    )
+    liquid = sum(max(account["balance"], 0.0) for account in aggregates["accounts"])
+    return {
+        "liquid_balance": round(liquid, 2),
+        "average_monthly_spend": round(monthly_spend, 2),
+        "lookback_months": months,
+        "months": round(liquid / monthly_spend, 1) if monthly_spend else None,
+        "target_months": EMERGENCY_FUND_TARGET_MONTHS,
+    }
+
+
+def _cadence(gaps: np.ndarray) -> Optional[str]:
+    for name, (days, tolerance, _) in SUBSCRIPTION_CADENCES.items():
+        if np.all(np.abs(gaps - days) <= tolerance):
+            return name
+    return None
+
+
+def detect_subscriptions(stores: List[AccountStore]) -> List[dict]:
+    """
+    Expenses charged on a regular cadence: the same account, category and
+    description, a steady amount and evenly spaced dates.
+    """
+    subscriptions = []
+    for store in stores:
+        expenses = store.expenses
+        groups: Dict[tuple, List[int]] = defaultdict(list)
+        for row in np.flatnonzero(expenses.days != MISSING_DAY):
+            category = expenses.categories[expenses.category_codes[row]]
+            if category in TRANSFER_CATEGORIES:
+                continue
+            description = " ".join((expenses.description(row) or "").lower().split())
+            groups[(category, description)].append(row)
+
+        for (category, description), rows in groups.items():
+            if len(rows) < SUBSCRIPTION_MIN_CHARGES:
+                continue
+            rows = np.array(rows)[np.argsort(expenses.days[rows], kind="stable")]
+            amounts = expenses.amounts[rows]
+            typical = float(np.median(amounts))
+            if np.any(np.abs(amounts - typical) > typical * SUBSCRIPTION_AMOUNT_TOLERANCE):
+                continue
+            days = expenses.days[rows].astype(np.int64)
+            cadence = _cadence(np.diff(days))
+            if cadence is None:
+                continue
+            interval, _, per_month = SUBSCRIPTION_CADENCES[cadence]
+            subscriptions.append(
+                {
+                    "account_id": store.id,
+                    "category": category,
+                    "description": expenses.description(rows[-1]),
+                    "amount": round(float(amounts[-1]), 2),
+                    "cadence": cadence,
+                    "charges": len(rows),
+                    "monthly_cost": round(typical * per_month, 2),
+                    "annual_cost": round(typical * per_month * 12, 2),
+                    "last_charged": epoch_day_to_date(days[-1]),
+                    "next_expected": epoch_day_to_date(days[-1] + interval),
+                }
+            )
+    return sorted(subscriptions, key=lambda subscription: -subscription["monthly_cost"])
+
+
+def _recommendations(metrics: dict) -> List[dict]:
+    """Rule-based recommendations in the shape the frontend renders."""
+    recommendations = []
+    fund = metrics["emergency_fund"]
+    if fund["months"] is not None and fund["months"] < fund["target_months"]:
+        shortfall = (fund["target_months"] - fund["months"]) * fund["average_monthly_spend"]
+        recommendations.append(
+            {
+                "category": "Emergency fund",
+                "title": "Build your emergency fund",
+                "description": (
+                    f"Your balances cover {fund['months']:.1f} months of spending; "
+                    f"{fund['target_months']:.0f} months is a common target."
+                ),
+                "priority": "high",
+                "action_items": [
+                    f"Set aside about ${shortfall:,.0f} more to reach {fund['target_months']:.0f} months",
+                    "Automate a transfer to savings on payday",
+                ],
+            }
+        )
+
+    savings_rate = metrics["savings_rate"]
+    if savings_rate is not None and savings_rate < SAVINGS_RATE_TARGET:
+        recommendations.append(
+            {
+                "category": "Savings",
+                "title": "Raise your savings rate",
+                "description": (
+                    f"You keep {savings_rate:.0%} of your income; aim for "
+                    f"{SAVINGS_RATE_TARGET:.0%} or more."
+                ),
+                "priority": "high" if savings_rate < 0 else "medium",
+                "action_items": [
+                    f"Trim {row['category']} (${row['total']:,.2f} so far)"
+                    for row in metrics["spend_by_category"][:2]
+                ],
+            }
+        )
+
+    mom = metrics["month_over_month"]
+    if mom:
+        rising = [
+            row for row in mom["categories"]
+            if row["change"] >= MOM_ALERT_AMOUNT
+            and (row["change_pct"] is None or row["change_pct"] >= MOM_ALERT_CHANGE)
+        ]
+        if rising:
+            recommendations.append(
+                {
+                    "category": "Spending trend",
+                    "title": f"Spending rose in {rising[0]['category']}",
+                    "description": (
+                        f"{mom['current_month']} spending in {rising[0]['category']} was "
+                        f"${rising[0]['current']:,.2f}, up ${rising[0]['change']:,.2f} "
+                        f"from {mom['previous_month']}."
+                    ),
+                    "priority": "medium",
+                    "action_items": [
+                        f"Check {row['category']}: +${row['change']:,.2f}" for row in rising[:3]
+                    ],
+                }
+            )
+
+    subscriptions = metrics["subscriptions"]
+    if subscriptions:
+        monthly = sum(subscription["monthly_cost"] for subscription in subscriptions)
+        recommendations.append(
+            {
+                "category": "Subscriptions",
+                "title": "Review recurring charges",
+                "description": (
+                    f"{len(subscriptions)} recurring charges cost about ${monthly:,.2f} a month "
+                    f"(${monthly * 12:,.2f} a year)."
+                ),
+                "priority": "low",
+                "action_items": [
+                    f"{subscription['description']}: ${subscription['amount']:,.2f} {subscription['cadence']}"
+                    for subscription in subscriptions[:3]
+                ],
+            }
+        )
+    return recommendations
+
+
+def summarize(metrics: dict) -> str:
+    """Short plain-text summary of the metrics, used when there is no narrative."""
+    sentences = []
+    if metrics["spend_by_category"]:
+        top = metrics["spend_by_category"][0]
+        sentences.append(
+            f"Total spending is ${metrics['spend']:,.2f} against ${metrics['income']:,.2f} of income; "
+            f"{top['category']} is the largest category at {top['share']:.0%}."
+        )
+    if metrics["savings_rate"] is not None:
+        sentences.append(f"Savings rate: {metrics['savings_rate']:.0%}.")
+    mom = metrics["month_over_month"]
+    if mom and mom["change_pct"] is not None:
+        direction = "up" if mom["change"] >= 0 else "down"
+        sentences.append(
+            f"Spending in {mom['current_month']} was {direction} {abs(mom['change_pct']):.0%} "
+            f"from {mom['previous_month']}."
+        )
+    fund = metrics["emergency_fund"]
+    if fund["months"] is not None:
+        sentences.append(f"Balances cover {fund['months']:.1f} months of spending.")
+    if metrics["subscriptions"]:
+        monthly = sum(subscription["monthly_cost"] for subscription in metrics["subscriptions"])
+        sentences.append(
+            f"{len(metrics['subscriptions'])} recurring charges total ${monthly:,.2f} a month."
+        )
+    return " ".join(sentences)
+
+
+def compute_metrics(aggregates: dict, stores: List[AccountStore]) -> dict:
+    """
+    Deterministic financial metrics for one user from their precomputed
+    aggregates and columnar transaction stores: spend by category,
+    month-over-month change, savings rate, emergency-fund months and
+    recurring charges, plus rule-based recommendations.
+    """
+    metrics = {
+        "income": aggregates["income"],
+        "spend": aggregates["spend"],
+        "savings_rate": aggregates["savings_rate"],
+        "savings_rate_by_month": savings_by_month(aggregates),
+        "spend_by_category": spend_by_category(aggregates),
+        "month_over_month": month_over_month(aggregates, stores),
+        "emergency_fund": emergency_fund(aggregates),
+        "subscriptions": detect_subscriptions(stores),
+    }
+    metrics["recommendations"] = _recommendations(metrics)
+    return metrics
@@ -0,0 +1,336 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Type, Union
+import numpy as np  # type: ignore
+from app.chat.accounts.schemas import User, Account, Expense, Deposit  # type: ignore
+from app.config import TRANSACTION_STORE_MAX_USERS, TRANSACTION_STORE_MAX_BYTES  # type: ignore
+
+# Epoch day stored for transactions without a date
+MISSING_DAY = np.iinfo(np.int32).min
+
+
+def date_to_epoch_day(date: Optional[str]) -> int:
+    """Convert an ISO date (YYYY-MM-DD) to days since 1970-01-01."""
+    if date is None:
+        return MISSING_DAY
+    day = np.datetime64(date, "D")
+    if str(day) != date:
+        raise ValueError(f"Transaction date {date!r} is not an ISO YYYY-MM-DD date")
+    return int(day.astype(np.int64))
+
+
+def epoch_day_to_date(day: int) -> Optional[str]:
+    if day == MISSING_DAY:
+        return None
+    return str(np.datetime64(int(day), "D"))
+
+
+class TransactionStore:
+    """Column-oriented storage for one kind of transaction (expenses or deposits).
+
+    Each transaction is a row across parallel NumPy arrays: id, amount,
+    category code, epoch-day date and an offset into one shared description
+    buffer. Aggregations run as vectorized array operations instead of
+    per-object attribute access and date string parsing.
+    """
+
+    def __init__(
+        self,
+        model: Type[Union[Expense, Deposit]],
+        ids: np.ndarray,
+        amounts: np.ndarray,
+        category_codes: np.ndarray,
+        categories: List[str],
+        days: np.ndarray,
+        description_offsets: np.ndarray,
+        description_present: np.ndarray,
+        description_buffer: str,
+    ):
+        self.model = model
+        self.ids = ids
+        self.amounts = amounts
+        self.category_codes = category_codes
+        self.categories = categories
+        self.days = days
+        self.description_offsets = description_offsets
+        self.description_present = description_present
+        self.description_buffer = description_buffer
+
+    @classmethod
+    def from_models(cls, transactions: list, model: Type[Union[Expense, Deposit]]) -> "TransactionStore":
+        """Build a store from Expense or Deposit models."""
+        categories: List[str] = []
+        category_lookup: Dict[str, int] = {}
+        codes = []
+        descriptions = []
+        offsets = [0]
+        for transaction in transactions:
+            code = category_lookup.get(transaction.category)
+            if code is None:
+                code = len(categories)
+                category_lookup[transaction.category] = code
+                categories.append(transaction.category)
+            codes.append(code)
+            description = transaction.description or ""
+            descriptions.append(description)
+            offsets.append(offsets[-1] + len(description))
+
+        return cls(
+            model=model,
+            ids=np.fromiter((t.id for t in transactions), dtype=np.int64, count=len(transactions)),
+            amounts=np.fromiter((t.amount for t in transactions), dtype=np.float64, count=len(transactions)),
+            category_codes=np.array(codes, dtype=np.int32),
+            categories=categories,
+            days=np.fromiter((date_to_epoch_day(t.date) for t in transactions), dtype=np.int32, count=len(transactions)),
+            description_offsets=np.array(offsets, dtype=np.int64),
+            description_present=np.fromiter(
+                (t.description is not None for t in transactions), dtype=bool, count=len(transactions)
+            ),
+            description_buffer="".join(descriptions),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns and the description buffer."""
+        arrays = (
+            self.ids,
+            self.amounts,
+            self.category_codes,
+            self.days,
+            self.description_offsets,
+            self.description_present,
+        )
+        return (
+            sum(array.nbytes for array in arrays)
+            + len(self.description_buffer)
+            + sum(len(category) for category in self.categories)
+        )
+
+    def description(self, row: int) -> Optional[str]:
+        if not self.description_present[row]:
+            return None
+        start, end = self.description_offsets[row], self.description_offsets[row + 1]
+        return self.description_buffer[start:end]
+
+    def to_dicts(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        """Rows start..stop as plain dicts in the same shape as the pydantic models."""
+        return [
+            {
+                "id": int(self.ids[row]),
+                "amount": float(self.amounts[row]),
+                "category": self.categories[self.category_codes[row]],
+                "date": epoch_day_to_date(self.days[row]),
+                "description": self.description(row),
+            }
+            for row in range(len(self))[start:stop]
+        ]
+
+    def to_models(self) -> list:
+        """Convert back to Expense or Deposit models, losslessly."""
+        return [self.model(**row) for row in self.to_dicts()]
+
+    def filter(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> "TransactionStore":
+        """Rows dated within [start, end] (inclusive) and/or in one category."""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= (self.days != MISSING_DAY) & (self.days >= date_to_epoch_day(start))
+        if end is not None:
+            mask &= (self.days != MISSING_DAY) & (self.days <= date_to_epoch_day(end))
+        if category is not None:
+            if category not in self.categories:
+                mask[:] = False
+            else:
+                mask &= self.category_codes == self.categories.index(category)
+        return self._take(np.flatnonzero(mask))
+
+    def _take(self, rows: np.ndarray) -> "TransactionStore":
+        descriptions = [self.description(row) or "" for row in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(d) for d in descriptions])
+        return TransactionStore(
+            model=self.model,
+            ids=self.ids[rows],
+            amounts=self.amounts[rows],
+            category_codes=self.category_codes[rows],
+            categories=self.categories,
+            days=self.days[rows],
+            description_offsets=offsets,
+            description_present=self.description_present[rows],
+            description_buffer="".join(descriptions),
+        )
+
+    def total(self) -> float:
+        return float(self.amounts.sum())
+
+    def group_by_category(self) -> Dict[str, float]:
+        """Total amount per category."""
+        totals = np.bincount(
+            self.category_codes, weights=self.amounts, minlength=len(self.categories)
+        )
+        counts = np.bincount(self.category_codes, minlength=len(self.categories))
+        return {
+            self.categories[code]: round(float(totals[code]), 2)
+            for code in np.flatnonzero(counts)
+        }
+
+    def group_by_month(self) -> Dict[str, float]:
+        """Total amount per calendar month (YYYY-MM); undated rows are skipped."""
+        dated = self.days != MISSING_DAY
+        if not dated.any():
+            return {}
+        months = self.days[dated].astype("datetime64[D]").astype("datetime64[M]")
+        unique_months, inverse = np.unique(months, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.amounts[dated])
+        return {str(month): round(float(total), 2) for month, total in zip(unique_months, totals)}
+
+    def rolling_sum(self, window_days: int) -> Dict[str, float]:
+        """Trailing window_days sum of amounts for every day in the dated range."""
+        dated = self.days != MISSING_DAY
+        if not dated.any():
+            return {}
+        days = self.days[dated].astype(np.int64)
+        first_day = days.min()
+        daily = np.bincount(days - first_day, weights=self.amounts[dated])
+        cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+        window_end = np.arange(1, len(daily) + 1)
+        window_start = np.maximum(window_end - window_days, 0)
+        rolling = cumulative[window_end] - cumulative[window_start]
+        dates = np.arange(first_day, first_day + len(daily)).astype("datetime64[D]")
+        return {str(day): round(float(total), 2) for day, total in zip(dates, rolling)}
+
+    def percentile(self, q, category: Optional[str] = None):
+        """Percentile(s) of transaction amounts, optionally within one category."""
+        store = self.filter(category=category) if category else self
+        if not len(store):
+            return None
+        result = np.percentile(store.amounts, q)
+        return result.tolist() if np.ndim(result) else float(result)
+
+
+class AccountStore:
+    """Columnar expenses and deposits for one account."""
+
+    def __init__(self, account_id: int, name: str, balance: float, expenses: TransactionStore, deposits: TransactionStore):
+        self.id = account_id
+        self.name = name
+        self.balance = balance
+        self.expenses = expenses
+        self.deposits = deposits
+
+    @classmethod
+    def from_account(cls, account: Account) -> "AccountStore":
+        return cls(
+            account_id=account.id,
+            name=account.name,
+            balance=account.balance,
+            expenses=TransactionStore.from_models(account.expenses, Expense),
+            deposits=TransactionStore.from_models(account.deposits, Deposit),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.expenses.nbytes + self.deposits.nbytes
+
+    def to_account(self) -> Account:
+        return Account(
+            id=self.id,
+            name=self.name,
+            balance=self.balance,
+            expenses=self.expenses.to_models(),
+            deposits=self.deposits.to_models(),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "balance": self.balance,
+            "expenses": self.expenses.to_dicts(),
+            "deposits": self.deposits.to_dicts(),
+        }
+
+
+class TransactionStoreIndex:
+    """Thread-safe LRU of columnar stores, one list of accounts per user.
+
+    Each entry holds the stores built at one data version. A read for any
+    other version drops the entry and rebuilds it, and commits that write a
+    user's data drop that user's entry (see app.chat.accounts.models).
+    Least recently used users are dropped beyond max_users or once the
+    stores together exceed max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_users: int = TRANSACTION_STORE_MAX_USERS,
+        max_bytes: int = TRANSACTION_STORE_MAX_BYTES,
+    ):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        # user id -> (version, stores, size in bytes)
+        self._users: "OrderedDict[int, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: str, load: Callable[[], Optional[User]]) -> Optional[List[AccountStore]]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._users.move_to_end(user_id)
+                return entry[1]
+            # Built from another version; never served again
+            self._pop_locked(user_id)
+
+        user = load()
+        if user is None:
+            return None
+        stores = [AccountStore.from_account(account) for account in user.accounts]
+        size = sum(store.nbytes for store in stores)
+        with self._lock:
+            current = self._users.get(user_id)
+            # A concurrent read may have cached a newer version meanwhile
+            if current is None or int(current[0]) <= int(version):
+                self._pop_locked(user_id)
+                self._users[user_id] = (version, stores, size)
+                self._bytes += size
+                self._evict_locked()
+        return stores
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's stores so they are rebuilt from current data on next access."""
+        with self._lock:
+            self._pop_locked(user_id)
+
+    def invalidate_many(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._pop_locked(user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._users), "bytes": self._bytes}
+
+    def _pop_locked(self, user_id: int) -> None:
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict_locked(self) -> None:
+        """Drop least recently used users beyond the limits. Caller holds _lock.
+        The newest entry is kept even if it alone exceeds max_bytes."""
+        while len(self._users) > 1 and (
+            len(self._users) > self.max_users or self._bytes > self.max_bytes
+        ):
+            _, (_, _, size) = self._users.popitem(last=False)
+            self._bytes -= size
+
+
+transaction_store_index = TransactionStoreIndex()
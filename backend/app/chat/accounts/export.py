@@ -0,0 +1,94 @@
+import hashlib
+from datetime import date as date_type
+from typing import Iterable, Iterator, List, Optional
+from app.chat.accounts.queries import iter_transactions  # type: ignore
+from app.serialization import dumps_str  # type: ignore
+from app.pagination import InvalidQueryError  # type: ignore
+
+# Transactions serialized per chunk when streaming a full snapshot
+STREAM_CHUNK_ROWS = 500
+
+
+def parse_date_param(value: Optional[str], name: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date_type.fromisoformat(value).isoformat()
+    except ValueError:
+        raise InvalidQueryError(f"{name} must be an ISO date (YYYY-MM-DD)")
+
+
+def make_etag(user_id: int, version: str, *params) -> str:
+    """
+    Strong ETag for one view of a user's data: the user, their data_version
+    counter and the query. The counter changes with every write, and is only
+    unique per user, so the user id keeps one browser's tags for two
+    accounts apart.
+    """
+    query_hash = hashlib.sha256(repr(params).encode("utf-8")).hexdigest()[:12]
+    return f"{user_id}-{version}-{query_hash}"
+
+
+def _json_rows(rows: List[dict]) -> str:
+    return ",".join(dumps_str(row) for row in rows)
+
+
+def _stream_json_rows(rows: Iterable[dict]) -> Iterator[str]:
+    """The rows as the items of a JSON array, STREAM_CHUNK_ROWS per chunk."""
+    chunk: List[dict] = []
+    sent = False
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == STREAM_CHUNK_ROWS:
+            yield ("," if sent else "") + _json_rows(chunk)
+            chunk, sent = [], True
+    if chunk:
+        yield ("," if sent else "") + _json_rows(chunk)
+
+
+def stream_user_json(
+    user_id: int,
+    accounts: List[dict],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    category: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Yield the {"success": true, "data": {...}} snapshot for a user's
+    accounts (from get_accounts) in chunks. Each account's expenses and
+    deposits are read with keyset queries, STREAM_CHUNK_ROWS rows at a time,
+    so neither the rows nor the document are ever held in memory as a
+    whole. Filters apply to expenses and deposits. Needs an app context
+    while it is consumed.
+    """
+    yield f'{{"success":true,"data":{{"id":{dumps_str(user_id)},"accounts":['
+    for account_index, account in enumerate(accounts):
+        if account_index:
+            yield ","
+        yield (
+            f'{{"id":{dumps_str(account["id"])},"name":{dumps_str(account["name"])},'
+            f'"balance":{dumps_str(account["balance"])}'
+        )
+        for kind in ("expenses", "deposits"):
+            rows = iter_transactions(
+                user_id,
+                kind,
+                batch_size=STREAM_CHUNK_ROWS,
+                account_id=account["id"],
+                start=start,
+                end=end,
+                category=category,
+            )
+            yield f',"{kind}":['
+            yield from _stream_json_rows(
+                {key: value for key, value in row.items() if key != "account_id"} for row in rows
+            )
+            yield "]"
+        yield "}"
+    yield "]}}"
+
+
+def stream_ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    """One JSON document per line."""
+    for row in rows:
+        yield dumps_str(row) + "\n"
@@ -0,0 +1,214 @@
+import itertools
+from typing import Dict, List, Optional
+from sqlalchemy import event, inspect, select, update  # type: ignore
+from app.extensions import db
+from app.user.models import User
+from app.chat.accounts.aggregates import TransactionValues, aggregate_index
+from app.chat.accounts.columnar import transaction_store_index
+
+# session.info key: per user, the changes this transaction has flushed as
+# (aggregate ops or None, data_version bumps, latest data_version), handed
+# to the in-memory indexes once it commits
+PENDING_CHANGES = "financial_data_changes"
+
+
+class Account(db.Model):
+    __tablename__ = "accounts"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    name = db.Column(db.String(80), nullable=False)
+    balance = db.Column(db.Numeric(12, 2, asdecimal=False), nullable=False, default=0)
+
+
+class Expense(db.Model):
+    __tablename__ = "expenses"
+    __table_args__ = (
+        # Date-range scans and per-category totals for one account
+        db.Index("ix_expenses_account_id_date", "account_id", "date"),
+        db.Index("ix_expenses_account_id_category", "account_id", "category"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False
+    )
+    amount = db.Column(db.Numeric(12, 2, asdecimal=False), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.Date, nullable=True)
+    description = db.Column(db.String(255), nullable=True)
+
+
+class Deposit(db.Model):
+    __tablename__ = "deposits"
+    __table_args__ = (
+        db.Index("ix_deposits_account_id_date", "account_id", "date"),
+        db.Index("ix_deposits_account_id_category", "account_id", "category"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(
+        db.Integer, db.ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False
+    )
+    amount = db.Column(db.Numeric(12, 2, asdecimal=False), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.Date, nullable=True)
+    description = db.Column(db.String(255), nullable=True)
+
+
+TRANSACTION_KINDS = {Expense: "expense", Deposit: "deposit"}
+
+
+def _values(amount, category, date, description) -> TransactionValues:
+    return TransactionValues(float(amount), category, str(date) if date else None, description)
+
+
+def _financial_changes(session) -> Dict[int, Optional[list]]:
+    """
+    The users whose accounts or transactions this flush writes, each with
+    the flush's changes as AggregateIndex ops, or None where they cannot be
+    expressed as ops (an account moved to another user).
+    """
+    written = {Account: [], Expense: [], Deposit: []}
+    # Ids of rows already in the database, whose stored values (and owner)
+    # may differ from the ones being written
+    stored_ids = {Account: set(), Expense: set(), Deposit: set()}
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        model = type(instance)
+        if model not in written:
+            continue
+        if instance in session.dirty and not session.is_modified(instance):
+            continue
+        written[model].append(instance)
+        state = inspect(instance)
+        if state.has_identity:
+            stored_ids[model].add(state.identity[0])
+
+    stored_owners = {}
+    if stored_ids[Account]:
+        stored_owners = dict(
+            session.execute(select(Account.id, Account.user_id).where(Account.id.in_(stored_ids[Account]))).all()
+        )
+    stored = {}
+    for model in TRANSACTION_KINDS:
+        stored[model] = {}
+        if stored_ids[model]:
+            rows = session.execute(
+                select(model.id, model.account_id, model.amount, model.category, model.date, model.description)
+                .where(model.id.in_(stored_ids[model]))
+            )
+            stored[model] = {row.id: row for row in rows}
+
+    account_ids = {instance.account_id for model in TRANSACTION_KINDS for instance in written[model]}
+    account_ids.update(row.account_id for model in TRANSACTION_KINDS for row in stored[model].values())
+    account_ids.discard(None)
+    owners = {}
+    if account_ids:
+        owners = dict(session.execute(select(Account.id, Account.user_id).where(Account.id.in_(account_ids))).all())
+
+    changes: Dict[int, Optional[list]] = {}
+
+    def record(user_id: Optional[int], op: Optional[tuple]) -> None:
+        if user_id is None:
+            return
+        ops = changes.setdefault(user_id, [])
+        if op is None:
+            changes[user_id] = None
+        elif ops is not None:
+            ops.append(op)
+
+    # Transactions first: an account closed in this flush takes its
+    # remaining transactions with it
+    for model, kind in TRANSACTION_KINDS.items():
+        for instance in written[model]:
+            state = inspect(instance)
+            row = stored[model].get(state.identity[0]) if state.has_identity else None
+            if row is not None:
+                values = _values(row.amount, row.category, row.date, row.description)
+                record(owners.get(row.account_id), ("remove", kind, row.account_id, values))
+            if instance not in session.deleted:
+                values = _values(instance.amount, instance.category, instance.date, instance.description)
+                record(owners.get(instance.account_id), ("add", kind, instance.account_id, values))
+
+    for account in written[Account]:
+        state = inspect(account)
+        account_id = state.identity[0] if state.has_identity else None
+        stored_owner = stored_owners.get(account_id)
+        if account in session.deleted:
+            record(stored_owner, ("close_account", account_id))
+        elif account_id is not None and stored_owner != account.user_id:
+            record(stored_owner, None)
+            record(account.user_id, None)
+        else:
+            # New accounts have no id until this flush; resolved on commit
+            record(account.user_id, ("account", account_id or account, account.name, float(account.balance or 0)))
+    return changes
+
+
+def _resolve_new_accounts(ops: List[tuple]) -> Optional[List[tuple]]:
+    resolved = []
+    for op in ops:
+        if op[0] == "account" and isinstance(op[1], Account):
+            identity = inspect(op[1]).identity
+            if identity is None:
+                return None
+            op = ("account", identity[0]) + op[2:]
+        resolved.append(op)
+    return resolved
+
+
+@event.listens_for(db.session, "before_flush")
+def bump_data_versions(session, flush_context, instances):
+    """
+    Give every user whose financial data this flush writes a new
+    data_version, in the same transaction as the write, and keep the
+    changes for the in-memory indexes. Bulk UPDATE and DELETE statements on
+    these tables skip the ORM and must bump it themselves.
+    """
+    with session.no_autoflush:
+        changes = _financial_changes(session)
+        if not changes:
+            return
+        versions = session.execute(
+            update(User)
+            .where(User.id.in_(changes))
+            .values(data_version=User.data_version + 1)
+            .returning(User.id, User.data_version)
+            .execution_options(synchronize_session=False)
+        ).all()
+        pending = session.info.setdefault(PENDING_CHANGES, {})
+        for user_id, version in versions:
+            ops, bumps, _ = pending.get(user_id, ([], 0, None))
+            new_ops = changes[user_id]
+            ops = None if ops is None or new_ops is None else ops + new_ops
+            pending[user_id] = (ops, bumps + 1, version)
+
+
+@event.listens_for(db.session, "after_commit")
+def apply_committed_changes(session):
+    """Bring this process's indexes up to the versions just committed."""
+    pending = session.info.pop(PENDING_CHANGES, None)
+    if not pending:
+        return
+    for user_id, (ops, bumps, version) in pending.items():
+        if ops is not None:
+            ops = _resolve_new_accounts(ops)
+        aggregate_index.apply(user_id, version, bumps, ops)
+    # The columnar stores are rebuilt rather than patched
+    transaction_store_index.invalidate_many(pending)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def forget_rolled_back_changes(session, previous_transaction):
+    pending = session.info.get(PENDING_CHANGES)
+    if not pending:
+        return
+    if previous_transaction.nested:
+        # Some of the flushed changes were undone with a savepoint; rebuild
+        # these users instead of working out which
+        for user_id, (_, bumps, version) in pending.items():
+            pending[user_id] = (None, bumps, version)
+    else:
+        session.info.pop(PENDING_CHANGES, None)
@@ -0,0 +1,174 @@
+from datetime import date as date_type
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy import func, select  # type: ignore
+from app.extensions import db  # type: ignore
+from app.chat.accounts import models  # type: ignore
+from app.user import models as user_models  # type: ignore
+from app.chat.accounts.schemas import User, Account, Expense, Deposit  # type: ignore
+
+TRANSACTION_MODELS = {"expenses": models.Expense, "deposits": models.Deposit}
+
+
+def _user_account_ids(user_id: int):
+    return select(models.Account.id).where(models.Account.user_id == user_id)
+
+
+def _iso(value: Optional[date_type]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_date(value: Optional[str]) -> Optional[date_type]:
+    return date_type.fromisoformat(value) if value else None
+
+
+def data_version(user_id: int) -> Optional[str]:
+    """The version of a user's financial data, or None if they have never had any.
+
+    A counter on the user's row, bumped whenever their accounts or
+    transactions are written, so any edit gives a new version. One
+    primary-key lookup.
+    """
+    version = db.session.execute(
+        select(user_models.User.data_version).where(user_models.User.id == user_id)
+    ).scalar()
+    return str(version) if version else None
+
+
+def get_accounts(user_id: int) -> List[dict]:
+    """Account id, name and balance for a user, without any transactions."""
+    rows = db.session.execute(
+        select(models.Account.id, models.Account.name, models.Account.balance)
+        .where(models.Account.user_id == user_id)
+        .order_by(models.Account.id)
+    ).all()
+    return [{"id": row.id, "name": row.name, "balance": row.balance} for row in rows]
+
+
+def get_transactions(
+    user_id: int,
+    kind: str,
+    account_id: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    category: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """One slice of a user's expenses or deposits, ordered by id.
+
+    Filters map onto the (account_id, date) and (account_id, category)
+    indexes; after_id/limit give keyset pagination.
+    """
+    model = TRANSACTION_MODELS[kind]
+    query = select(
+        model.id, model.account_id, model.amount, model.category, model.date, model.description
+    ).where(model.account_id.in_(_user_account_ids(user_id)))
+    if account_id is not None:
+        query = query.where(model.account_id == account_id)
+    if start is not None:
+        query = query.where(model.date >= _parse_date(start))
+    if end is not None:
+        query = query.where(model.date <= _parse_date(end))
+    if category is not None:
+        query = query.where(model.category == category)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [
+        {
+            "id": row.id,
+            "account_id": row.account_id,
+            "amount": row.amount,
+            "category": row.category,
+            "date": _iso(row.date),
+            "description": row.description,
+        }
+        for row in db.session.execute(query)
+    ]
+
+
+def iter_transactions(user_id: int, kind: str, batch_size: int = 500, **filters) -> Iterator[dict]:
+    """Every matching transaction, fetched in keyset batches of batch_size rows."""
+    after_id = filters.pop("after_id", None)
+    while True:
+        batch = get_transactions(user_id, kind, after_id=after_id, limit=batch_size, **filters)
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        after_id = batch[-1]["id"]
+
+
+def get_category_totals(
+    user_id: int, kind: str, start: Optional[str] = None, end: Optional[str] = None
+) -> Dict[str, float]:
+    """Total amount per category, summed in the database."""
+    model = TRANSACTION_MODELS[kind]
+    query = (
+        select(model.category, func.sum(model.amount))
+        .where(model.account_id.in_(_user_account_ids(user_id)))
+        .group_by(model.category)
+        .order_by(model.category)
+    )
+    if start is not None:
+        query = query.where(model.date >= _parse_date(start))
+    if end is not None:
+        query = query.where(model.date <= _parse_date(end))
+    return {category: round(float(total), 2) for category, total in db.session.execute(query)}
+
+
+def load_user(user_id: int) -> Optional[User]:
+    """A user's accounts with all their transactions, or None if they have no accounts.
+
+    Three queries in total, regardless of how many accounts the user has.
+    """
+    accounts = get_accounts(user_id)
+    if not accounts:
+        return None
+
+    transactions: Dict[str, Dict[int, list]] = {}
+    for kind, schema in (("expenses", Expense), ("deposits", Deposit)):
+        by_account: Dict[int, list] = {account["id"]: [] for account in accounts}
+        for row in get_transactions(user_id, kind):
+            account_id = row.pop("account_id")
+            by_account[account_id].append(schema(**row))
+        transactions[kind] = by_account
+
+    return User(
+        id=user_id,
+        accounts=[
+            Account(
+                id=account["id"],
+                name=account["name"],
+                balance=account["balance"],
+                expenses=transactions["expenses"][account["id"]],
+                deposits=transactions["deposits"][account["id"]],
+            )
+            for account in accounts
+        ],
+    )
+
+
+def import_user(user_id: int, user: User) -> None:
+    """Insert a User schema's accounts and transactions for a database user.
+
+    Each flush bumps the user's data_version.
+    """
+    for account in user.accounts:
+        account_row = models.Account(user_id=user_id, name=account.name, balance=account.balance)
+        db.session.add(account_row)
+        db.session.flush()
+        for kind, transactions in (("expenses", account.expenses), ("deposits", account.deposits)):
+            model = TRANSACTION_MODELS[kind]
+            db.session.add_all(
+                model(
+                    account_id=account_row.id,
+                    amount=transaction.amount,
+                    category=transaction.category,
+                    date=_parse_date(transaction.date),
+                    description=transaction.description,
+                )
+                for transaction in transactions
+            )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field  # type: ignore
-from typing import Optional, List
+from typing import Literal, Optional, List
 
 
 class Expense(BaseModel):
@@ -55,6 +55,17 @@ class ToolResultsAnalysis(BaseModel):
     results: List[ToolResults] = Field(description="The analysis of the results")
 
 
+class ResultsSummary(BaseModel):
+    """Compact structured analysis of a tool result."""
+
+    summary: str = Field(description="One or two sentences on what the result shows")
+    key_findings: List[str] = Field(description="The facts in the result that matter, at most five")
+    decisions: List[str] = Field(description="Decisions or next steps the result supports, at most three")
+    confidence: Literal["high", "medium", "low"] = Field(
+        description="How far the result supports these conclusions"
+    )
+
+
 class AccountAnalysis(BaseModel):
     """Account analysis model."""
 
@@ -62,6 +73,23 @@ class AccountAnalysis(BaseModel):
     name: str = Field(description="Account name")
     analysis: str = Field(description="The analysis of the account")
     error: bool = Field(description="Error flag")
+    balance: Optional[float] = Field(description="Account balance", default=None)
+    expense_count: Optional[int] = Field(description="Number of expenses", default=None)
+    deposit_count: Optional[int] = Field(description="Number of deposits", default=None)
+    aggregates: Optional[dict] = Field(
+        description="Precomputed totals by category and month, savings rate and recurring charges",
+        default=None,
+    )
+
+
+class FinancialRecommendation(BaseModel):
+    """Rule-based recommendation derived from the account metrics."""
+
+    category: str = Field(description="Area of the user's finances it concerns")
+    title: str = Field(description="Short recommendation title")
+    description: str = Field(description="Why it is recommended, with the relevant figures")
+    priority: str = Field(description="high, medium or low")
+    action_items: List[str] = Field(description="Concrete next steps")
 
 
 class UserAnalysis(BaseModel):
@@ -72,3 +100,22 @@ class UserAnalysis(BaseModel):
     account_analysis: List[AccountAnalysis] = Field(description="Analysis for each account")
     overall_analysis: str = Field(description="Overall financial analysis and recommendations")
     error: bool = Field(description="Error flag")
+    total_balance: Optional[float] = Field(description="Sum of account balances", default=None)
+    total_accounts: Optional[int] = Field(description="Number of accounts", default=None)
+    savings_rate: Optional[float] = Field(
+        description="Share of income not spent, excluding transfers", default=None
+    )
+    aggregates: Optional[dict] = Field(
+        description="User-level totals by category and month and recurring charges",
+        default=None,
+    )
+    metrics: Optional[dict] = Field(
+        description="Spend by category, month-over-month change, savings rate, emergency-fund months and subscriptions",
+        default=None,
+    )
+    recommendations: Optional[List[FinancialRecommendation]] = Field(
+        description="Recommendations computed from the metrics", default=None
+    )
+    narrative: Optional[str] = Field(
+        description="Written advice from the model, when requested or already cached", default=None
+    )
@@ -0,0 +1,163 @@
+import anthropic  # type: ignore
+import asyncio
+import time
+from app.chat.services import ChatService  # type: ignore
+from app.chat.limits import RunBudget  # type: ignore
+from app.agent.engine import ResponseCollector  # type: ignore
+from app.agent.tools.shaping import ToolResult  # type: ignore
+
+
+class AsyncChatService(ChatService):
+    """
+    Async variant of ChatService built on AsyncAnthropic.
+    LLM calls are awaited instead of holding a thread, and tool calls run on
+    the shared bounded tool executor, so one event loop can keep many
+    conversations in flight. Prompt, caching and tool behaviour are inherited
+    from ChatService; the sync process_message API keeps working unchanged.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.async_client = anthropic.AsyncAnthropic()
+
+    def _count_tokens(self, messages):
+        # The exact count is a blocking HTTP call; compaction falls back to
+        # its estimate rather than stall the event loop
+        return None
+
+    async def process_message_async(self, user_message, account_user_id=None, session_id=None):
+        """
+        Process a user message without blocking a worker thread.
+        Returns the same structured response data as process_message.
+        """
+        print("\n=== ASYNC CHAT SERVICE: Processing new message ===")
+        print(f"User message: {user_message}")
+
+        try:
+            collector = ResponseCollector()
+            async for event in self.process_message_stream_async(
+                user_message, account_user_id, session_id
+            ):
+                if event["type"] == "session":
+                    session_id = event["session_id"]
+                elif event["type"] == "error":
+                    return {"success": False, "error": event["error"]}
+                else:
+                    collector.add(event)
+
+            response = collector.response()
+            response["session_id"] = session_id
+            return {"success": True, "response": response}
+
+        except Exception as e:
+            print("\n!!! ASYNC CHAT SERVICE ERROR !!!")
+            print(f"Error type: {type(e).__name__}")
+            print(f"Error message: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    async def process_message_stream_async(
+        self, user_message, account_user_id=None, session_id=None, trace=None
+    ):
+        """
+        Async generator version of process_message_stream.
+        Yields the same session, engine and error events.
+        Cancelling the consuming task (the client disconnected) closes the
+        open model stream and drops tool calls that have not started.
+        """
+        print("\n=== ASYNC CHAT SERVICE: Processing new message (STREAMING) ===")
+        print(f"User message: {user_message}")
+
+        session = None
+        completed_history = None
+        budget = RunBudget()
+        loop = asyncio.get_running_loop()
+        try:
+            # A miss can load the session from the SQL spill, and making room
+            # can spill another one; neither belongs on the event loop
+            session = await loop.run_in_executor(
+                None, self.sessions.acquire, session_id, account_user_id
+            )
+            yield {"type": "session", "session_id": session.id}
+
+            conversation_history = session.messages + [
+                {"role": "user", "content": user_message}
+            ]
+            async for event in self.engine.run_async(
+                conversation_history,
+                self.async_client,
+                self._execute_tools_async,
+                budget=budget,
+                context={"account_user_id": account_user_id},
+                trace=trace,
+            ):
+                yield event
+
+            completed_history = conversation_history
+            print("\n=== ASYNC CHAT SERVICE: Processing complete (STREAMING) ===")
+
+        except Exception as e:
+            print("\n!!! ASYNC CHAT SERVICE ERROR (STREAMING) !!!")
+            print(f"Error type: {type(e).__name__}")
+            print(f"Error message: {str(e)}")
+            yield {"type": "error", "error": str(e)}
+
+        except (asyncio.CancelledError, GeneratorExit):
+            print("\n!!! CLIENT DISCONNECTED, CANCELLING RUN (ASYNC STREAMING) !!!")
+            budget.cancel()
+            raise
+
+        finally:
+            if session is not None:
+                # Shielded so a cancelled run still hands the session back
+                await asyncio.shield(
+                    loop.run_in_executor(None, self.sessions.release, session, completed_history)
+                )
+
+    async def _execute_tools_async(self, tool_use_blocks, run):
+        """
+        Execute an engine run's tool_use blocks concurrently on the shared tool executor.
+        Yields (tool_use_block, tool_result) pairs in completion order; tools
+        that run past tool_timeout_seconds or the run's deadline yield an
+        error result. Tools that have not started when the run is cancelled
+        are dropped.
+        """
+        budget = run.budget
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        pending = {}
+        for tool_use_block in tool_use_blocks:
+            print(f"Submitting tool {tool_use_block.name} ({tool_use_block.id})")
+            future = loop.run_in_executor(self.tool_executor, self._run_tool, run, tool_use_block)
+            pending[future] = tool_use_block
+
+        deadline = min(started_at + self.tool_timeout_seconds, budget.deadline)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - time.monotonic(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    message = (
+                        f"Tool execution timed out after {self.tool_timeout_seconds}s"
+                        if deadline < budget.deadline
+                        else "The request ran out of time before this tool finished"
+                    )
+                    for future, tool_use_block in list(pending.items()):
+                        future.cancel()
+                        del pending[future]
+                        print(f"!!! TOOL TIMEOUT: {tool_use_block.name} ({tool_use_block.id}) !!!")
+                        yield tool_use_block, ToolResult.build(tool_use_block.name, {"error": message})
+                    return
+
+                for future in done:
+                    tool_use_block = pending.pop(future)
+                    print(
+                        f"Tool {tool_use_block.name} finished in "
+                        f"{time.monotonic() - started_at:.2f}s"
+                    )
+                    yield tool_use_block, future.result()
+        finally:
+            for future in pending:
+                future.cancel()
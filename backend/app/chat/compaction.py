@@ -0,0 +1,197 @@
+from typing import Callable, List, Optional
+from app.config import (  # type: ignore
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_KEEP_LIST_ITEMS,
+    CONTEXT_MAX_STRING_CHARS,
+    CONTEXT_MAX_TOOL_RESULT_CHARS,
+)
+from app.chat.sessions import is_turn_start, message_to_param  # type: ignore
+from app.serialization import dumps, dumps_str, loads  # type: ignore
+
+# Rough characters-per-token ratio for JSON-heavy conversations
+CHARS_PER_TOKEN = 4
+
+# Only ask the API for an exact count once the estimate is this close to the budget
+EXACT_COUNT_THRESHOLD = 0.8
+
+THINKING_TYPES = ("thinking", "redacted_thinking")
+
+
+def _block_type(block) -> Optional[str]:
+    return block.get("type") if isinstance(block, dict) else getattr(block, "type", None)
+
+
+def _is_tool_result_message(message: dict) -> bool:
+    content = message["content"]
+    return (
+        message["role"] == "user"
+        and isinstance(content, list)
+        and any(_block_type(block) == "tool_result" for block in content)
+    )
+
+
+def shrink_value(value, max_items: int, max_chars: int):
+    """Keep the first max_items of every list, cut long strings and drop empty fields."""
+    if isinstance(value, dict):
+        return {
+            key: shrink_value(item, max_items, max_chars)
+            for key, item in value.items()
+            if item not in (None, "", [], {})
+        }
+    if isinstance(value, list):
+        shrunk = [shrink_value(item, max_items, max_chars) for item in value[:max_items]]
+        if len(value) > max_items:
+            shrunk.append(f"... {len(value) - max_items} more omitted")
+        return shrunk
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    return value
+
+
+class ContextCompactor:
+    """
+    Keeps the conversation sent to the model inside a token budget.
+
+    Before each Messages API call it:
+    1. drops thinking blocks from earlier turns, which the API ignores anyway;
+    2. shrinks tool results from earlier turns to the first few items of
+       each list and short strings;
+    3. if the estimate is still near the budget, counts tokens exactly and
+       drops the oldest whole turns, then stubs out old tool results in the
+       current turn, until it fits.
+
+    Steps 1 and 2 only rewrite earlier turns, so within one run every call
+    resends the prefix the previous call cached byte for byte; only step 3,
+    a last resort, changes the current turn. The latest tool results, the
+    current turn's thinking and every tool_use/tool_result pairing are
+    always kept intact, as the API requires.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        keep_list_items: int = CONTEXT_KEEP_LIST_ITEMS,
+        max_string_chars: int = CONTEXT_MAX_STRING_CHARS,
+        max_tool_result_chars: int = CONTEXT_MAX_TOOL_RESULT_CHARS,
+        count_tokens: Optional[Callable[[List[dict]], Optional[int]]] = None,
+        overhead_tokens: int = 0,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_list_items = keep_list_items
+        self.max_string_chars = max_string_chars
+        self.max_tool_result_chars = max_tool_result_chars
+        self.count_tokens = count_tokens
+        # Tools and system prompt, which are sent with every call
+        self.overhead_tokens = overhead_tokens
+
+    def compact(self, messages: List[dict]) -> dict:
+        """Compact messages in place. Message dicts are replaced, never mutated."""
+        stats = {"dropped_thinking": 0, "compacted_results": 0, "dropped_turns": 0, "stubbed_results": 0}
+        if not messages:
+            return stats
+
+        turn_start = self._current_turn_start(messages)
+        stats["dropped_thinking"] = self._drop_stale_thinking(messages, turn_start)
+
+        latest_results = max(
+            (index for index, message in enumerate(messages) if _is_tool_result_message(message)),
+            default=None,
+        )
+        # The current turn's results stay as sent: shrinking them would change
+        # the prefix cached by this run's earlier calls
+        for index in range(turn_start):
+            if _is_tool_result_message(messages[index]):
+                stats["compacted_results"] += self._compact_tool_results(messages, index, self._shrink_content)
+
+        tokens = self.estimate_tokens(messages)
+        if tokens > self.max_tokens * EXACT_COUNT_THRESHOLD:
+            tokens = self._exact_tokens(messages, tokens)
+
+        # Over budget: forget the oldest turns first
+        while tokens > self.max_tokens and turn_start > 0:
+            next_turn = next(
+                index for index in range(1, len(messages)) if is_turn_start(messages[index])
+            )
+            del messages[:next_turn]
+            turn_start -= next_turn
+            if latest_results is not None:
+                latest_results -= next_turn
+            stats["dropped_turns"] += 1
+            tokens = self._exact_tokens(messages, self.estimate_tokens(messages))
+
+        # Still over: replace older tool results in this turn with a stub
+        if tokens > self.max_tokens:
+            for index, message in enumerate(messages):
+                if index != latest_results and _is_tool_result_message(message):
+                    stats["stubbed_results"] += self._compact_tool_results(messages, index, self._stub_content)
+            tokens = self.estimate_tokens(messages)
+
+        stats["tokens"] = tokens
+        return stats
+
+    def estimate_tokens(self, messages: List[dict]) -> int:
+        return self.overhead_tokens + len(dumps([message_to_param(message) for message in messages])) // CHARS_PER_TOKEN
+
+    def _exact_tokens(self, messages: List[dict], estimate: int) -> int:
+        if self.count_tokens is None:
+            return estimate
+        try:
+            counted = self.count_tokens(messages)
+        except Exception as e:
+            print(f"Token count failed, using estimate: {type(e).__name__}: {e}")
+            return estimate
+        return estimate if counted is None else counted
+
+    def _current_turn_start(self, messages: List[dict]) -> int:
+        return max(
+            (index for index, message in enumerate(messages) if is_turn_start(message)),
+            default=0,
+        )
+
+    def _drop_stale_thinking(self, messages: List[dict], turn_start: int) -> int:
+        dropped = 0
+        for index in range(turn_start):
+            message = messages[index]
+            if message["role"] != "assistant" or isinstance(message["content"], str):
+                continue
+            content = [block for block in message["content"] if _block_type(block) not in THINKING_TYPES]
+            if len(content) == len(message["content"]):
+                continue
+            dropped += len(message["content"]) - len(content)
+            if content:
+                messages[index] = {**message, "content": content}
+            else:
+                # Keep alternating roles; the answer text was thinking-only
+                messages[index] = {**message, "content": [{"type": "text", "text": "(no reply)"}]}
+        return dropped
+
+    def _compact_tool_results(self, messages: List[dict], index: int, compact_content) -> int:
+        message = messages[index]
+        changed = 0
+        content = []
+        for block in message["content"]:
+            if _block_type(block) == "tool_result" and isinstance(block.get("content"), str):
+                compacted = compact_content(block["content"])
+                if compacted != block["content"]:
+                    block = {**block, "content": compacted}
+                    changed += 1
+            content.append(block)
+        if changed:
+            messages[index] = {**message, "content": content}
+        return changed
+
+    def _shrink_content(self, content: str) -> str:
+        if len(content) <= self.max_tool_result_chars:
+            return content
+        try:
+            shrunk = dumps_str(shrink_value(loads(content), self.keep_list_items, self.max_string_chars))
+        except ValueError:
+            shrunk = content
+        if len(shrunk) > self.max_tool_result_chars:
+            shrunk = shrunk[:self.max_tool_result_chars] + "... [truncated]"
+        return shrunk
+
+    def _stub_content(self, content: str) -> str:
+        if content.startswith('{"omitted"'):
+            return content
+        return dumps_str({"omitted": "Earlier tool result removed to fit the context window", "chars": len(content)})
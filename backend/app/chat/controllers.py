@@ -1,15 +1,44 @@
-from flask import Blueprint, jsonify, request, Response # type: ignore
+from flask import Blueprint, jsonify, request, Response, stream_with_context # type: ignore
+from flask_jwt_extended import get_jwt_identity, jwt_required, verify_jwt_in_request # type: ignore
 from app.chat.services import ChatService # type: ignore
-from app.chat.accounts.data import mock_user_data # type: ignore
-import json
+from app.serialization import sse_event # type: ignore
+from app.observability import Trace, span # type: ignore
+from app.chat.accounts.columnar import transaction_store_index # type: ignore
+from app.chat.accounts.queries import ( # type: ignore
+    data_version,
+    get_accounts,
+    get_transactions,
+    iter_transactions,
+)
+from app.chat.accounts.export import ( # type: ignore
+    make_etag,
+    parse_date_param,
+    stream_ndjson,
+    stream_user_json,
+)
+from app.pagination import ( # type: ignore
+    InvalidQueryError,
+    decode_cursor,
+    encode_cursor,
+    parse_limit_param,
+)
 
 chat = Blueprint("chat", __name__)
 chat_service = ChatService()
 
 
+def current_account_user_id():
+    """The signed-in user's id from the JWT, or None for anonymous requests."""
+    verify_jwt_in_request(optional=True)
+    identity = get_jwt_identity()
+    return int(identity) if identity is not None else None
+
+
 @chat.route("/message", methods=["POST"])
 def send_message():
     """Send a message to the AI agent and get a streaming response."""
+    # Outside the try so invalid or revoked tokens get the JWT error responses
+    account_user_id = current_account_user_id()
     try:
         data = request.get_json()
         message = data.get("message")
@@ -18,7 +47,9 @@ def send_message():
             return jsonify({"error": "Message is required"}), 400
             
         # Get response from agent
-        response_data = chat_service.process_message(message)
+        response_data = chat_service.process_message(
+            message, account_user_id, data.get("session_id")
+        )
         
         return jsonify(response_data), 200
         
@@ -29,24 +60,37 @@ def send_message():
 @chat.route("/message/stream", methods=["POST"])
 def send_message_stream():
     """Send a message to the AI agent and get a streaming SSE response."""
+    # Resolved before streaming starts, while the request context is still active
+    account_user_id = current_account_user_id()
     try:
         data = request.get_json()
         message = data.get("message")
+        session_id = data.get("session_id")
         
         if not message:
             return jsonify({"error": "Message is required"}), 400
         
         def generate():
+            trace = Trace()
+            events = chat_service.process_message_stream(
+                message, account_user_id, session_id, trace
+            )
             try:
-                # Stream blocks from the agent
-                for event_data in chat_service.process_message_stream(message):
-                    yield f"data: {json.dumps(event_data)}\n\n"
+                # Stream blocks from the agent; the span covers encoding and
+                # handing the chunk to the server
+                for event_data in events:
+                    with span("sse_emit", event_data["type"], trace):
+                        yield sse_event(event_data)
             except Exception as e:
                 error_event = {
                     "type": "error",
                     "error": str(e)
                 }
-                yield f"data: {json.dumps(error_event)}\n\n"
+                yield sse_event(error_event)
+            finally:
+                # Also runs when the client disconnects; closing the agent's
+                # generator cancels its model stream and queued tool calls
+                events.close()
         
         return Response(
             generate(),
@@ -65,38 +109,128 @@ def send_message_stream():
 
 @chat.route("/health", methods=["GET"])
 def health_check():
-    """Simple health check for the chat service."""
-    return jsonify({"status": "healthy", "service": "chat"}), 200
+    """Simple health check for the chat service, including Composio pool stats."""
+    return jsonify(
+        {
+            "status": "healthy",
+            "service": "chat",
+            "composio_pool": chat_service.composio.stats(),
+            "sessions": chat_service.sessions.stats(),
+            "transaction_stores": transaction_store_index.stats(),
+        }
+    ), 200
+
+
+def _financial_query_params():
+    """Date-range and category filters shared by the financial data endpoints."""
+    return {
+        "start": parse_date_param(request.args.get("start"), "start"),
+        "end": parse_date_param(request.args.get("end"), "end"),
+        "category": request.args.get("category") or None,
+    }
+
+
+def _not_modified(etag):
+    """A 304 for the given ETag, or None if the client's copy is stale."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
 
 
 @chat.route("/financial-data", methods=["GET"])
+@jwt_required()
 def get_financial_data():
-    """Get financial data for the current user."""
+    """
+    Get financial data for the current user, streamed in chunks.
+    Optional start/end (YYYY-MM-DD) and category filters apply to transactions.
+    Responses carry an ETag derived from the data version, so an unchanged
+    dashboard revalidates with a 304.
+    """
     try:
-        # For now, return the first user's data
-        # In a real app, you'd get the user_id from the JWT token
-        user_data = mock_user_data[0] if mock_user_data else None
-        
-        if not user_data:
+        user_id = int(get_jwt_identity())
+        filters = _financial_query_params()
+        version = data_version(user_id)
+        if not version:
             return jsonify({"error": "No financial data found"}), 404
-        
-        # Convert to dict format for JSON serialization
-        user_dict = {
-            "id": user_data.id,
-            "accounts": []
-        }
-        
-        for account in user_data.accounts:
-            account_dict = {
-                "id": account.id,
-                "name": account.name,
-                "balance": account.balance,
-                "expenses": [{"id": e.id, "amount": e.amount, "category": e.category, "date": e.date, "description": e.description} for e in account.expenses],
-                "deposits": [{"id": d.id, "amount": d.amount, "category": d.category, "date": d.date, "description": d.description  } for d in account.deposits]
-            }
-            user_dict["accounts"].append(account_dict)
-        
-        return jsonify({"success": True, "data": user_dict}), 200
-        
+
+        etag = make_etag(user_id, version, "snapshot", filters)
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+
+        accounts = get_accounts(user_id)
+        if not accounts:
+            return jsonify({"error": "No financial data found"}), 404
+
+        # Transactions are read from the database a chunk at a time as the
+        # body is sent
+        response = Response(
+            stream_with_context(stream_user_json(user_id, accounts, **filters)),
+            mimetype="application/json",
+            headers={"Cache-Control": "private, no-cache"},
+        )
+        response.set_etag(etag)
+        return response
+
+    except InvalidQueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch financial data: {str(e)}"}), 500
+
+
+@chat.route("/financial-data/<any(expenses, deposits):kind>", methods=["GET"])
+@jwt_required()
+def get_transactions_page(kind):
+    """
+    Page through the current user's expenses or deposits in id order.
+    Query params: account_id, start, end, category, limit and the cursor
+    returned as next_cursor by the previous page. With
+    Accept: application/x-ndjson every matching row is streamed instead,
+    one JSON object per line.
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        filters = _financial_query_params()
+        filters["account_id"] = request.args.get("account_id", type=int)
+        after_id = decode_cursor(request.args.get("cursor"), kind)
+        ndjson = request.accept_mimetypes.best == "application/x-ndjson"
+        limit = None if ndjson else parse_limit_param(request.args.get("limit"))
+
+        version = data_version(user_id)
+        if not version:
+            return jsonify({"error": "No financial data found"}), 404
+
+        etag = make_etag(user_id, version, kind, filters, after_id, limit, ndjson)
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+
+        if ndjson:
+            rows = iter_transactions(user_id, kind, after_id=after_id, **filters)
+            response = Response(
+                stream_with_context(stream_ndjson(rows)),
+                mimetype="application/x-ndjson",
+            )
+        else:
+            # Fetch one extra row to know whether there is a next page
+            rows = get_transactions(user_id, kind, after_id=after_id, limit=limit + 1, **filters)
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            response = jsonify(
+                {
+                    "success": True,
+                    "data": rows,
+                    "next_cursor": encode_cursor(kind, rows[-1]["id"]) if has_more else None,
+                }
+            )
+
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.set_etag(etag)
+        return response
+
+    except InvalidQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch transactions: {str(e)}"}), 500
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Optional
+from app.config import AGENT_MAX_ITERATIONS, AGENT_DEADLINE_SECONDS  # type: ignore
+
+# Why an agent run ended, reported as end_reason in the complete event
+END_COMPLETED = "completed"
+END_MAX_ITERATIONS = "max_iterations"
+END_DEADLINE = "deadline"
+END_CANCELLED = "cancelled"
+
+STOPPED_EARLY_NOTES = {
+    END_MAX_ITERATIONS: "I reached the maximum number of steps for one request before finishing.",
+    END_DEADLINE: "I ran out of time for this request before finishing.",
+}
+
+
+class RunStopped(Exception):
+    """Raised inside an agent run that has been cancelled or is out of time."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Agent run stopped: {reason}")
+        self.reason = reason
+
+
+class RunBudget:
+    """Iteration cap, wall-clock deadline and cancellation flag for one agent run.
+
+    The loop checks it before every model call; LLM requests get the
+    remaining time as their timeout and tool batches stop waiting at the
+    deadline. cancel() may be called from any thread, e.g. when the client
+    disconnects.
+    """
+
+    def __init__(
+        self,
+        max_iterations: int = AGENT_MAX_ITERATIONS,
+        deadline_seconds: float = AGENT_DEADLINE_SECONDS,
+    ):
+        self.max_iterations = max_iterations
+        self.deadline_seconds = deadline_seconds
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + deadline_seconds
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def stop_reason(self, next_iteration: Optional[int] = None) -> Optional[str]:
+        """Why the run must stop before its next step, or None to carry on."""
+        if self.cancelled:
+            return END_CANCELLED
+        if self.remaining() <= 0:
+            return END_DEADLINE
+        if next_iteration is not None and next_iteration > self.max_iterations:
+            return END_MAX_ITERATIONS
+        return None
+
+    def check(self, next_iteration: Optional[int] = None) -> None:
+        """Raise RunStopped if the run must stop before its next step."""
+        reason = self.stop_reason(next_iteration)
+        if reason is not None:
+            raise RunStopped(reason)
+
+    def summary(self, end_reason: str) -> dict:
+        return {
+            "end_reason": end_reason,
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "max_iterations": self.max_iterations,
+            "deadline_seconds": self.deadline_seconds,
+        }
@@ -0,0 +1,11 @@
+from app.extensions import db
+
+
+class ChatSession(db.Model):
+    # Conversations spilled out of memory by CHAT_SESSION_SPILL_URL (see app.chat.sessions)
+    __tablename__ = "chat_sessions"
+
+    id = db.Column(db.String(64), primary_key=True)
+    owner_id = db.Column(db.Integer, nullable=True)
+    messages = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
@@ -1,6 +1,7 @@
 import anthropic  # type: ignore
-import json
-import re
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from app.agent.tools.functions import (  # type: ignore
     analyze_results,
     analyze_user_account,
@@ -10,8 +11,22 @@ from app.agent.tools.functions import (  # type: ignore
     parse_composio_event_search_results,
 )
 from app.agent.tools.definitions import tool_definitions  # type: ignore
-from composio import Composio  # type: ignore
-from app.chat.accounts.data import mock_user_data  # type: ignore
+from app.agent.tools.composio_client import composio_pool  # type: ignore
+from app.agent.tools.shaping import ToolResult  # type: ignore
+from app.chat.sessions import session_store  # type: ignore
+from app.chat.compaction import ContextCompactor, CHARS_PER_TOKEN  # type: ignore
+from app.chat.limits import END_CANCELLED, RunBudget, RunStopped  # type: ignore
+from app.agent.engine import AgentEngine, ResponseCollector  # type: ignore
+from app.agent.middleware import CompactionMiddleware, SearchCacheMiddleware  # type: ignore
+from app.agent.utils import count_tokens  # type: ignore
+from app.observability import span, tracing  # type: ignore
+from app.serialization import dumps  # type: ignore
+
+# Prompt cache breakpoint for the static prefix and the growing conversation
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# How often a tool batch wakes up to check whether the run was cancelled
+TOOL_CANCEL_POLL_SECONDS = 0.25
 
 
 class ChatService:
@@ -22,12 +37,30 @@ class ChatService:
         self.max_tokens = 4000
         self.thinking_budget_tokens = 2000
 
-        # Initialize Composio
-        self.composio = Composio()
+        # Tool calls from one iteration run concurrently on a bounded pool
+        self.max_tool_workers = 8
+        self.tool_timeout_seconds = 30
+        self.tool_executor = ThreadPoolExecutor(
+            max_workers=self.max_tool_workers, thread_name_prefix="chat-tool"
+        )
+
+        # Shared Composio client with pooled keep-alive connections
+        self.composio = composio_pool
         self.user_id = "0000-1111-2222"
 
+        # Flask app whose context tool threads need for database access; set by init_app
+        self.app = None
+
+        # Server-side conversation history for multi-turn sessions
+        self.sessions = session_store
+
         # Define tools (same as agent.py)
         self.tools = tool_definitions
+        # Tool definitions with a cache breakpoint on the last tool, so the
+        # whole tool list is served from the prompt cache after the first call
+        self.cached_tools = self.tools[:-1] + [
+            {**self.tools[-1], "cache_control": CACHE_CONTROL}
+        ]
         
         # System prompt for financial planning agent
         self.system_prompt = """You are Rocket, an expert Financial Planning Assistant with access to powerful analytical tools and real-time financial data. Your mission is to provide comprehensive, personalized financial guidance by leveraging user account analysis, market research, and current financial news.
@@ -134,10 +167,36 @@ User: "How should I adjust my spending?"
 5. 💡 **Provide Recommendations**: Deliver specific, actionable spending adjustments with rationale
 
 Remember: Always ground your advice in the user's actual financial data combined with current market realities. Use multiple tools when needed to provide the most comprehensive and current financial guidance possible."""
+        self.cached_system = [
+            {
+                "type": "text",
+                "text": self.system_prompt,
+                "cache_control": CACHE_CONTROL,
+            }
+        ]
+
+        # Keeps long tool loops and sessions inside the context budget
+        self.compactor = ContextCompactor(
+            count_tokens=self._count_tokens,
+            overhead_tokens=(len(dumps(self.tools)) + len(self.system_prompt)) // CHARS_PER_TOKEN,
+        )
+
+        # One tool loop for streaming, non-streaming and async requests
+        self.engine = AgentEngine(
+            self._message_params,
+            middleware=[CompactionMiddleware(self.compactor), SearchCacheMiddleware()],
+        )
+
+    def init_app(self, app):
+        """Bind the Flask app so tools running on worker threads can use the database."""
+        self.app = app
 
-    def process_message(self, user_message):
+    def process_message(self, user_message, account_user_id=None, session_id=None):
         """
         Process a user message using the agent's multiple_tool_calls_with_thinking logic.
+        account_user_id is the signed-in user whose accounts the tools may read.
+        session_id continues an earlier conversation; the id to use for the
+        next message is returned as response.session_id.
         Returns structured response data for the frontend.
         """
         print("\n=== CHAT SERVICE: Processing new message ===")
@@ -145,37 +204,41 @@ Remember: Always ground your advice in the user's actual financial data combined
         print(f"Model: {self.model_name}")
         print(f"Max tokens: {self.max_tokens}")
 
+        session = None
+        completed_history = None
         try:
-            # Initial request (same structure as agent.py)
-            print("\n--- Making initial API call to Claude ---")
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=self.max_tokens,
-                thinking={
-                    "type": "enabled",
-                    "budget_tokens": self.thinking_budget_tokens,
-                },
-                tools=self.tools,
-                system=self.system_prompt,
-                messages=[{"role": "user", "content": user_message}],
-            )
-
-            print(f"Initial response stop_reason: {response.stop_reason}")
-            print(f"Initial response content blocks: {len(response.content)}")
+            session = self.sessions.acquire(session_id, account_user_id)
 
-            # Process the response and handle tool calls
-            conversation_history = [{"role": "user", "content": user_message}]
+            # Continue from the session's history, including earlier thinking
+            # and tool results, so follow-ups do not repeat tool calls
+            conversation_history = session.messages + [
+                {"role": "user", "content": user_message}
+            ]
             print(
-                f"Starting conversation history with {len(conversation_history)} messages"
+                f"Starting conversation history with {len(conversation_history)} messages (session {session.id})"
             )
 
-            final_response = self._handle_response_chain(response, conversation_history)
+            # The same engine as streaming, with its events collected
+            collector = ResponseCollector()
+            for event in self.engine.run(
+                conversation_history,
+                self.client,
+                self._execute_tools,
+                budget=RunBudget(),
+                stream=False,
+                context={"account_user_id": account_user_id},
+            ):
+                collector.add(event)
+            final_response = collector.response()
 
             print("\n=== CHAT SERVICE: Processing complete ===")
             print(f"Final response blocks: {len(final_response.get('blocks', []))}")
             print(f"Total iterations: {final_response.get('total_iterations', 0)}")
             print(f"Stop reason: {final_response.get('stop_reason', 'unknown')}")
+            print(f"End reason: {final_response.get('end_reason')}")
 
+            completed_history = conversation_history
+            final_response["session_id"] = session.id
             return {"success": True, "response": final_response}
 
         except Exception as e:
@@ -187,45 +250,58 @@ Remember: Always ground your advice in the user's actual financial data combined
             print(f"Traceback: {traceback.format_exc()}")
             return {"success": False, "error": str(e)}
 
-    def process_message_stream(self, user_message):
+        finally:
+            # Failed turns leave the stored history untouched
+            if session is not None:
+                self.sessions.release(session, completed_history)
+
+    def process_message_stream(self, user_message, account_user_id=None, session_id=None, trace=None):
         """
         Process a user message using the agent's multiple_tool_calls_with_thinking logic.
-        Yields structured response data blocks for SSE streaming.
+        Yields a session event with the conversation's session_id, then the
+        engine's events: thinking, text and tool input deltas as they arrive
+        from the Messages streaming API, assembled blocks, tool starts and
+        results, per-call usage and a final complete event.
+        Closing the generator (the client disconnected) cancels the run: the
+        open model stream is closed and queued tool calls are dropped.
+        trace, if given, collects the run's spans along with the caller's.
         """
         print("\n=== CHAT SERVICE: Processing new message (STREAMING) ===")
         print(f"User message: {user_message}")
         print(f"Model: {self.model_name}")
         print(f"Max tokens: {self.max_tokens}")
 
+        session = None
+        completed_history = None
+        budget = RunBudget()
         try:
-            # Initial request (same structure as agent.py)
-            print("\n--- Making initial API call to Claude ---")
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=self.max_tokens,
-                thinking={
-                    "type": "enabled",
-                    "budget_tokens": self.thinking_budget_tokens,
-                },
-                tools=self.tools,
-                system=self.system_prompt,
-                messages=[{"role": "user", "content": user_message}],
-            )
+            session = self.sessions.acquire(session_id, account_user_id)
+            yield {"type": "session", "session_id": session.id}
 
-            print(f"Initial response stop_reason: {response.stop_reason}")
-            print(f"Initial response content blocks: {len(response.content)}")
-
-            # Process the response and handle tool calls
-            conversation_history = [{"role": "user", "content": user_message}]
+            conversation_history = session.messages + [
+                {"role": "user", "content": user_message}
+            ]
             print(
-                f"Starting conversation history with {len(conversation_history)} messages"
+                f"Starting conversation history with {len(conversation_history)} messages (session {session.id})"
             )
 
-            # Stream the response chain
-            yield from self._handle_response_chain_stream(response, conversation_history)
+            yield from self.engine.run(
+                conversation_history,
+                self.client,
+                self._execute_tools,
+                budget=budget,
+                context={"account_user_id": account_user_id},
+                trace=trace,
+            )
 
+            completed_history = conversation_history
             print("\n=== CHAT SERVICE: Processing complete (STREAMING) ===")
 
+        except GeneratorExit:
+            print("\n!!! CLIENT DISCONNECTED, CANCELLING RUN (STREAMING) !!!")
+            budget.cancel()
+            raise
+
         except Exception as e:
             print("\n!!! CHAT SERVICE ERROR (STREAMING) !!!")
             print(f"Error type: {type(e).__name__}")
@@ -238,376 +314,138 @@ Remember: Always ground your advice in the user's actual financial data combined
                 "error": str(e)
             }
 
-    def _handle_response_chain_stream(self, response, conversation_history):
+        finally:
+            # Also runs when the client disconnects and the generator is closed
+            if session is not None:
+                self.sessions.release(session, completed_history)
+
+    def _count_tokens(self, messages):
+        """Exact input token count for messages with this service's tools and system prompt."""
+        return count_tokens(
+            messages,
+            tools=self.tools,
+            system=self.system_prompt,
+            thinking=self._thinking_params(),
+            client=self.client,
+            model=self.model_name,
+        )
+
+    def _thinking_params(self):
+        return {"type": "enabled", "budget_tokens": self.thinking_budget_tokens}
+
+    def _message_params(self, messages):
         """
-        Handle the full response chain including tool calls, streaming blocks as they're processed.
-        Yields structured response data blocks for SSE.
+        Build the keyword arguments shared by every Messages API call.
+        The tools, system prompt and conversation so far are marked with
+        cache_control breakpoints so follow-up calls reuse the cached prefix.
         """
-        print("\n--- Starting response chain handling (STREAMING) ---")
-        iteration = 0
-        total_blocks_sent = 0
-
-        while response.stop_reason == "tool_use":
-            iteration += 1
-            print(f"\n*** ITERATION {iteration} (STREAMING) ***")
-            print(f"Stop reason: {response.stop_reason}")
-            print(f"Content blocks in response: {len(response.content)}")
-
-            # Log block types in this response
-            block_types = [block.type for block in response.content]
-            print(f"Block types: {block_types}")
-
-            # Extract and stream blocks from current response
-            for block in response.content:
-                block_data = None
-                if block.type == "thinking":
-                    block_data = {
-                        "type": "thinking",
-                        "content": block.thinking,
-                        "iteration": iteration,
-                    }
-                elif block.type == "redacted_thinking":
-                    block_data = {
-                        "type": "redacted_thinking",
-                        "content": "[Thinking content redacted]",
-                        "iteration": iteration,
-                    }
-                elif block.type == "text":
-                    block_data = {
-                        "type": "text", 
-                        "content": block.text, 
-                        "iteration": iteration
-                    }
-                elif block.type == "tool_use":
-                    block_data = {
-                        "type": "tool_use",
-                        "tool_name": block.name,
-                        "tool_input": block.input,
-                        "tool_id": block.id,
-                        "iteration": iteration,
-                    }
-
-                if block_data:
-                    yield {
-                        "type": "block",
-                        "block": block_data
-                    }
-                    total_blocks_sent += 1
-                    print(f"Streamed block {total_blocks_sent}: {block_data['type']}")
-
-            # Add assistant response to conversation history
-            assistant_blocks = []
-            for block in response.content:
-                if block.type in ["thinking", "redacted_thinking", "tool_use"]:
-                    assistant_blocks.append(block)
-
-            conversation_history.append(
-                {"role": "assistant", "content": assistant_blocks}
-            )
-            print("Added assistant message to conversation history")
-
-            # Execute ALL tool_use blocks if there are any
-            tool_use_blocks = [
-                block for block in response.content if block.type == "tool_use"
-            ]
-            if tool_use_blocks:
-                print(f"*** TOOL EXECUTION ({len(tool_use_blocks)} tools) (STREAMING) ***")
-
-                # Collect all tool results
-                tool_results_content = []
-
-                for tool_use_block in tool_use_blocks:
-                    print(f"Tool name: {tool_use_block.name}")
-                    print(f"Tool input: {tool_use_block.input}")
-                    print(f"Tool ID: {tool_use_block.id}")
-
-                    # Execute the tool
-                    tool_result = self._execute_tool(
-                        tool_use_block.name, tool_use_block.input
-                    )
-                    print(f"Tool execution result: {tool_result}")
-
-                    # Stream tool result block
-                    tool_result_data = {
-                        "type": "tool_result",
-                        "tool_name": tool_use_block.name,
-                        "tool_input": tool_use_block.input,
-                        "tool_result": tool_result,
-                        "iteration": iteration,
-                    }
-                    
-                    yield {
-                        "type": "block",
-                        "block": tool_result_data
-                    }
-                    total_blocks_sent += 1
-                    print(f"Streamed tool result block {total_blocks_sent}")
-
-                    # Collect tool result for conversation history
-                    tool_results_content.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_block.id,
-                            "content": json.dumps(tool_result),
-                        }
-                    )
-
-                # Add ALL tool results to conversation in a single message
-                conversation_history.append(
-                    {
-                        "role": "user",
-                        "content": tool_results_content,
-                    }
-                )
-                print(
-                    f"Added {len(tool_results_content)} tool results to conversation history. Total messages: {len(conversation_history)}"
-                )
-
-                # Continue the conversation
-                print("*** CONTINUING CONVERSATION AFTER TOOL USE (STREAMING) ***")
-                response = self.client.messages.create(
-                    model=self.model_name,
-                    max_tokens=self.max_tokens,
-                    thinking={
-                        "type": "enabled",
-                        "budget_tokens": self.thinking_budget_tokens,
-                    },
-                    tools=self.tools,
-                    system=self.system_prompt,
-                    messages=conversation_history,
-                )
-            else:
-                print("No tool_use block found, breaking loop")
-                break
-
-        # Handle final response (no more tool use)
-        print("\n*** FINAL RESPONSE PROCESSING (STREAMING) ***")
-        print(f"Final stop reason: {response.stop_reason}")
-        if response.stop_reason != "tool_use":
-            for block in response.content:
-                block_data = None
-                if block.type == "thinking":
-                    block_data = {
-                        "type": "thinking",
-                        "content": block.thinking,
-                        "iteration": iteration + 1,
-                    }
-                elif block.type == "redacted_thinking":
-                    block_data = {
-                        "type": "redacted_thinking",
-                        "content": "[Thinking content redacted]",
-                        "iteration": iteration + 1,
-                    }
-                elif block.type == "text":
-                    block_data = {
-                        "type": "text",
-                        "content": block.text,
-                        "iteration": iteration + 1,
-                    }
-
-                if block_data:
-                    yield {
-                        "type": "block",
-                        "block": block_data
-                    }
-                    total_blocks_sent += 1
-                    print(f"Streamed final block {total_blocks_sent}: {block_data['type']}")
-
-        # Send completion event
-        print("\n--- Response chain handling complete (STREAMING) ---")
-        print(f"Total blocks streamed: {total_blocks_sent}")
-        print(f"Total iterations: {iteration + 1}")
-
-        yield {
-            "type": "complete",
-            "stop_reason": response.stop_reason,
-            "total_iterations": iteration + 1,
-            "total_blocks": total_blocks_sent
+        return {
+            "model": self.model_name,
+            "max_tokens": self.max_tokens,
+            "thinking": self._thinking_params(),
+            "tools": self.cached_tools,
+            "system": self.cached_system,
+            "messages": self._with_cache_breakpoint(messages),
         }
 
-    def _handle_response_chain(self, response, conversation_history):
+    def _with_cache_breakpoint(self, messages):
         """
-        Handle the full response chain including tool calls, following agent.py logic.
-        Returns structured response data.
+        Return a copy of messages with a cache breakpoint on the last content block,
+        so the next call can read the whole conversation prefix from the cache.
+        The conversation history itself is left untouched.
         """
-        print("\n--- Starting response chain handling ---")
-        response_blocks = []
-        iteration = 0
-
-        while response.stop_reason == "tool_use":
-            iteration += 1
-            print(f"\n*** ITERATION {iteration} ***")
-            print(f"Stop reason: {response.stop_reason}")
-            print(f"Content blocks in response: {len(response.content)}")
-
-            # Log block types in this response
-            block_types = [block.type for block in response.content]
-            print(f"Block types: {block_types}")
-
-            # Extract blocks from current response
-            current_blocks = []
-            for block in response.content:
-                if block.type == "thinking":
-                    current_blocks.append(
-                        {
-                            "type": "thinking",
-                            "content": block.thinking,
-                            "iteration": iteration,
-                        }
-                    )
-                elif block.type == "redacted_thinking":
-                    current_blocks.append(
-                        {
-                            "type": "redacted_thinking",
-                            "content": "[Thinking content redacted]",
-                            "iteration": iteration,
-                        }
-                    )
-                elif block.type == "text":
-                    current_blocks.append(
-                        {"type": "text", "content": block.text, "iteration": iteration}
-                    )
-                elif block.type == "tool_use":
-                    current_blocks.append(
-                        {
-                            "type": "tool_use",
-                            "tool_name": block.name,
-                            "tool_input": block.input,
-                            "tool_id": block.id,
-                            "iteration": iteration,
-                        }
-                    )
-
-            response_blocks.extend(current_blocks)
-            print(f"Added {len(current_blocks)} blocks to response")
-
-            # Add assistant response to conversation history
-            assistant_blocks = []
-            for block in response.content:
-                if block.type in ["thinking", "redacted_thinking", "tool_use"]:
-                    assistant_blocks.append(block)
-
-            conversation_history.append(
-                {"role": "assistant", "content": assistant_blocks}
-            )
-            print("Added assistant message to conversation history")
-
-            # Execute ALL tool_use blocks if there are any
-            tool_use_blocks = [
-                block for block in response.content if block.type == "tool_use"
-            ]
-            if tool_use_blocks:
-                print(f"*** TOOL EXECUTION ({len(tool_use_blocks)} tools) ***")
-
-                # Collect all tool results
-                tool_results_content = []
-
-                for tool_use_block in tool_use_blocks:
-                    print(f"Tool name: {tool_use_block.name}")
-                    print(f"Tool input: {tool_use_block.input}")
-                    print(f"Tool ID: {tool_use_block.id}")
+        if not messages:
+            return messages
 
-                    # Execute the tool
-                    tool_result = self._execute_tool(
-                        tool_use_block.name, tool_use_block.input
-                    )
-                    print(f"Tool execution result: {tool_result}")
-
-                    # Add tool result to response blocks
-                    response_blocks.append(
-                        {
-                            "type": "tool_result",
-                            "tool_name": tool_use_block.name,
-                            "tool_input": tool_use_block.input,
-                            "tool_result": tool_result,
-                            "iteration": iteration,
-                        }
-                    )
+        last_message = messages[-1]
+        content = last_message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        else:
+            content = list(content)
 
-                    # Collect tool result for conversation history
-                    tool_results_content.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_block.id,
-                            "content": json.dumps(tool_result),
-                        }
-                    )
+        if content and isinstance(content[-1], dict):
+            content[-1] = {**content[-1], "cache_control": CACHE_CONTROL}
 
-                print("Added all tool results to response blocks")
+        return messages[:-1] + [{**last_message, "content": content}]
 
-                # Add ALL tool results to conversation in a single message
-                conversation_history.append(
-                    {
-                        "role": "user",
-                        "content": tool_results_content,
-                    }
-                )
-                print(
-                    f"Added {len(tool_results_content)} tool results to conversation history. Total messages: {len(conversation_history)}"
-                )
-
-                # Continue the conversation
-                print("*** CONTINUING CONVERSATION AFTER TOOL USE ***")
-                response = self.client.messages.create(
-                    model=self.model_name,
-                    max_tokens=self.max_tokens,
-                    thinking={
-                        "type": "enabled",
-                        "budget_tokens": self.thinking_budget_tokens,
-                    },
-                    tools=self.tools,
-                    system=self.system_prompt,
-                    messages=conversation_history,
+    def _execute_tools(self, tool_use_blocks, run):
+        """
+        Execute an engine run's tool_use blocks concurrently on the shared tool executor.
+        Yields (tool_use_block, tool_result) pairs in completion order. A tool that
+        runs past tool_timeout_seconds, or past the run's deadline, yields an
+        error result instead of blocking the rest of the iteration. Results are
+        ToolResults: serialized once for the client, with a compact
+        model_content for the model's tool_result. If the run is cancelled, or
+        the caller stops iterating, tools that have not started are dropped.
+        """
+        budget = run.budget
+        started_at = time.monotonic()
+        pending = {}
+        for tool_use_block in tool_use_blocks:
+            print(f"Submitting tool {tool_use_block.name} ({tool_use_block.id})")
+            print(f"Tool input: {tool_use_block.input}")
+            future = self.tool_executor.submit(self._run_tool, run, tool_use_block)
+            pending[future] = tool_use_block
+
+        deadline = min(started_at + self.tool_timeout_seconds, budget.deadline)
+        try:
+            while pending:
+                # Running out of time is reported per tool below, so every
+                # tool_use still gets a result; cancellation ends the run
+                if budget.cancelled:
+                    raise RunStopped(END_CANCELLED)
+                done, _ = wait(
+                    pending,
+                    timeout=min(max(deadline - time.monotonic(), 0), TOOL_CANCEL_POLL_SECONDS),
+                    return_when=FIRST_COMPLETED,
                 )
-            else:
-                print("No tool_use block found, breaking loop")
-                break
-
-        # Handle final response (no more tool use)
-        print("\n*** FINAL RESPONSE PROCESSING ***")
-        print(f"Final stop reason: {response.stop_reason}")
-        if response.stop_reason != "tool_use":
-            final_blocks = []
-            for block in response.content:
-                if block.type == "thinking":
-                    final_blocks.append(
-                        {
-                            "type": "thinking",
-                            "content": block.thinking,
-                            "iteration": iteration + 1,
-                        }
+                if not done and time.monotonic() >= deadline:
+                    # Every remaining tool is past its deadline
+                    message = (
+                        f"Tool execution timed out after {self.tool_timeout_seconds}s"
+                        if deadline < budget.deadline
+                        else "The request ran out of time before this tool finished"
                     )
-                elif block.type == "redacted_thinking":
-                    final_blocks.append(
-                        {
-                            "type": "redacted_thinking",
-                            "content": "[Thinking content redacted]",
-                            "iteration": iteration + 1,
-                        }
-                    )
-                elif block.type == "text":
-                    final_blocks.append(
-                        {
-                            "type": "text",
-                            "content": block.text,
-                            "iteration": iteration + 1,
-                        }
+                    for future, tool_use_block in list(pending.items()):
+                        future.cancel()
+                        del pending[future]
+                        print(f"!!! TOOL TIMEOUT: {tool_use_block.name} ({tool_use_block.id}) !!!")
+                        yield tool_use_block, ToolResult.build(tool_use_block.name, {"error": message})
+                    return
+
+                for future in done:
+                    tool_use_block = pending.pop(future)
+                    tool_result = future.result()
+                    print(
+                        f"Tool {tool_use_block.name} finished in "
+                        f"{time.monotonic() - started_at:.2f}s: {tool_result}"
                     )
+                    yield tool_use_block, tool_result
+        finally:
+            for future in pending:
+                future.cancel()
 
-            response_blocks.extend(final_blocks)
-            print(f"Added {len(final_blocks)} final blocks to response")
+    def _run_tool(self, run, tool_use_block):
+        """
+        Execute a tool on a worker thread, through the engine's middleware, and
+        serialize and shape its result there too. Spans opened by the tool
+        are added to the run's trace.
+        """
+        account_user_id = run.context.get("account_user_id")
+        with tracing(run.trace):
+            result = self.engine.call_tool(
+                run,
+                tool_use_block,
+                lambda: self._execute_tool(tool_use_block.name, tool_use_block.input, account_user_id),
+            )
+            with span("serialize", tool_use_block.name):
+                return ToolResult.build(tool_use_block.name, result)
 
-        print("\n--- Response chain handling complete ---")
-        print(f"Total response blocks: {len(response_blocks)}")
-        print(f"Total iterations: {iteration + 1}")
+    def _app_context(self):
+        return self.app.app_context() if self.app is not None else nullcontext()
 
-        return {
-            "blocks": response_blocks,
-            "stop_reason": response.stop_reason,
-            "total_iterations": iteration + 1,
-        }
-
-    def _execute_tool(self, tool_name, tool_input):
+    def _execute_tool(self, tool_name, tool_input, account_user_id=None):
         """Execute a tool and return the result."""
         print(f"\n+++ EXECUTING TOOL: {tool_name} +++")
         print(f"Tool input: {tool_input}")
@@ -615,68 +453,22 @@ Remember: Always ground your advice in the user's actual financial data combined
 
         try:
             if tool_name == "analyze_user_account":
-                print(f"MOCK USER DATA: {mock_user_data[0]}")
-                result = analyze_user_account()
-                # Return structured artifact for frontend
+                print(f"Analyzing accounts for user {account_user_id}")
+                with self._app_context():
+                    result = analyze_user_account(
+                        account_user_id,
+                        include_narrative=bool(tool_input.get("include_narrative")),
+                    )
+                # Balances, counts and totals are already structured fields
                 user_analysis_data = result.model_dump()
-                
-                # Calculate summary metrics from account data
-                total_balance = 0
-                for account in user_analysis_data.get("account_analysis", []):
-                    # Extract balance from analysis string
-                    analysis = account.get("analysis", "")
-                    balance_match = re.search(r"balance \$?([\d,]+\.?\d*)", analysis)
-                    if balance_match:
-                        balance = float(balance_match.group(1).replace(",", ""))
-                        total_balance += balance
-                        account["balance"] = balance
-                    
-                    # Extract counts from analysis string  
-                    expense_match = re.search(r"(\d+) expenses?", analysis)
-                    if expense_match:
-                        account["expense_count"] = int(expense_match.group(1))
-                    
-                    deposit_match = re.search(r"(\d+) deposits?", analysis)
-                    if deposit_match:
-                        account["deposit_count"] = int(deposit_match.group(1))
-                
-                user_analysis_data["total_balance"] = total_balance
-                user_analysis_data["total_accounts"] = len(user_analysis_data.get("account_analysis", []))
-                
                 print(f"Structured user analysis data: {user_analysis_data}")
                 return {"user_analysis": user_analysis_data}
             elif tool_name == "analyze_results":
                 result = analyze_results(tool_input["results"])
-                # Return the ToolResultsAnalysis object as a dict for JSON serialization
+                # Summary, findings and decisions only, not the raw Message
                 return {"analysis_results": result.model_dump()}
             print("Executing Composio tool for non-weather request")
-            print(f"User ID: {self.user_id}")
-            composio = Composio()
-            result = composio.tools.execute(
-                slug=tool_name,
-                user_id=self.user_id,
-                arguments=tool_input,
-            )
-            print(f"Raw Composio result: {result}")
-            print(f"Composio result type: {type(result)}")
-
-            # Parse results using appropriate parser based on tool name
-            if "finance" in tool_name.lower():
-                parsed_result = parse_composio_finance_search_results(result)
-                print("Used finance search parser")
-            elif "news" in tool_name.lower():
-                parsed_result = parse_composio_news_search_results(result)
-                print("Used news search parser")
-            elif "event" in tool_name.lower():
-                parsed_result = parse_composio_event_search_results(result)
-                print("Used event search parser")
-            else:
-                # Default to general search parser
-                parsed_result = parse_composio_search_results(result)
-                print("Used general search parser")
-
-            print(f"Parsed result: {parsed_result}")
-            return {"search_results": parsed_result}
+            return {"search_results": self._fetch_search_results(tool_name, tool_input)}
 
         except Exception as e:
             error_msg = f"Tool execution failed: {str(e)}"
@@ -687,3 +479,37 @@ Remember: Always ground your advice in the user's actual financial data combined
 
             print(f"Traceback: {traceback.format_exc()}")
             return {"error": error_msg}
+
+    def _fetch_search_results(self, tool_name, tool_input):
+        """Run a Composio search tool and parse the result. Called on search cache misses only."""
+        print(f"Calling Composio for {tool_name}")
+        print(f"User ID: {self.user_id}")
+        with span("composio", tool_name):
+            result = self.composio.execute(
+                slug=tool_name,
+                user_id=self.user_id,
+                arguments=tool_input,
+            )
+        print(f"Raw Composio result: {result}")
+        print(f"Composio pool stats: {self.composio.stats()}")
+        print(f"Composio result type: {type(result)}")
+
+        if isinstance(result, dict) and result.get("successful") is False:
+            return {"error": f"Composio search failed: {result.get('error')}"}
+
+        # Parse results using appropriate parser based on tool name
+        if "finance" in tool_name.lower():
+            parser = parse_composio_finance_search_results
+        elif "news" in tool_name.lower():
+            parser = parse_composio_news_search_results
+        elif "event" in tool_name.lower():
+            parser = parse_composio_event_search_results
+        else:
+            # Default to general search parser
+            parser = parse_composio_search_results
+        with span("parser", parser.__name__):
+            parsed_result = parser(result)
+        print(f"Used {parser.__name__}")
+
+        print(f"Parsed result: {parsed_result}")
+        return parsed_result
@@ -0,0 +1,247 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+from sqlalchemy import create_engine, delete, select  # type: ignore
+from app.config import (  # type: ignore
+    CHAT_SESSION_MAX,
+    CHAT_SESSION_IDLE_SECONDS,
+    CHAT_SESSION_MAX_BYTES,
+    CHAT_SESSION_SPILL_URL,
+    CHAT_SESSION_RETENTION_SECONDS,
+)
+from app.chat.models import ChatSession  # type: ignore
+from app.serialization import dumps, dumps_str, loads  # type: ignore
+
+
+class SessionBusyError(Exception):
+    """Raised when a session already has a message in flight."""
+
+
+def message_to_param(message: dict) -> dict:
+    """Convert a conversation message to plain, JSON-serializable request params.
+
+    Assistant content arrives as SDK block objects; they are dumped without
+    None fields so thinking signatures, tool_use ids and inputs survive a
+    round trip through the store and can be sent back to the API unchanged.
+    """
+    content = message["content"]
+    if isinstance(content, list):
+        content = [
+            block.model_dump(mode="json", exclude_none=True)
+            if hasattr(block, "model_dump")
+            else block
+            for block in content
+        ]
+    return {"role": message["role"], "content": content}
+
+
+def is_turn_start(message: dict) -> bool:
+    """A user message typed by the user, as opposed to one carrying tool results."""
+    return message["role"] == "user" and isinstance(message["content"], str)
+
+
+class ConversationSession:
+    """The stored message history of one conversation."""
+
+    def __init__(self, session_id: str, owner_id: Optional[int], messages: Optional[List[dict]] = None, updated_at: Optional[float] = None):
+        self.id = session_id
+        self.owner_id = owner_id
+        self.messages: List[dict] = messages or []
+        self.size_bytes = len(dumps(self.messages))
+        self.updated_at = updated_at or time.time()
+        self.lock = threading.Lock()
+
+    def trim_to(self, max_bytes: int) -> int:
+        """Drop whole turns, oldest first, until the history fits in max_bytes.
+
+        The latest turn is always kept. Dropping complete turns keeps every
+        tool_use paired with its tool_result. Returns the number of turns dropped.
+        """
+        dropped = 0
+        while self.size_bytes > max_bytes:
+            next_turn = next(
+                (index for index, message in enumerate(self.messages) if index and is_turn_start(message)),
+                None,
+            )
+            if next_turn is None:
+                break
+            self.messages = self.messages[next_turn:]
+            self.size_bytes = len(dumps(self.messages))
+            dropped += 1
+        return dropped
+
+
+class SQLSessionSpill:
+    """Durable tier for sessions evicted from memory, on any SQLAlchemy URL.
+
+    Works with SQLite (sqlite:///chat_sessions.db) or the app's Postgres
+    database; either needs the chat_sessions table (ChatSession) from the
+    migrations.
+    """
+
+    def __init__(self, url: str, retention_seconds: float):
+        self.engine = create_engine(url, pool_pre_ping=True)
+        self.retention_seconds = retention_seconds
+        self.table = ChatSession.__table__
+
+    def load(self, session_id: str) -> Optional[ConversationSession]:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(self.table).where(self.table.c.id == session_id)
+            ).first()
+        if row is None or row.updated_at < time.time() - self.retention_seconds:
+            return None
+        return ConversationSession(row.id, row.owner_id, loads(row.messages), row.updated_at)
+
+    def save(self, session: ConversationSession) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.id == session.id))
+            connection.execute(
+                self.table.insert().values(
+                    id=session.id,
+                    owner_id=session.owner_id,
+                    messages=dumps_str(session.messages),
+                    updated_at=session.updated_at,
+                )
+            )
+            # Expire abandoned conversations while we are here
+            connection.execute(
+                delete(self.table).where(
+                    self.table.c.updated_at < time.time() - self.retention_seconds
+                )
+            )
+
+
+class SessionStore:
+    """Server-side conversation history, keyed by session id.
+
+    Sessions live in an in-memory LRU. Idle sessions and those pushed out by
+    max_sessions are spilled to the optional SQL tier and reloaded from there
+    on their next message. Each session's history is capped at max_bytes by
+    dropping its oldest turns.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = CHAT_SESSION_MAX,
+        idle_seconds: float = CHAT_SESSION_IDLE_SECONDS,
+        max_bytes: int = CHAT_SESSION_MAX_BYTES,
+        spill_url: Optional[str] = CHAT_SESSION_SPILL_URL,
+        retention_seconds: float = CHAT_SESSION_RETENTION_SECONDS,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._spill_url = spill_url
+        self._retention_seconds = retention_seconds
+        self._spill: Optional[SQLSessionSpill] = None
+        self._spill_lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "resumed": 0, "spilled": 0, "reloaded": 0, "trimmed_turns": 0}
+
+    @property
+    def spill(self) -> Optional[SQLSessionSpill]:
+        """The SQL tier, connected on first use."""
+        if self._spill is None and self._spill_url:
+            with self._spill_lock:
+                if self._spill is None:
+                    self._spill = SQLSessionSpill(self._spill_url, self._retention_seconds)
+        return self._spill
+
+    def acquire(self, session_id: Optional[str], owner_id: Optional[int]) -> ConversationSession:
+        """
+        Return the caller's session, locked for one message. Unknown ids, or
+        ids owned by another user, get a fresh session with a new id. Raises
+        SessionBusyError if the session is already processing a message.
+        """
+        session = self._lookup(session_id, owner_id) if session_id else None
+        if session is None:
+            session = ConversationSession(uuid.uuid4().hex, owner_id)
+            self._record(created=1)
+        else:
+            self._record(resumed=1)
+
+        with self._lock:
+            # Two requests may have reloaded the same session from the spill
+            session = self._sessions.setdefault(session.id, session)
+            session.updated_at = time.time()
+            self._sessions.move_to_end(session.id)
+            evicted = self._evict_locked()
+        self._spill_all(evicted)
+
+        if not session.lock.acquire(blocking=False):
+            raise SessionBusyError("This conversation is still answering a previous message")
+        return session
+
+    def release(self, session: ConversationSession, messages: Optional[List[dict]] = None) -> None:
+        """Store the session's updated history (if given) and unlock it."""
+        try:
+            if messages is not None:
+                session.messages = [message_to_param(message) for message in messages]
+                session.size_bytes = len(dumps(session.messages))
+                dropped = session.trim_to(self.max_bytes)
+                if dropped:
+                    self._record(trimmed_turns=dropped)
+            session.updated_at = time.time()
+        finally:
+            session.lock.release()
+
+    def flush(self) -> None:
+        """Spill every in-memory session, e.g. on shutdown."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        self._spill_all(sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_memory"] = len(self._sessions)
+        stats["spill_enabled"] = bool(self._spill_url)
+        return stats
+
+    def _lookup(self, session_id: str, owner_id: Optional[int]) -> Optional[ConversationSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None and self.spill is not None:
+            session = self.spill.load(session_id)
+            if session is not None:
+                self._record(reloaded=1)
+        if session is None or session.owner_id != owner_id:
+            return None
+        return session
+
+    def _evict_locked(self) -> List[ConversationSession]:
+        """Pop idle sessions and any beyond max_sessions, oldest first. Caller holds _lock."""
+        evicted = []
+        idle_before = time.time() - self.idle_seconds
+        for session_id, session in list(self._sessions.items()):
+            over_capacity = len(self._sessions) > self.max_sessions
+            if not over_capacity and session.updated_at >= idle_before:
+                break
+            if session.lock.locked():
+                continue
+            del self._sessions[session_id]
+            evicted.append(session)
+        return evicted
+
+    def _spill_all(self, sessions: List[ConversationSession]) -> None:
+        if self.spill is None:
+            return
+        for session in sessions:
+            if session.messages:
+                self.spill.save(session)
+                self._record(spilled=1)
+
+    def _record(self, **counters) -> None:
+        with self._lock:
+            for name, value in counters.items():
+                self._stats[name] += value
+
+
+session_store = SessionStore()
+atexit.register(session_store.flush)
@@ -9,8 +9,156 @@ POSTGRES_DB = os.environ.get("POSTGRES_DB", "postgres")
 POSTGRES_HOST = os.environ.get("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.environ.get("POSTGRES_PORT", "5432")
 
+# Set by Fly.io and most hosts; takes precedence over the POSTGRES_* settings
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+
+# SQLAlchemy connection pool, per worker process. Each worker holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW Postgres connections and waits at most
+# DB_POOL_TIMEOUT_SECONDS for a free one. Connections are pinged on checkout
+# and replaced after DB_POOL_RECYCLE_SECONDS, before an idle server or proxy
+# drops them. DB_STATEMENT_TIMEOUT_MS caps every statement (0 for no limit).
+# DB_EXTERNAL_POOLER=pgbouncer connects through PgBouncer in transaction
+# mode: the app keeps no pool of its own and sets the statement timeout per
+# transaction, since PgBouncer rejects it as a startup parameter.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_CONNECT_TIMEOUT_SECONDS = int(os.environ.get("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_EXTERNAL_POOLER = os.environ.get("DB_EXTERNAL_POOLER", "").lower()
+
+
+# Frontend origins allowed to call the API (comma-separated), for the Flask
+# routes, Socket.IO and the native ASGI chat routes alike
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get("CORS_ORIGINS", "http://localhost:5173").split(",")
+    if origin.strip()
+]
+
+
+# Shared Composio client pool
+COMPOSIO_POOL_SIZE = int(os.environ.get("COMPOSIO_POOL_SIZE", "16"))
+COMPOSIO_TIMEOUT_SECONDS = float(os.environ.get("COMPOSIO_TIMEOUT_SECONDS", "20"))
+COMPOSIO_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("COMPOSIO_CONNECT_TIMEOUT_SECONDS", "5")
+)
+COMPOSIO_POOL_TIMEOUT_SECONDS = float(
+    os.environ.get("COMPOSIO_POOL_TIMEOUT_SECONDS", "10")
+)
+COMPOSIO_KEEPALIVE_SECONDS = float(os.environ.get("COMPOSIO_KEEPALIVE_SECONDS", "60"))
+COMPOSIO_MAX_RETRIES = int(os.environ.get("COMPOSIO_MAX_RETRIES", "3"))
+COMPOSIO_RETRY_BASE_SECONDS = float(os.environ.get("COMPOSIO_RETRY_BASE_SECONDS", "0.25"))
+COMPOSIO_RETRY_MAX_SECONDS = float(os.environ.get("COMPOSIO_RETRY_MAX_SECONDS", "4"))
+
+
+# analyze_user_account narrative cache, keyed on each user's data_version; set
+# ANALYSIS_CACHE_PATH to persist it in SQLite (clear that file if the database
+# is ever recreated, since versions then start over)
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", "256"))
+ANALYSIS_CACHE_PATH = os.environ.get("ANALYSIS_CACHE_PATH")
+
+# When analyze_user_account asks the model for a written narrative on top of
+# the computed metrics: "off", "on_request" (only when the tool call asks for
+# one) or "background" (also generate it off the request path for next time).
+# A cached narrative is returned in every mode but "off".
+ACCOUNT_NARRATIVE_MODE = os.environ.get("ACCOUNT_NARRATIVE_MODE", "on_request")
+
+
+# Per-user financial data kept in memory by each worker at its current data
+# version: the aggregates behind analyze_user_account and the columnar
+# transaction stores. Least recently used users are dropped beyond the limits.
+AGGREGATE_INDEX_MAX_USERS = int(os.environ.get("AGGREGATE_INDEX_MAX_USERS", "1024"))
+TRANSACTION_STORE_MAX_USERS = int(os.environ.get("TRANSACTION_STORE_MAX_USERS", "256"))
+TRANSACTION_STORE_MAX_BYTES = int(
+    os.environ.get("TRANSACTION_STORE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+
+# analyze_results: nested analysis of tool results on a smaller model.
+# Thinking is off unless ANALYZE_RESULTS_THINKING_BUDGET is set (min 1024, and
+# the model must support it).
+ANALYZE_RESULTS_MODEL = os.environ.get("ANALYZE_RESULTS_MODEL", "claude-3-5-haiku-20241022")
+ANALYZE_RESULTS_MAX_TOKENS = int(os.environ.get("ANALYZE_RESULTS_MAX_TOKENS", "600"))
+ANALYZE_RESULTS_THINKING_BUDGET = int(os.environ.get("ANALYZE_RESULTS_THINKING_BUDGET", "0"))
+ANALYZE_RESULTS_CACHE_SIZE = int(os.environ.get("ANALYZE_RESULTS_CACHE_SIZE", "256"))
+ANALYZE_RESULTS_CACHE_TTL_SECONDS = float(os.environ.get("ANALYZE_RESULTS_CACHE_TTL_SECONDS", "3600"))
+
+
+# JSON backend for API responses, SSE events and tool results: "orjson" or "json"
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "orjson")
+
+
+# Chat sessions: in-memory LRU with an optional SQL spill (e.g. the app database,
+# or sqlite:///chat_sessions.db) into the migrated chat_sessions table
+CHAT_SESSION_MAX = int(os.environ.get("CHAT_SESSION_MAX", "1000"))
+CHAT_SESSION_IDLE_SECONDS = float(os.environ.get("CHAT_SESSION_IDLE_SECONDS", "1800"))
+CHAT_SESSION_MAX_BYTES = int(os.environ.get("CHAT_SESSION_MAX_BYTES", str(512 * 1024)))
+CHAT_SESSION_SPILL_URL = os.environ.get("CHAT_SESSION_SPILL_URL")
+CHAT_SESSION_RETENTION_SECONDS = float(
+    os.environ.get("CHAT_SESSION_RETENTION_SECONDS", str(7 * 24 * 3600))
+)
+
+
+# Context compaction before each Messages API call in the chat tool loop
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "60000"))
+CONTEXT_KEEP_LIST_ITEMS = int(os.environ.get("CONTEXT_KEEP_LIST_ITEMS", "5"))
+CONTEXT_MAX_STRING_CHARS = int(os.environ.get("CONTEXT_MAX_STRING_CHARS", "400"))
+CONTEXT_MAX_TOOL_RESULT_CHARS = int(os.environ.get("CONTEXT_MAX_TOOL_RESULT_CHARS", "4000"))
+
+
+# Bounds on one chat request's agent loop: model calls and wall-clock time
+AGENT_MAX_ITERATIONS = int(os.environ.get("AGENT_MAX_ITERATIONS", "8"))
+AGENT_DEADLINE_SECONDS = float(os.environ.get("AGENT_DEADLINE_SECONDS", "120"))
+
+
+# Spans listed individually in the trace summary of each agent run's complete
+# event; totals per span always cover every span
+TRACE_MAX_SPANS = int(os.environ.get("TRACE_MAX_SPANS", "100"))
+
+
+# How much of each search result the model sees (the frontend gets it all)
+TOOL_RESULT_MAX_ORGANIC = int(os.environ.get("TOOL_RESULT_MAX_ORGANIC", "5"))
+TOOL_RESULT_MAX_FORUMS = int(os.environ.get("TOOL_RESULT_MAX_FORUMS", "2"))
+TOOL_RESULT_MAX_MARKETS = int(os.environ.get("TOOL_RESULT_MAX_MARKETS", "12"))
+TOOL_RESULT_SNIPPET_CHARS = int(os.environ.get("TOOL_RESULT_SNIPPET_CHARS", "240"))
+
+
+# Revoked JWTs (logout): "memory" (this process only), "sql" (the migrated
+# revoked_tokens table; JWT_REVOCATION_URL defaults to the app database and
+# must have the migrations applied if set) or "redis" (any
+# Redis-protocol server at JWT_REVOCATION_URL). Shared backends keep a small
+# per-process cache of tokens seen not revoked; a logout reaches other
+# workers within JWT_REVOCATION_NEGATIVE_CACHE_SECONDS.
+JWT_REVOCATION_BACKEND = os.environ.get("JWT_REVOCATION_BACKEND", "memory")
+JWT_REVOCATION_URL = os.environ.get("JWT_REVOCATION_URL")
+JWT_REVOCATION_NEGATIVE_CACHE_SIZE = int(os.environ.get("JWT_REVOCATION_NEGATIVE_CACHE_SIZE", "10000"))
+JWT_REVOCATION_NEGATIVE_CACHE_SECONDS = float(os.environ.get("JWT_REVOCATION_NEGATIVE_CACHE_SECONDS", "5"))
+
+
+# Password hashing on a dedicated process pool. PASSWORD_BCRYPT_ROUNDS is the
+# bcrypt work factor for new hashes; stored hashes with another factor are
+# rehashed on login. Beyond PASSWORD_HASH_MAX_PENDING queued or running
+# operations, signup and login answer 429.
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))
+)
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "32"))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    # SQLAlchemy only accepts the postgresql:// scheme, not postgres://
+    SQLALCHEMY_DATABASE_URI = (
+        DATABASE_URL.replace("postgres://", "postgresql://", 1)
+        if DATABASE_URL
+        else f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "super-secret-key")
+    # Flask-Bcrypt (seed.py) hashes with the same work factor as the pool
+    BCRYPT_LOG_ROUNDS = PASSWORD_BCRYPT_ROUNDS
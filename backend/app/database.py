@@ -0,0 +1,121 @@
+"""
+Engine options for the app database and metrics for its connection pool.
+
+engine_options() turns the DB_* settings into SQLALCHEMY_ENGINE_OPTIONS for
+Postgres URLs; other databases (SQLite in development) keep SQLAlchemy's
+defaults. instrument_engine() records checkouts, how long each took, pool
+timeouts and connections opened or invalidated in the /metrics registry.
+"""
+import time
+from sqlalchemy import event  # type: ignore
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError  # type: ignore
+from sqlalchemy.pool import NullPool, QueuePool  # type: ignore
+from app.config import (  # type: ignore
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_SECONDS,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_PRE_PING,
+    DB_CONNECT_TIMEOUT_SECONDS,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_EXTERNAL_POOLER,
+)
+from app.observability import metrics  # type: ignore
+
+EXTERNAL_POOLERS = ("", "pgbouncer")
+
+CHECKOUT_SECONDS = metrics.histogram(
+    "db_pool_checkout_seconds",
+    "Time to get a database connection from the pool, including opening a new one.",
+)
+CHECKOUTS = metrics.counter("db_pool_checkouts_total", "Database connections checked out of the pool.")
+CHECKOUT_TIMEOUTS = metrics.counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS with every connection in use.",
+)
+IN_USE = metrics.gauge("db_pool_connections_in_use", "Database connections currently checked out.")
+OPENED = metrics.counter("db_connections_opened_total", "Database connections opened.")
+INVALIDATED = metrics.counter(
+    "db_connections_invalidated_total",
+    "Database connections discarded as broken, e.g. dropped by the server while idle.",
+)
+
+
+class _TimedCheckout:
+    """Times the pool's own checkout, which is where waiting for a free connection happens."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            CHECKOUT_SECONDS.observe(time.perf_counter() - started_at)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def engine_options(url: str) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for url from the DB_* settings."""
+    if not url.startswith("postgresql"):
+        return {}
+    if DB_EXTERNAL_POOLER not in EXTERNAL_POOLERS:
+        raise ValueError(f"Unknown DB_EXTERNAL_POOLER: {DB_EXTERNAL_POOLER}")
+
+    connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}
+    if DB_EXTERNAL_POOLER:
+        # PgBouncer pools server connections across every worker; a second
+        # pool here would only pin them. psycopg2 uses no server-side
+        # prepared statements, so transaction mode needs nothing else.
+        return {"poolclass": InstrumentedNullPool, "connect_args": connect_args}
+
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def _set_local_statement_timeout(connection) -> None:
+    # Scoped to the transaction, so it never outlives it on a shared server connection
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+def instrument_engine(engine) -> None:
+    """Feed engine's pool events into the db_* metrics."""
+    event.listen(engine, "connect", lambda dbapi_connection, record: OPENED.inc())
+    event.listen(engine, "invalidate", lambda dbapi_connection, record, exception: INVALIDATED.inc())
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        CHECKOUTS.inc()
+        IN_USE.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        IN_USE.dec()
+
+    if (
+        DB_EXTERNAL_POOLER
+        and DB_STATEMENT_TIMEOUT_MS > 0
+        and engine.dialect.name == "postgresql"
+    ):
+        event.listen(engine, "begin", _set_local_statement_timeout)
@@ -3,11 +3,18 @@ from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
 from flask_socketio import SocketIO
+from app.config import CORS_ORIGINS
+from app.user.revocation import RevocationStore
 
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
 bcrypt = Bcrypt()
 migrate = Migrate()
-blacklist = set()
-socketio = SocketIO(cors_allowed_origins="http://localhost:5173")
+revocation_store = RevocationStore()
+socketio = SocketIO(cors_allowed_origins=CORS_ORIGINS)
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return revocation_store.is_revoked(jwt_payload["jti"], jwt_payload.get("exp"))
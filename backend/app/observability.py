@@ -0,0 +1,314 @@
+"""
+Spans, request traces and Prometheus-style metrics for the chat path.
+
+span() times a block of work. Every span is recorded in the process-wide
+agent_span_seconds histogram and, when one is active, in the request's
+Trace, whose summary is sent with the agent's complete event. Metrics are
+exposed in the Prometheus text format at /metrics. They are per process;
+scrape each worker.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import Blueprint, Response  # type: ignore
+from app.config import TRACE_MAX_SPANS  # type: ignore
+
+# Seconds; spans range from sub-millisecond parsing to minute-long model streams
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+INF_BUCKET = 'le="+Inf"'
+
+# Tokens per model call
+TOKEN_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge:
+    """A value per label set that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(series)) for key, series in self._values.items())
+        lines = []
+        for key, series in values:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            count = series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics rendered at /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "agent_span_seconds",
+    "Duration of instrumented work in the chat path (model calls, tools, parsers, SSE).",
+    ("span", "name"),
+)
+ITERATION_TOKENS = metrics.histogram(
+    "agent_iteration_tokens",
+    "Tokens per agent model call, by kind.",
+    ("kind",),
+    buckets=TOKEN_BUCKETS,
+)
+TOKENS_TOTAL = metrics.counter("agent_tokens_total", "Tokens used by agent model calls, by kind.", ("kind",))
+RUN_SECONDS = metrics.histogram("agent_run_seconds", "Wall-clock duration of agent runs.", ("end_reason",))
+RUNS_TOTAL = metrics.counter("agent_runs_total", "Agent runs, by why they ended.", ("end_reason",))
+
+
+class Trace:
+    """
+    Spans recorded during one agent run, possibly from several threads.
+    Only the first TRACE_MAX_SPANS spans are kept individually; totals per
+    span cover all of them.
+    """
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.started_at = time.perf_counter()
+        self.max_spans = max_spans
+        self.spans: List[dict] = []
+        self.totals: Dict[str, dict] = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, span: str, name: str, started_at: float, duration: float, iteration: Optional[int]) -> None:
+        key = f"{span}:{name}" if name else span
+        with self._lock:
+            total = self.totals.setdefault(key, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            total["count"] += 1
+            total["total_ms"] += duration * 1000
+            total["max_ms"] = max(total["max_ms"], duration * 1000)
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            entry = {
+                "span": span,
+                "name": name,
+                "start_ms": round((started_at - self.started_at) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+            }
+            if iteration is not None:
+                entry["iteration"] = iteration
+            self.spans.append(entry)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "duration_ms": round((time.perf_counter() - self.started_at) * 1000, 2),
+                "totals": {
+                    key: {
+                        "count": total["count"],
+                        "total_ms": round(total["total_ms"], 2),
+                        "max_ms": round(total["max_ms"], 2),
+                    }
+                    for key, total in self.totals.items()
+                },
+                "spans": list(self.spans),
+                "dropped_spans": self.dropped,
+            }
+
+
+# The trace spans are added to on this thread, if any
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def tracing(trace: Trace):
+    """Make trace the current trace for spans opened in this block (e.g. on a tool thread)."""
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+
+def record_span(
+    span: str,
+    name: str,
+    started_at: float,
+    trace: Optional[Trace] = None,
+    iteration: Optional[int] = None,
+) -> None:
+    """Record a span that started at started_at (time.perf_counter()) and ends now."""
+    duration = time.perf_counter() - started_at
+    SPAN_SECONDS.observe(duration, span=span, name=name)
+    trace = trace if trace is not None else current_trace.get()
+    if trace is not None:
+        trace.record(span, name, started_at, duration, iteration)
+
+
+@contextmanager
+def span(span: str, name: str = "", trace: Optional[Trace] = None, iteration: Optional[int] = None):
+    """Time the block into agent_span_seconds and the given or current trace."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(span, name, started_at, trace, iteration)
+
+
+def record_usage(usage: dict) -> None:
+    """Record one model call's token usage (input, output and cache tokens)."""
+    for kind, tokens in usage.items():
+        kind = kind.removesuffix("_tokens").removesuffix("_input")
+        ITERATION_TOKENS.observe(tokens, kind=kind)
+        TOKENS_TOTAL.inc(tokens, kind=kind)
+
+
+def record_run(end_reason: str, seconds: float) -> None:
+    RUN_SECONDS.observe(seconds, end_reason=end_reason)
+    RUNS_TOTAL.inc(end_reason=end_reason)
+
+
+observability = Blueprint("observability", __name__)
+
+
+@observability.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,55 @@
+"""
+Query parameters shared by the paginated endpoints: page size, opaque
+keyset cursors and plain id cursors.
+"""
+import base64
+import binascii
+from typing import Optional
+
+# Page size when the client does not ask for one
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidQueryError(ValueError):
+    """Raised for malformed filter, cursor or page size parameters."""
+
+
+def parse_limit_param(value: Optional[str]) -> int:
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidQueryError("limit must be an integer")
+    if limit < 1:
+        raise InvalidQueryError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_id_param(value: Optional[str], name: str) -> Optional[int]:
+    """A plain id cursor such as ?after=<id>, or None when it is not given."""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidQueryError(f"{name} must be an integer id")
+
+
+def encode_cursor(kind: str, last_id: int) -> str:
+    """Opaque cursor pointing just past last_id."""
+    return base64.urlsafe_b64encode(f"{kind}:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], kind: str) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_kind, last_id = base64.urlsafe_b64decode(padded).decode().split(":")
+        if cursor_kind != kind:
+            raise ValueError
+        return int(last_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidQueryError("Invalid cursor")
@@ -0,0 +1,104 @@
+"""
+JSON serialization shared by Flask responses, SSE events and tool results.
+
+Uses orjson when it is installed (and JSON_SERIALIZER is "orjson"), with
+the standard library as a fallback. Output is always UTF-8 bytes.
+"""
+import json
+from typing import Any
+from flask.json.provider import JSONProvider  # type: ignore
+# Flask's own fallback: dates as HTTP dates, Decimal, UUID, dataclasses, __html__
+from flask.json.provider import _default as flask_default  # type: ignore
+from app.config import JSON_SERIALIZER  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None and JSON_SERIALIZER == "orjson" else "json"
+
+# Pre-encoded values are spliced in verbatim instead of being re-serialized
+SUPPORTS_FRAGMENTS = BACKEND == "orjson" and hasattr(orjson, "Fragment")
+
+
+class PreEncoded(dict):
+    """
+    A dict that carries its own JSON encoding.
+
+    Built once by encode_once(); dumps() embeds .encoded as-is wherever the
+    value appears, so a large tool result is serialized a single time no
+    matter how many events or messages it goes into. Treat it as read-only:
+    mutations are not reflected in .encoded.
+    """
+
+    __slots__ = ("encoded",)
+
+    def __init__(self, value: dict, encoded: bytes):
+        super().__init__(value)
+        self.encoded = encoded
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, PreEncoded):
+        return orjson.Fragment(value.encoded)
+    # Other subclasses reach here because of OPT_PASSTHROUGH_SUBCLASS
+    for base in (dict, list, str, int, float):
+        if isinstance(value, base):
+            return base(value)
+    # orjson handles datetime and UUID itself; Decimal and the rest are
+    # converted the way Flask's default provider did
+    return flask_default(value)
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if SUPPORTS_FRAGMENTS:
+        return orjson.dumps(
+            value,
+            default=_default,
+            option=orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_NON_STR_KEYS,
+        )
+    if BACKEND == "orjson":
+        return orjson.dumps(value, default=flask_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        value, default=flask_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def dumps_str(value: Any) -> str:
+    return dumps(value).decode("utf-8")
+
+
+def loads(data) -> Any:
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_once(value: dict) -> PreEncoded:
+    """Serialize a value now and return it with its encoding attached."""
+    if isinstance(value, PreEncoded):
+        return value
+    return PreEncoded(value, dumps(value))
+
+
+def sse_event(value: Any) -> bytes:
+    """Frame a value as one server-sent event."""
+    return b"data: " + dumps(value) + b"\n\n"
+
+
+class SerializerJSONProvider(JSONProvider):
+    """Flask JSON provider backed by this module, so jsonify uses it too."""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps_str(obj)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,44 @@
+"""
+bcrypt operations run in the password hashing pool's worker processes.
+
+Workers are spawned, so each one imports this module fresh. It must not
+import anything from the app beyond this package's empty __init__ files,
+or every new worker would load the whole app before its first hash.
+"""
+import hmac
+from typing import Optional, Tuple
+import bcrypt  # type: ignore
+
+# bcrypt only uses the first 72 bytes; older bcrypt releases truncated
+# silently and newer ones raise, so truncate to keep existing hashes valid
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
+
+
+def hash_rounds(pw_hash: str) -> Optional[int]:
+    """The work factor of a bcrypt hash ($2b$<rounds>$...), or None if it is not one."""
+    parts = pw_hash.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def verify_password(pw_hash: str, password: str) -> bool:
+    encoded = pw_hash.encode("utf-8")
+    return hmac.compare_digest(bcrypt.hashpw(_password_bytes(password), encoded), encoded)
+
+
+def verify_and_rehash(pw_hash: str, password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Verify, and if the hash uses another work factor return a new one, in one round trip."""
+    if not verify_password(pw_hash, password):
+        return False, None
+    if hash_rounds(pw_hash) != rounds:
+        return True, hash_password(password, rounds)
+    return True, None
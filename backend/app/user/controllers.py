@@ -1,39 +1,82 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from app.user.models import User
-from app.extensions import db, bcrypt
 from flask_jwt_extended import (
     create_access_token,
     jwt_required,
     get_jwt,
     get_jwt_identity,
 )
-from app.extensions import blacklist
+from app.extensions import revocation_store
+from app.user.passwords import PasswordHasherBusy, password_hasher
+from app.user.services import (
+    duplicate_field,
+    find_login,
+    get_public_user,
+    register_user,
+    stream_user_page,
+    update_password,
+)
+from app.pagination import InvalidQueryError, parse_id_param, parse_limit_param
+from concurrent.futures import TimeoutError as HashTimeoutError
 from sqlalchemy.exc import IntegrityError
 
 users = Blueprint("users", __name__)
 
 
+@users.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    response = jsonify({"error": "too many login attempts in progress, try again shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 429
+
+
+@users.errorhandler(HashTimeoutError)
+def password_hasher_timeout(e):
+    return jsonify({"error": "password check timed out, try again"}), 503
+
+
 @users.route("/", methods=["GET"])
 def get_users():
-    users = User.query.all()
-    return jsonify(
-        [{"id": user.id, "name": user.name, "email": user.email} for user in users]
+    """
+    List users in id order, a page at a time. Query params: limit and after
+    (the next_after of the previous page). The page is streamed.
+    """
+    try:
+        limit = parse_limit_param(request.args.get("limit"))
+        after_id = parse_id_param(request.args.get("after"), "after")
+    except InvalidQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(
+        stream_with_context(stream_user_page(after_id, limit)),
+        mimetype="application/json",
     )
 
 
 @users.route("/", methods=["POST"])
 def create_user():
     data = request.get_json()
-    user = User(name=data["name"], email=data["email"])
-    db.session.add(user)
-    db.session.commit()
-    return jsonify({"id": user.id, "name": user.name, "email": user.email}), 201
+    username = data.get("username")
+    email = data.get("email")
+    password = data.get("password")
+    if not username or not email or not password:
+        return jsonify({"error": "username, email and password required"}), 400
+
+    try:
+        user = register_user(username, email, password_hasher.hash(password))
+    except IntegrityError as e:
+        field = duplicate_field(e)
+        if field:
+            return jsonify({"error": f"{field} taken"}), 409
+        return jsonify({"error": "database error"}), 500
+    return jsonify({"id": user.id, "username": user.username, "email": user.email}), 201
 
 
 @users.route("/<int:user_id>", methods=["GET"])
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify({"id": user.id, "name": user.name, "email": user.email})
+    user = get_public_user(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(user)
 
 
 @users.route("/signup", methods=["POST"])
@@ -45,18 +88,15 @@ def signup():
 
     if not username or not password:
         return jsonify({"error": "username and password required"}), 400
-    if User.query.filter_by(username=username).first():
-        return jsonify({"error": "username taken"}), 409
-    if User.query.filter_by(email=email).first():
-        return jsonify({"error": "email taken"}), 409
-    hashed_password = bcrypt.generate_password_hash(password).decode("utf-8")
-    new_user = User(username=username, email=email, password=hashed_password)
-    db.session.add(new_user)
+    hashed_password = password_hasher.hash(password)
 
+    # One insert; the unique indexes decide whether the name or email is taken
     try:
-        db.session.commit()
-    except IntegrityError:
-        db.session.rollback()
+        register_user(username, email, hashed_password)
+    except IntegrityError as e:
+        field = duplicate_field(e)
+        if field:
+            return jsonify({"error": f"{field} taken"}), 409
         return jsonify({"error": "database error"}), 500
     return jsonify({"msg": "signup succesful"}), 201
 
@@ -69,9 +109,15 @@ def login():
     if not username or not password:
         return jsonify({"error": "username and password required"}), 400
 
-    user = User.query.filter_by(username=username).first()
-    if not user or not bcrypt.check_password_hash(user.password, password):
+    user = find_login(username)
+    if not user:
+        return jsonify({"error": "invalid username or password"}), 401
+    matches, new_hash = password_hasher.verify_and_update(user.password, password)
+    if not matches:
         return jsonify({"error": "invalid username or password"}), 401
+    if new_hash:
+        # The work factor changed since this hash was made
+        update_password(user.id, new_hash)
 
     access_token = create_access_token(identity=str(user.id))
     return jsonify(
@@ -86,8 +132,9 @@ def login():
 @users.route("/logout", methods=["POST"])
 @jwt_required()
 def logout():
-    jti = get_jwt()["jti"]  # get the token ID
-    blacklist.add(jti)  # mark it as revoked
+    token = get_jwt()
+    # Revoked until the token would have expired anyway
+    revocation_store.revoke(token["jti"], token.get("exp"))
     return jsonify({"msg": "Successfully logged out"}), 200
 
 
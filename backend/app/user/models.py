@@ -1,10 +1,38 @@
 from app.extensions import db
 
+# Constraint names signup maps to "taken" errors
+USERNAME_INDEX = "uq_users_username_lower"
+EMAIL_CONSTRAINT = "users_email_key"
+
 
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        # Usernames are unique ignoring case. Login looks users up by
+        # lower(username); on Postgres the index also carries the columns
+        # login reads, so the lookup is an index-only scan.
+        db.Index(
+            USERNAME_INDEX,
+            db.func.lower(db.text("username")),
+            unique=True,
+            postgresql_include=["id", "username", "password"],
+        ),
+        db.UniqueConstraint("email", name=EMAIL_CONSTRAINT),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False)
-    email = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(80), nullable=False)
     password = db.Column(db.String(80), nullable=False)
+    # Incremented by every flush that writes the user's accounts or
+    # transactions (see app.chat.accounts.models); 0 until they have any.
+    # Caches and ETags of the user's financial data key on it.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+class RevokedToken(db.Model):
+    # Logged-out JWT ids for JWT_REVOCATION_BACKEND=sql (see app.user.revocation)
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
@@ -0,0 +1,107 @@
+"""
+Password hashing off the request threads.
+
+bcrypt is CPU-bound by design, so hashing and verification run on a small
+process pool instead of the workers that serve chat streams. The number of
+operations queued or running is capped; past it callers get
+PasswordHasherBusy straight away (a 429) rather than waiting in line.
+Hashes with a different work factor are upgraded on the next login.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from app.config import (  # type: ignore
+    PASSWORD_BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+    PASSWORD_HASH_TIMEOUT_SECONDS,
+)
+from app.observability import metrics, span  # type: ignore
+from app.user._bcrypt_worker import hash_password, verify_and_rehash, verify_password  # type: ignore
+
+REJECTED = metrics.counter(
+    "password_hash_rejected_total",
+    "Password hash operations refused because the hashing pool was saturated.",
+    ("op",),
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password operations are already queued."""
+
+
+class PasswordHasher:
+    """bcrypt on a bounded process pool, started on first use."""
+
+    def __init__(
+        self,
+        rounds: int = PASSWORD_BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        timeout_seconds: float = PASSWORD_HASH_TIMEOUT_SECONDS,
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def hash(self, password: str) -> str:
+        return self._run("hash", hash_password, password, self.rounds)
+
+    def verify(self, pw_hash: str, password: str) -> bool:
+        return self._run("verify", verify_password, pw_hash, password)
+
+    def verify_and_update(self, pw_hash: str, password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password. Returns (matches, new_hash); new_hash is set when
+        the stored hash was made with a different work factor and should
+        replace it.
+        """
+        return self._run("verify", verify_and_rehash, pw_hash, password, self.rounds)
+
+    def _run(self, op: str, function, *args):
+        # A slot is held from submission until the worker finishes, even if
+        # the caller stops waiting, so the pool's backlog stays bounded
+        if not self._slots.acquire(blocking=False):
+            REJECTED.inc(op=op)
+            raise PasswordHasherBusy("Too many password operations in progress")
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        with span("password_hash", op):
+            try:
+                return future.result(timeout=self.timeout_seconds)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for the next caller
+                with self._lock:
+                    self._executor = None
+                raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher()
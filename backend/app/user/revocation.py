@@ -0,0 +1,181 @@
+import heapq
+import threading
+import time
+from typing import Optional
+from sqlalchemy import create_engine, delete, select  # type: ignore
+from sqlalchemy.exc import IntegrityError  # type: ignore
+from app.agent.tools.cache import TTLCache  # type: ignore
+from app.config import (  # type: ignore
+    JWT_REVOCATION_BACKEND,
+    JWT_REVOCATION_URL,
+    JWT_REVOCATION_NEGATIVE_CACHE_SIZE,
+    JWT_REVOCATION_NEGATIVE_CACHE_SECONDS,
+    Config,
+)
+
+try:
+    import redis  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    redis = None
+
+# Kept this long when a token carries no exp claim
+NO_EXPIRY_RETENTION_SECONDS = 30 * 24 * 3600
+
+
+class MemoryRevocationBackend:
+    """Revoked token ids in a dict, for a single process. Expired entries are
+    dropped as new ones are added."""
+
+    shared = False
+
+    def __init__(self):
+        self._expires_at = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            now = time.time()
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                _, expired = heapq.heappop(self._expiry_heap)
+                if self._expires_at.get(expired, now + 1) <= now:
+                    del self._expires_at[expired]
+            self._expires_at[jti] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, jti))
+
+    def is_revoked(self, jti: str) -> bool:
+        expires_at = self._expires_at.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+
+class SQLRevocationBackend:
+    """Revoked token ids in the revoked_tokens table (RevokedToken, created
+    by the migrations) on any SQLAlchemy URL, shared by every worker that
+    uses the same database. Expired rows are deleted as new ones are added."""
+
+    shared = True
+
+    def __init__(self, url: str):
+        # Imported here: app.extensions builds the store before the models exist
+        from app.user.models import RevokedToken  # type: ignore
+
+        self.engine = create_engine(url, pool_pre_ping=True)
+        self.table = RevokedToken.__table__
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(delete(self.table).where(self.table.c.expires_at <= time.time()))
+                connection.execute(self.table.insert().values(jti=jti, expires_at=expires_at))
+        except IntegrityError:
+            # Already revoked, e.g. a repeated logout
+            pass
+
+    def is_revoked(self, jti: str) -> bool:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(self.table.c.expires_at).where(self.table.c.jti == jti)
+            ).first()
+        return row is not None and row.expires_at > time.time()
+
+
+class RedisRevocationBackend:
+    """Revoked token ids as keys on a Redis-protocol server (Redis, Valkey,
+    KeyDB, ...), each expiring at its token's exp."""
+
+    shared = True
+    key_prefix = "revoked_jti:"
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("JWT_REVOCATION_BACKEND=redis requires the redis package")
+        self.client = redis.Redis.from_url(url)
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        ttl = int(expires_at - time.time()) + 1
+        if ttl > 0:
+            self.client.set(self.key_prefix + jti, b"1", ex=ttl)
+
+    def is_revoked(self, jti: str) -> bool:
+        return bool(self.client.exists(self.key_prefix + jti))
+
+
+class RevocationStore:
+    """
+    Revoked JWT ids, checked on every @jwt_required request.
+
+    The backend is chosen by JWT_REVOCATION_BACKEND ("memory", "sql" or
+    "redis") and connected on first use. Entries expire at the token's exp.
+    For shared backends a per-process negative cache remembers tokens found
+    not revoked for a few seconds, so most checks never leave the process;
+    a logout in another worker is seen once that entry expires. A logout in
+    this process is seen at once.
+    """
+
+    def __init__(
+        self,
+        backend: str = JWT_REVOCATION_BACKEND,
+        url: Optional[str] = JWT_REVOCATION_URL,
+        negative_cache_size: int = JWT_REVOCATION_NEGATIVE_CACHE_SIZE,
+        negative_cache_seconds: float = JWT_REVOCATION_NEGATIVE_CACHE_SECONDS,
+    ):
+        self.backend_name = backend
+        self.url = url
+        self.negative_cache_seconds = negative_cache_seconds
+        self.not_revoked = TTLCache(max_entries=negative_cache_size, default_ttl=negative_cache_seconds)
+        self._backend = None
+        self._lock = threading.Lock()
+        # Bumped by every revoke; a lookup that started before a revoke must
+        # not cache its (possibly stale) "not revoked" answer
+        self._generation = 0
+        self._cache_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        if self.backend_name == "memory":
+            return MemoryRevocationBackend()
+        if self.backend_name == "sql":
+            return SQLRevocationBackend(self.url or Config.SQLALCHEMY_DATABASE_URI)
+        if self.backend_name == "redis":
+            return RedisRevocationBackend(self.url or "redis://localhost:6379/0")
+        raise ValueError(f"Unknown JWT_REVOCATION_BACKEND: {self.backend_name}")
+
+    def revoke(self, jti: str, expires_at: Optional[float]) -> None:
+        """Revoke a token until its exp (a Unix timestamp)."""
+        if expires_at is None:
+            expires_at = time.time() + NO_EXPIRY_RETENTION_SECONDS
+        self.backend.revoke(jti, float(expires_at))
+        with self._cache_lock:
+            self._generation += 1
+            self.not_revoked.invalidate(jti)
+
+    def is_revoked(self, jti: str, expires_at: Optional[float] = None) -> bool:
+        backend = self.backend
+        if not backend.shared or self.negative_cache_seconds <= 0:
+            return backend.is_revoked(jti)
+        if self.not_revoked.get(jti) is not None:
+            return False
+        generation = self._generation
+        if backend.is_revoked(jti):
+            return True
+        # Never cached past the token's own expiry
+        ttl = self.negative_cache_seconds
+        if expires_at is not None:
+            ttl = min(ttl, float(expires_at) - time.time())
+        if ttl > 0:
+            with self._cache_lock:
+                if self._generation == generation:
+                    self.not_revoked.set(jti, True, ttl=ttl)
+        return False
+
+    def stats(self) -> dict:
+        stats = self.not_revoked.stats()
+        stats["backend"] = self.backend_name
+        return stats
@@ -0,0 +1,101 @@
+from typing import Iterator, Optional
+from sqlalchemy import func, select, update  # type: ignore
+from sqlalchemy.exc import IntegrityError  # type: ignore
+from app.extensions import db  # type: ignore
+from app.user.models import EMAIL_CONSTRAINT, USERNAME_INDEX, User  # type: ignore
+from app.serialization import dumps_str  # type: ignore
+
+# Rows fetched from the database and serialized per chunk of a user listing
+USER_STREAM_CHUNK_ROWS = 500
+
+# Unique constraint or index name -> the signup field it protects
+UNIQUE_FIELDS = {USERNAME_INDEX: "username", EMAIL_CONSTRAINT: "email"}
+
+
+def duplicate_field(error: IntegrityError) -> Optional[str]:
+    """The field whose unique constraint an insert violated, or None for other errors."""
+    diag = getattr(error.orig, "diag", None)
+    constraint_name = getattr(diag, "constraint_name", None)
+    if constraint_name:
+        return UNIQUE_FIELDS.get(constraint_name)
+    # SQLite names the index, or the column for table constraints
+    message = str(error.orig)
+    if "UNIQUE" not in message:
+        return None
+    for name, field in UNIQUE_FIELDS.items():
+        if f"'{name}'" in message or f"users.{field}" in message:
+            return field
+    return None
+
+
+def register_user(username: str, email: str, password_hash: str) -> User:
+    """Insert a user. Raises IntegrityError, session rolled back, if the username or email is taken."""
+    user = User(username=username, email=email, password=password_hash)
+    db.session.add(user)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise
+    return user
+
+
+def find_login(username: str):
+    """
+    The id, username and password hash for a login, matching the username
+    case-insensitively, or None. Served from uq_users_username_lower alone.
+    """
+    return db.session.execute(
+        select(User.id, User.username, User.password).where(
+            func.lower(User.username) == func.lower(username)
+        )
+    ).first()
+
+
+def update_password(user_id: int, password_hash: str) -> None:
+    db.session.execute(update(User).where(User.id == user_id).values(password=password_hash))
+    db.session.commit()
+
+
+def public_user(row) -> dict:
+    """The fields of a user that any client may see."""
+    return {"id": row.id, "username": row.username, "email": row.email}
+
+
+def get_public_user(user_id: int) -> Optional[dict]:
+    row = db.session.execute(
+        select(User.id, User.username, User.email).where(User.id == user_id)
+    ).first()
+    return public_user(row) if row else None
+
+
+def stream_user_page(after_id: Optional[int], limit: int) -> Iterator[str]:
+    """
+    Yield {"success": true, "data": [...], "next_after": id} for the users
+    with ids after after_id, in id order, USER_STREAM_CHUNK_ROWS at a time.
+    Only id, username and email are read. next_after is the value to pass
+    as ?after= for the next page, or null on the last page.
+    """
+    query = select(User.id, User.username, User.email).order_by(User.id).limit(limit + 1)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    result = db.session.execute(query.execution_options(yield_per=USER_STREAM_CHUNK_ROWS))
+    try:
+        yield '{"success":true,"data":['
+        sent = 0
+        last_id = None
+        has_more = False
+        for rows in result.partitions():
+            if sent + len(rows) > limit:
+                # The extra row only tells us there is another page
+                rows = rows[: limit - sent]
+                has_more = True
+            if rows:
+                yield ("," if sent else "") + ",".join(dumps_str(public_user(row)) for row in rows)
+                sent += len(rows)
+                last_id = rows[-1].id
+            if has_more:
+                break
+        yield f'],"next_after":{dumps_str(last_id if has_more else None)}}}'
+    finally:
+        result.close()
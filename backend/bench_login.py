@@ -0,0 +1,87 @@
+"""
+Measure login throughput of the password hashing pool.
+
+Runs password verifications (the CPU cost of a login) through
+PasswordHasher from several client threads for a fixed time and reports
+logins/sec, logins/sec per worker core and latency percentiles, next to a
+single inline bcrypt check for comparison.
+
+Usage: python bench_login.py [--rounds 12] [--workers N] [--concurrency 16] [--seconds 10]
+"""
+import argparse
+import os
+import threading
+import time
+from app.user._bcrypt_worker import hash_password, verify_password  # type: ignore
+from app.user.passwords import PasswordHasher, PasswordHasherBusy  # type: ignore
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measurement time")
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    pw_hash = hash_password(password, args.rounds)
+
+    started = time.perf_counter()
+    verify_password(pw_hash, password)
+    inline_seconds = time.perf_counter() - started
+    print(f"bcrypt rounds={args.rounds}: one inline check takes {inline_seconds * 1000:.1f} ms "
+          f"(~{1 / inline_seconds:.1f} logins/sec on one core)")
+
+    hasher = PasswordHasher(
+        rounds=args.rounds,
+        workers=args.workers,
+        max_pending=args.concurrency,
+        timeout_seconds=60,
+    )
+    # Start the worker processes before measuring
+    for _ in range(args.workers):
+        hasher.verify(pw_hash, password)
+
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.seconds
+
+    def client():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                assert hasher.verify(pw_hash, password)
+            except PasswordHasherBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    logins_per_second = len(latencies) / elapsed
+    print(f"pool: {args.workers} workers, {args.concurrency} client threads, {elapsed:.1f}s")
+    print(f"  logins/sec:          {logins_per_second:.1f}")
+    print(f"  logins/sec per core: {logins_per_second / min(args.workers, os.cpu_count() or 1):.1f}")
+    print(f"  latency p50/p95/p99: {percentile(latencies, 0.5) * 1000:.1f} / "
+          f"{percentile(latencies, 0.95) * 1000:.1f} / {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"  rejected (429):      {rejected[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-from app import create_app, socketio # type: ignore
-app = create_app()
+from app import create_app # type: ignore
 
+# The app is built only when this file is run. Spawned worker processes
+# (the password hashing pool) re-import it as __mp_main__ and must not
+# build a second app each; `flask run` finds create_app here by itself.
 if __name__ == '__main__':
+    from app.extensions import socketio # type: ignore
+
+    app = create_app()
     socketio.run(app, host='0.0.0.0', port=8080, debug=True)
@@ -0,0 +1,36 @@
+"""Revoked JWT ids for the sql revocation backend
+
+Revision ID: 3f9b7c2e5a18
+Revises: 8e2d4a6c1b35
+Create Date: 2026-10-18 19:42:10.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9b7c2e5a18'
+down_revision = '8e2d4a6c1b35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier builds created the table at runtime; keep an existing one
+    if sa.inspect(op.get_bind()).has_table('revoked_tokens'):
+        return
+    op.create_table('revoked_tokens',
+    sa.Column('jti', sa.String(length=64), nullable=False),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_expires_at'))
+
+    op.drop_table('revoked_tokens')
@@ -0,0 +1,44 @@
+"""Unique case-insensitive username index
+
+Revision ID: 5c1f0e8b7d42
+Revises: 2977e6271669
+Create Date: 2026-10-18 15:40:12.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0e8b7d42'
+down_revision = '2977e6271669'
+branch_labels = None
+depends_on = None
+
+
+def _rename_email_constraint(new_name):
+    # The constraint kept its name from when the table was called "user";
+    # give it a stable name so signup can tell which field is taken
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    for constraint in sa.inspect(bind).get_unique_constraints('users'):
+        if constraint['column_names'] == ['email'] and constraint['name'] != new_name:
+            op.execute(f'ALTER TABLE users RENAME CONSTRAINT "{constraint["name"]}" TO "{new_name}"')
+
+
+def upgrade():
+    # Fails if usernames already differ only by case; resolve those first
+    op.create_index(
+        'uq_users_username_lower',
+        'users',
+        [sa.text('lower(username)')],
+        unique=True,
+        postgresql_include=['id', 'username', 'password'],
+    )
+    _rename_email_constraint('users_email_key')
+
+
+def downgrade():
+    _rename_email_constraint('user_email_key')
+    op.drop_index('uq_users_username_lower', table_name='users')
@@ -0,0 +1,29 @@
+"""Per-user financial data version
+
+Revision ID: 8e2d4a6c1b35
+Revises: 5c1f0e8b7d42
+Create Date: 2026-10-18 17:05:31.604219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2d4a6c1b35'
+down_revision = '5c1f0e8b7d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+    # 0 means no financial data; users who already have some start at 1
+    op.execute('UPDATE users SET data_version = 1 WHERE id IN (SELECT user_id FROM accounts)')
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,38 @@
+"""Spilled chat sessions
+
+Revision ID: b51d0e9a7c63
+Revises: 3f9b7c2e5a18
+Create Date: 2026-10-18 20:16:47.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b51d0e9a7c63'
+down_revision = '3f9b7c2e5a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier builds created the table at runtime; keep an existing one
+    if sa.inspect(op.get_bind()).has_table('chat_sessions'):
+        return
+    op.create_table('chat_sessions',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('messages', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_chat_sessions_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_chat_sessions_updated_at'))
+
+    op.drop_table('chat_sessions')
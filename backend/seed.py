@@ -1,6 +1,9 @@
 from app import create_app
 from app.extensions import db, bcrypt
 from app.user.models import User
+from app.chat.accounts.models import Account
+from app.chat.accounts.data import mock_user_data
+from app.chat.accounts.queries import import_user
 
 app = create_app()
 
@@ -55,4 +58,10 @@ with app.app_context():
         db.session.add_all([alice, bob, charlie, new_user, another_user, user_one])
         db.session.commit()
 
+    # give the first users the mock financial data, once
+    for user, financial_data in zip(User.query.order_by(User.id).all(), mock_user_data):
+        if not Account.query.filter_by(user_id=user.id).first():
+            import_user(user.id, financial_data)
+    db.session.commit()
+
     print("Seed data added!")
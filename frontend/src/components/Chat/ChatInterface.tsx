@@ -13,6 +13,10 @@ export interface ChatBlock {
   tool_result?: any;
   tool_id?: string;
   iteration?: number;
+  // Content block index within an iteration, used to match streamed deltas
+  index?: number;
+  // True while the block is still being assembled from delta events
+  streaming?: boolean;
   // For user analysis artifacts
   user_analysis?: any;
 }
@@ -20,6 +24,8 @@ export interface ChatBlock {
 export interface ChatResponse {
   blocks: ChatBlock[];
   stop_reason: string;
+  // Why the agent loop ended: completed, max_iterations, deadline or cancelled
+  end_reason?: string;
   total_iterations: number;
 }
 
@@ -39,6 +45,8 @@ const ChatInterface = () => {
   const [showFinancialPanel, setShowFinancialPanel] = useState(true);
   const [isFinancialCollapsed, setIsFinancialCollapsed] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Server-side conversation session, so follow-ups keep earlier context
+  const sessionIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -81,14 +89,16 @@ const ChatInterface = () => {
       const streamUrl = `${BASE_URL}/api/chat/message/stream?t=${Date.now()}`;
       
       // Send the message content via POST to get a streaming response
+      const token = localStorage.getItem("token");
       const response = await fetch(streamUrl, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
           "Accept": "text/event-stream",
           "Cache-Control": "no-cache",
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
         },
-        body: JSON.stringify({ message: content }),
+        body: JSON.stringify({ message: content, session_id: sessionIdRef.current }),
       });
 
       if (!response.ok) {
@@ -122,8 +132,10 @@ const ChatInterface = () => {
             try {
               const eventData = JSON.parse(line.slice(6));
               
-              if (eventData.type === "block") {
-                // Add the new block to the assistant message
+              if (eventData.type === "session") {
+                sessionIdRef.current = eventData.session_id;
+              } else if (eventData.type === "block" || eventData.type === "tool_result") {
+                // Add the new block (or finished tool's result) to the assistant message
                 setMessages(prev => {
                   const newMessages = [...prev];
                   const assistantIndex = newMessages.findIndex(msg => msg.id === assistantMessageId);
@@ -131,9 +143,15 @@ const ChatInterface = () => {
                   if (assistantIndex !== -1) {
                     const updatedMessage = { ...newMessages[assistantIndex] };
                     if (updatedMessage.response) {
+                      // Replace the live block assembled from deltas, if any
+                      const blocks = updatedMessage.response.blocks.filter(
+                        block => !(block.streaming &&
+                          block.iteration === eventData.block.iteration &&
+                          block.index === eventData.block.index)
+                      );
                       updatedMessage.response = {
                         ...updatedMessage.response,
-                        blocks: [...updatedMessage.response.blocks, eventData.block]
+                        blocks: [...blocks, eventData.block]
                       };
                     }
                     // Remove thinking state on first block and start streaming indicator
@@ -150,6 +168,55 @@ const ChatInterface = () => {
                 });
                 
                 // Mark that we've received the first block
+                if (!firstBlockReceived) {
+                  firstBlockReceived = true;
+                }
+              } else if (eventData.type === "delta") {
+                // Append thinking/text tokens to the live block as they arrive
+                const delta = eventData.delta;
+                if (delta.type !== "thinking" && delta.type !== "text") continue;
+
+                setMessages(prev => {
+                  const newMessages = [...prev];
+                  const assistantIndex = newMessages.findIndex(msg => msg.id === assistantMessageId);
+
+                  if (assistantIndex !== -1) {
+                    const updatedMessage = { ...newMessages[assistantIndex] };
+                    if (updatedMessage.response) {
+                      const blocks = [...updatedMessage.response.blocks];
+                      const liveIndex = blocks.findIndex(
+                        block => block.streaming &&
+                          block.iteration === delta.iteration &&
+                          block.index === delta.index
+                      );
+                      if (liveIndex !== -1) {
+                        blocks[liveIndex] = {
+                          ...blocks[liveIndex],
+                          content: (blocks[liveIndex].content || "") + delta.content
+                        };
+                      } else {
+                        blocks.push({
+                          type: delta.type,
+                          content: delta.content,
+                          iteration: delta.iteration,
+                          index: delta.index,
+                          streaming: true
+                        });
+                      }
+                      updatedMessage.response = { ...updatedMessage.response, blocks };
+                    }
+                    if (!firstBlockReceived) {
+                      updatedMessage.isLoading = false;
+                      updatedMessage.isStreaming = true;
+                      updatedMessage.content = "Assistant response";
+                      setIsLoading(false);
+                    }
+                    newMessages[assistantIndex] = updatedMessage;
+                  }
+
+                  return newMessages;
+                });
+
                 if (!firstBlockReceived) {
                   firstBlockReceived = true;
                 }
@@ -165,6 +232,7 @@ const ChatInterface = () => {
                       updatedMessage.response = {
                         ...updatedMessage.response,
                         stop_reason: eventData.stop_reason,
+                        end_reason: eventData.end_reason,
                         total_iterations: eventData.total_iterations
                       };
                     }
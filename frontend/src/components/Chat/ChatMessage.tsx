@@ -173,7 +173,7 @@ const ChatMessage = ({ message }: ChatMessageProps) => {
             ) : (
               <div className="px-4 py-2 bg-gray-50 border-t border-gray-100">
                 <p className="text-xs text-gray-500">
-                  Completed in {message.response.total_iterations} iteration{message.response.total_iterations !== 1 ? 's' : ''} • {message.timestamp.toLocaleTimeString()}
+                  {message.response.end_reason && message.response.end_reason !== "completed" ? "Stopped early" : "Completed"} in {message.response.total_iterations} iteration{message.response.total_iterations !== 1 ? 's' : ''} • {message.timestamp.toLocaleTimeString()}
                 </p>
               </div>
             )}
@@ -154,10 +154,12 @@ const FinancialDashboard = ({ onToggle, isCollapsed = false }: FinancialDashboar
 
     const fetchFinancialData = async () => {
     try {
+      const token = localStorage.getItem("token");
       const response = await fetch("/api/chat/financial-data", {
         method: "GET",
         headers: {
           "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`,
         },
       });
 